@@ -84,3 +84,127 @@ ZONE_ROUTE_LINES = {
         (41.45500, 2.03500)
     ]
 }
+
+# Servidor local del modelo IA (opcional, ver src/model_server.py)
+MODEL_SERVER_HOST = '127.0.0.1'
+MODEL_SERVER_PORT = 8765
+MODEL_SERVER_MICROBATCH_WAIT_MS = 20  # Ventana para agrupar peticiones cercanas
+MODEL_SERVER_MICROBATCH_MAX_SIZE = 64  # Máximo de direcciones por llamada al modelo
+
+# Inferencia paralela del modelo IA (solo CPU, ver src/parallel_inference.py)
+# Ejecuta `python parallel_inference.py` para encontrar el mejor reparto en tu máquina
+MODEL_WORKERS = 1  # Procesos con réplica del modelo (1 = sin paralelo)
+MODEL_THREADS_PER_WORKER = None  # Hilos de torch por proceso (None = núcleos / procesos)
+
+# Correcciones aprendidas automáticamente (ver src/correction_store.py)
+CORRECCIONES_COMPACTAR_CADA = 200  # Compactar el registro cada N correcciones nuevas
+
+# Reintentos de la API de Google Sheets ante errores transitorios (429, 5xx)
+SHEETS_NUM_RETRIES = 5
+SHEETS_PAGE_SIZE = 500  # Filas leídas por petición (la hoja se lee completa por páginas)
+
+# Backend de hojas: 'google' (API real) o 'local' (CSV en disco, sin credenciales ni red)
+SHEETS_BACKEND = 'google'
+LOCAL_SHEET_CSV = 'hoja_local.csv'  # Solo backend 'local': contenido de 'Hoja 1' (fila 1 = cabecera)
+LOCAL_SHEET_LATENCY_MS = 0  # Solo backend 'local': latencia simulada por llamada
+SHEETS_DISCOVERY_CACHE_FILE = 'sheets_v4_discovery.json'  # Documento discovery cacheado en disco
+SHEETS_HTTP_TIMEOUT = 60  # Timeout (s) del cliente HTTP de Sheets
+
+# Índice código → (zona, posición, dirección) para el escáner web (ver src/barcode_index.py).
+# Lleva direcciones de clientes: nunca dentro de docs/ (se publica en GitHub Pages)
+BARCODE_INDEX_FILE = 'barcode_index.json'
+
+# Almacén local de resultados por código de barras: coordenadas, zona, posición
+# en la ruta y fuente de la limpieza (SQLite, ver src/results_store.py)
+RESULTS_DB_FILE = 'resultados.db'
+
+# Instrumentación: informe JSON por ejecución con tiempos y contadores (ver src/instrumentation.py)
+INFORMES_DIR = 'informes_ejecucion'
+PERFIL_ETAPAS = []  # Etapas a perfilar siempre, p. ej. ['geocodificacion'] ('*' = todas); o usar --perfil
+PERFIL_MODO = 'cprofile'  # 'cprofile' (.prof por etapa) o 'tracemalloc' (memoria)
+
+# Modo servicio (ver src/daemon.py): vigila la hoja y reprocesa en modo incremental
+DAEMON_HOST = '127.0.0.1'
+DAEMON_PORT = 8766  # Endpoints /salud y /metricas
+DAEMON_INTERVALO_S = 60  # Segundos entre comprobaciones de la hoja
+DAEMON_PRECARGAR_MODELO = True  # Cargar el modelo IA al arrancar (si no hay servidor de modelo)
+
+# API local de optimización para el tablero de reordenación (ver src/route_api.py)
+ROUTE_API_HOST = '127.0.0.1'
+ROUTE_API_PORT = 8767
+ROUTE_API_ORIGENES = ['https://TU-USUARIO.github.io']  # Origen web del tablero (sin ruta); otros reciben 403
+ROUTE_API_MAX_BYTES = 1_000_000  # Tamaño máximo del cuerpo de una petición
+
+# Límite de peticiones por segundo a la API de Google Maps (None = sin límite)
+GEOCODING_MAX_QPS = None
+
+# Varias poblaciones en un solo proceso (ver src/multi_tenant.py): cada una con su
+# spreadsheet, depósito, zonas y líneas; comparten caché, modelo IA y límite de la API
+TENANTS = [
+    # {
+    #     'nombre': 'santcugat',
+    #     'spreadsheet_id': SPREADSHEET_ID,
+    #     'depot': DEPOT_COORDS,
+    #     'zonas': ZONE_POLYGONS,
+    #     'lineas': ZONE_ROUTE_LINES,
+    # },
+]
+TENANTS_PARALELO = 4  # Inquilinos procesados a la vez
+TENANTS_GEOCODING_MAX_QPS = 40  # Límite de la API de Google Maps común a todos los inquilinos
+
+# Benchmarks por etapa con cargas sintéticas (ver src/benchmark.py)
+BENCHMARK_BASELINES_FILE = 'benchmark_baselines.json'  # Referencia de tiempos (propia de cada máquina)
+BENCHMARK_UMBRAL_REGRESION = 0.2  # Más lento que la referencia en más de un 20 % = regresión
+
+# Grabación y reproducción de llamadas externas (ver src/cassette.py)
+CASSETTES_DIR = 'cassettes'  # Grabaciones de main.py --grabar
+REPRODUCCIONES_DIR = 'reproducciones'  # Caché, correcciones y almacén aislados de cada --reproducir
+
+# Puntos de control para reanudar una ejecución que falla a mitad (ver src/checkpoints.py)
+CHECKPOINTS_DIR = 'ejecucion_en_curso'  # Salida de cada etapa completada (se borra al terminar bien)
+
+# Paradas tardías en modo incremental: insertarlas en la ruta publicada sin mover las demás
+# (False = reordenar la zona entera) y huecos evaluados a cada lado de su proyección en la línea
+INCREMENTAL_INSERTAR = True
+INSERCION_VENTANA = 32
+
+# Memoria de rutas (ver src/route_memory.py): las paradas habituales salen en el orden
+# aprendido de días anteriores (y de las ediciones del tablero); solo se colocan las nuevas
+ROUTE_MEMORY_ACTIVA = True
+ROUTE_MEMORY_ALFA = 0.5  # Peso del último día frente a los anteriores
+ROUTE_MEMORY_MIN_CONOCIDAS = 3  # Paradas conocidas en una zona para usar la memoria
+
+# Reprocesado histórico de las hojas archivadas (ver src/backfill.py)
+BACKFILL_ARCHIVO_DIR = 'archivo'  # Un CSV por día con el formato de la hoja: <día>.csv
+BACKFILL_SALIDA_DIR = 'backfill'  # Resultados de cada día e informe agregado
+BACKFILL_PROCESOS = 4  # Días procesados a la vez
+BACKFILL_GEOCODING_MAX_QPS = 40  # Límite de la API de Google Maps común a todos los procesos
+
+# Zona y posición en la línea de ruta guardadas en el caché de geocodificación con la
+# versión de la geometría: las direcciones repetidas no se vuelven a clasificar ni proyectar
+# (se recalculan solas si cambian ZONE_POLYGONS o ZONE_ROUTE_LINES)
+CACHE_GEOMETRIA_ACTIVA = True
+CACHE_GEOMETRIA_VERSIONES = 4  # Versiones de geometría guardadas por dirección (una por inquilino)
+
+# Caché de geocodificación compartido entre procesos (p. ej. backfill.py y la ejecución de
+# la mañana a la vez): mirar el diario de resultados antes de consultar y una sola consulta en
+# curso por dirección. El diario se escribe siempre: es el punto de control de la geocodificación
+GEOCODING_COMPARTIDO = True
+GEOCODING_VUELO_CUBETAS = 256  # Ficheros de bloqueo para las consultas en curso
+
+# Búsqueda local (2-opt y Or-opt) tras ordenar cada zona por su línea de ruta o con la
+# memoria de rutas (partiendo del orden aprendido; solo aplica cambios que acortan la ruta)
+MEJORA_LOCAL_ACTIVA = True
+MEJORA_LOCAL_CON_MEMORIA = True  # False = dejar tal cual el orden aprendido de la memoria
+MEJORA_LOCAL_MAX_ITERACIONES = 500  # Movimientos por zona como máximo
+MEJORA_LOCAL_MAX_SEGUNDOS = 0.5  # Tiempo por zona como máximo
+MEJORA_LOCAL_VECINOS = 10  # Solo se prueban movimientos que acercan cada parada a sus N vecinas más cercanas
+MEJORA_LOCAL_MAX_PARADAS = 3000  # Las zonas con más paradas se dejan en el orden de la línea
+
+# Rebalanceo de paradas fronterizas tras separar por zonas: las paradas cerca de la línea
+# de ruta de una zona vecina menos cargada pasan a ella (cada cambio se muestra en la salida)
+REBALANCEO_ACTIVO = True
+REBALANCEO_DISTANCIA_M = 150  # Distancia máxima a la línea de la zona de destino
+REBALANCEO_TOLERANCIA = 0.2  # Diferencia de carga entre zonas aceptada (20 % de la media)
+REBALANCEO_PESO_PAQUETES = 0.5  # Peso de los paquetes frente a las paradas en la carga
+REBALANCEO_MAX_MOVIMIENTOS = 50  # Paradas cambiadas de zona como máximo
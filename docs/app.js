@@ -6,7 +6,41 @@ const SHEET_CSV_URL = (RUNTIME_CFG.SHEET_CSV_URL || '').trim();
 // ========== CONFIGURACIÓ API EXCESOS ==========
 const EXCESOS_API_URL = (RUNTIME_CFG.EXCESOS_API_URL || '').trim();
 
+// Índice código -> (zona, posició, adreça) generat pel pipeline Python (URL privada; buit = no es fa servir)
+const BARCODE_INDEX_URL = (RUNTIME_CFG.BARCODE_INDEX_URL || '').trim();
+
+// Columnas de códigos de barras: H=7, K=10, N=13, Q=16 (índices 0-based)
+const COLUMNAS_CODIGOS = [7, 10, 13, 16]; // H, K, N, Q
+// Columnas de direcciones: G=6, J=9, M=12, P=15
+const COLUMNAS_DIRECCIONES = {
+    7: 6,   // H (códigos Indust) -> G (direcciones Indust)
+    10: 9,   // K (códigos Centre) -> J (direcciones Centre)
+    13: 12, // N (códigos Mirasol) -> M (direcciones Mirasol)
+    16: 15  // Q (códigos sin_zona) -> P (direcciones sin_zona)
+};
+const COLORES_COLUMNAS = {
+    7: '#6366f1',   // H = Índigo (Indust/Fàbriques)
+    10: '#f59e0b',   // K = Ámbar (Centre)
+    13: '#10b981',  // N = Verde (Mirasol)
+    16: '#ef4444'   // Q = Rojo (sin_zona/Altres)
+};
+const NOMBRES_ZONAS = {
+    7: 'Fàbriques',
+    10: 'Centre',
+    13: 'Mirasol',
+    16: 'Altres'
+};
+// Zona del pipeline Python -> columna de códigos
+const ZONA_A_COLUMNA = {
+    Indust: 7,
+    Centre: 10,
+    Mirasol: 13,
+    sin_zona: 16
+};
+
 let sheetData = [];
+let barcodeIndex = new Map();      // código normalizado -> { colIndex, row, direccion }
+let localBarcodeIndex = new Map(); // código columna A -> índice de fila en sheetData
 let isScanning = false;
 let lastScannedCode = '';
 let scanHistory = [];
@@ -22,6 +56,7 @@ let bufferResetTimer = null;
 
 // Cargar datos del Google Sheets al iniciar
 document.addEventListener('DOMContentLoaded', () => {
+    loadBarcodeIndex();
     loadSheetData();
     
     // Configurar event listeners para los botones principales
@@ -78,6 +113,7 @@ async function loadSheetData() {
         console.log(csvText.substring(0, 500));
         
         sheetData = parseCSV(csvText);
+        buildIndexesFromSheet(sheetData);
         
         statusEl.textContent = `✅ Datos cargados: ${sheetData.length} filas`;
         statusEl.className = 'status success';
@@ -100,6 +136,91 @@ async function loadSheetData() {
     }
 }
 
+/**
+ * Carga el índice publicado por el pipeline (barcode_index.json).
+ * Permite responder escaneos antes de que llegue el CSV; cuando el CSV
+ * se carga, el índice se reconstruye a partir de él (datos más recientes).
+ */
+async function loadBarcodeIndex() {
+    if (!BARCODE_INDEX_URL) return;
+    
+    try {
+        const response = await fetch(BARCODE_INDEX_URL, { cache: 'no-cache' });
+        if (!response.ok) return;
+        const data = await response.json();
+        
+        // Si el CSV ya se ha cargado, su índice es más reciente
+        if (barcodeIndex.size > 0) return;
+        
+        const index = new Map();
+        for (const [codigo, [zonaIdx, posicion, direccion]] of Object.entries(data.codigos || {})) {
+            const colIndex = ZONA_A_COLUMNA[data.zonas[zonaIdx]];
+            if (colIndex === undefined) continue;
+            addToBarcodeIndex(index, codigo, { colIndex, row: posicion, direccion });
+        }
+        barcodeIndex = index;
+        console.log(`Índice de códigos cargado: ${index.size} claves (generado ${data.generado})`);
+    } catch (error) {
+        console.warn('No se pudo cargar el índice de códigos:', error);
+    }
+}
+
+function addToBarcodeIndex(index, codigo, entry) {
+    const key = codigo.toString().trim().toLowerCase();
+    if (!key || index.has(key)) return;
+    index.set(key, entry);
+    
+    // Clave numérica (sin ceros a la izquierda) para la coincidencia por parseInt
+    const numeric = parseInt(key);
+    if (!isNaN(numeric) && String(numeric) === key.replace(/^0+(?=\d)/, '')) {
+        const numericKey = '#' + numeric;
+        if (!index.has(numericKey)) index.set(numericKey, entry);
+    }
+}
+
+function lookupBarcodeIndex(normalizedBarcode) {
+    const hit = barcodeIndex.get(normalizedBarcode);
+    if (hit) return hit;
+    
+    const numeric = parseInt(normalizedBarcode);
+    return isNaN(numeric) ? null : (barcodeIndex.get('#' + numeric) || null);
+}
+
+/**
+ * Construye en una sola pasada los índices de búsqueda a partir del CSV:
+ * - códigos de las columnas de zona (H, K, N, Q) -> zona, posición y dirección
+ * - códigos de la columna A -> fila (para los excesos)
+ */
+function buildIndexesFromSheet(data) {
+    const index = new Map();
+    const localIndex = new Map();
+    
+    for (let rowIndex = 0; rowIndex < data.length; rowIndex++) {
+        const row = data[rowIndex];
+        
+        for (const colIndex of COLUMNAS_CODIGOS) {
+            if (colIndex >= row.length || !row[colIndex]) continue;
+            
+            const colDireccion = COLUMNAS_DIRECCIONES[colIndex];
+            const direccion = row[colDireccion] ? row[colDireccion].toString().trim() : 'Dirección no disponible';
+            for (const codigo of row[colIndex].toString().split(',')) {
+                addToBarcodeIndex(index, codigo, { colIndex, row: rowIndex, direccion });
+            }
+        }
+        
+        // Fila 0 es la cabecera
+        if (rowIndex > 0 && row[0]) {
+            for (const codigo of row[0].toString().toLowerCase().split(',')) {
+                const key = codigo.trim();
+                if (key && !localIndex.has(key)) localIndex.set(key, rowIndex);
+            }
+        }
+    }
+    
+    barcodeIndex = index;
+    localBarcodeIndex = localIndex;
+}
+
 function parseCSV(csvText) {
     const lines = csvText.split('\n');
     const data = [];
@@ -138,10 +259,6 @@ function parseCSVLine(line) {
 
 function searchInSheet(barcode) {
     const scannedCodeEl = document.getElementById('scannedCode');
-    const rowNumEl = document.getElementById('rowNum');
-    const colNumEl = document.getElementById('colNum');
-    const cellContentEl = document.getElementById('cellContent');
-    const statusEl = document.getElementById('status');
     
     scannedCodeEl.textContent = barcode;
     scannedCodeEl.className = 'value searching';
@@ -149,110 +266,61 @@ function searchInSheet(barcode) {
     // Normalizar el código de barras (quitar espacios, convertir a string)
     const normalizedBarcode = barcode.toString().trim().toLowerCase();
     
-    // Debug: mostrar qué estamos buscando
-    console.log('Buscando código:', barcode);
-    console.log('Código normalizado:', normalizedBarcode);
-    console.log('Total filas en datos:', sheetData.length);
-    
-    // Columnas de códigos de barras: H=7, K=10, N=13, Q=16 (índices 0-based)
-    const columnasCodigos = [7, 10, 13, 16]; // H, K, N, Q
-    // Columnas de direcciones: G=6, J=9, M=12, P=15
-    const columnasDirecciones = {
-        7: 6,   // H (códigos Indust) -> G (direcciones Indust)
-        10: 9,   // K (códigos Centre) -> J (direcciones Centre)
-        13: 12, // N (códigos Mirasol) -> M (direcciones Mirasol)
-        16: 15  // Q (códigos sin_zona) -> P (direcciones sin_zona)
-    };
-    const coloresColumnas = {
-        7: '#6366f1',   // H = Índigo (Indust/Fàbriques)
-        10: '#f59e0b',   // K = Ámbar (Centre)
-        13: '#10b981',  // N = Verde (Mirasol)
-        16: '#ef4444'   // Q = Rojo (sin_zona/Altres)
-    };
-    const nombresZonas = {
-        7: 'Fàbriques',
-        10: 'Centre',
-        13: 'Mirasol',
-        16: 'Altres'
-    };
+    // Búsqueda directa en el índice (una sola consulta al Map; también por valor numérico)
+    const hit = lookupBarcodeIndex(normalizedBarcode);
+    if (hit) {
+        showFoundResult(barcode, hit.row, hit.colIndex, hit.direccion);
+        return true;
+    }
+    
+    // Sin recorrer la hoja: la búsqueda aproximada solo se hace si se pide
+    showNotFoundResult(barcode, true);
+    return false;
+}
+
+/**
+ * Búsqueda aproximada (el código contiene o está contenido en otro) recorriendo
+ * todas las filas de las columnas de códigos (H, K, N, Q). Es lineal: solo se
+ * lanza con el botón del mensaje de "no encontrado".
+ */
+function searchApproximateInSheet(barcode) {
+    const normalizedBarcode = barcode.toString().trim().toLowerCase();
     
-    // Buscar solo en las columnas de códigos de barras (H, K, N, Q)
     for (let rowIndex = 0; rowIndex < sheetData.length; rowIndex++) {
         const row = sheetData[rowIndex];
         
-        for (const colIndex of columnasCodigos) {
+        for (const colIndex of COLUMNAS_CODIGOS) {
             if (colIndex >= row.length) continue;
             
             const cellValue = row[colIndex].toString().trim();
             if (!cellValue) continue;
             
-            const normalizedCell = cellValue.toLowerCase();
-            
-            // Múltiples estrategias de búsqueda (el código puede estar separado por comas)
-            const codigos = normalizedCell.split(',').map(c => c.trim());
-            const encontrado = codigos.some(codigo => {
-                const exactMatch = codigo === normalizedBarcode;
-                const codigoContainsBarcode = codigo.includes(normalizedBarcode);
-                const barcodeContainsCodigo = normalizedBarcode.includes(codigo) && codigo.length > 3;
-                const numericMatch = parseInt(normalizedBarcode) === parseInt(codigo) && !isNaN(parseInt(normalizedBarcode));
-                return exactMatch || codigoContainsBarcode || barcodeContainsCodigo || numericMatch;
-            });
+            // El código puede estar separado por comas
+            const codigos = cellValue.toLowerCase().split(',').map(c => c.trim());
+            const encontrado = codigos.some(codigo =>
+                codigo.includes(normalizedBarcode) || (normalizedBarcode.includes(codigo) && codigo.length > 3)
+            );
             
             if (encontrado) {
-                // ¡Encontrado! - Mostrar número de fila -1 (porque la fila 1 es cabecera)
-                const displayRow = rowIndex; // rowIndex ya es 0-based, la fila 2 del sheet es rowIndex 1
-                const displayCol = getColumnLetter(colIndex + 1);
-                const color = coloresColumnas[colIndex];
-                const zona = nombresZonas[colIndex];
-                
-                // Obtener la dirección de la columna correspondiente
-                const colDireccion = columnasDirecciones[colIndex];
+                // rowIndex ya es 0-based, la fila 2 del sheet es rowIndex 1
+                const colDireccion = COLUMNAS_DIRECCIONES[colIndex];
                 const direccion = row[colDireccion] ? row[colDireccion].toString().trim() : 'Dirección no disponible';
-                
-                // Mostrar el número de fila con el color correspondiente
-                rowNumEl.textContent = displayRow;
-                rowNumEl.style.color = color;
-                colNumEl.textContent = zona;
-                colNumEl.style.color = color;
-                scannedCodeEl.className = 'value found';
-                scannedCodeEl.style.color = color;
-                
-                cellContentEl.innerHTML = `✅ <strong>${zona}</strong> - Posición ${displayRow}<div class="address-info">📍 ${direccion}</div>`;
-                cellContentEl.style.display = 'block';
-                cellContentEl.style.color = color;
-                
-                statusEl.textContent = `✅ ${zona} - Posición ${displayRow}`;
-                statusEl.className = 'status success';
-                statusEl.style.color = color;
-                
-                // Añadir al historial con la dirección
-                addToHistory(barcode, displayRow, zona, color, direccion);
-                
-                // Vibrar para feedback (patrón de éxito)
-                if (navigator.vibrate) {
-                    navigator.vibrate([100, 50, 100, 50, 200]);
-                }
-                
-                // Bloquear nuevos escaneos por 3 segundos para que se vea el resultado
-                isShowingResult = true;
-                setTimeout(() => {
-                    isShowingResult = false;
-                    statusEl.textContent = '🔍 Escaneando... Apunta al código de barras';
-                    statusEl.className = 'status success';
-                    statusEl.style.color = '';
-                }, 3000);
-                
-                console.log('¡Encontrado en fila', displayRow, 'zona', zona);
+                showFoundResult(barcode, rowIndex, colIndex, direccion);
                 return true;
             }
         }
     }
     
-    // No encontrado - Mostrar debug info
-    console.log('No encontrado. Mostrando primeras 5 filas de datos:');
-    sheetData.slice(0, 5).forEach((row, i) => {
-        console.log(`Fila ${i + 1}:`, row);
-    });
+    showNotFoundResult(barcode, false);
+    return false;
+}
+
+function showNotFoundResult(barcode, offerApproximate) {
+    const scannedCodeEl = document.getElementById('scannedCode');
+    const rowNumEl = document.getElementById('rowNum');
+    const colNumEl = document.getElementById('colNum');
+    const cellContentEl = document.getElementById('cellContent');
+    const statusEl = document.getElementById('status');
     
     rowNumEl.textContent = '-';
     rowNumEl.style.color = '';
@@ -261,10 +329,18 @@ function searchInSheet(barcode) {
     scannedCodeEl.className = 'value not-found';
     scannedCodeEl.style.color = '';
     cellContentEl.innerHTML = `❌ Código "${barcode}" no encontrado<br><small>Datos cargados: ${sheetData.length} filas</small>`;
+    if (offerApproximate && sheetData.length > 0) {
+        const button = document.createElement('button');
+        button.className = 'manual-btn';
+        button.textContent = '🔎 Búsqueda aproximada';
+        button.addEventListener('click', () => searchApproximateInSheet(barcode));
+        cellContentEl.appendChild(document.createElement('br'));
+        cellContentEl.appendChild(button);
+    }
     cellContentEl.style.display = 'block';
     cellContentEl.style.color = '';
     
-    statusEl.textContent = `❌ Código no encontrado`;
+    statusEl.textContent = offerApproximate ? `❌ Código no encontrado` : `❌ Código no encontrado (ni aproximado)`;
     statusEl.className = 'status error';
     statusEl.style.color = '';
     
@@ -282,8 +358,51 @@ function searchInSheet(barcode) {
         statusEl.textContent = '🔍 Escaneando... Apunta al código de barras';
         statusEl.className = 'status success';
     }, 3000);
+}
+
+function showFoundResult(barcode, displayRow, colIndex, direccion) {
+    const scannedCodeEl = document.getElementById('scannedCode');
+    const rowNumEl = document.getElementById('rowNum');
+    const colNumEl = document.getElementById('colNum');
+    const cellContentEl = document.getElementById('cellContent');
+    const statusEl = document.getElementById('status');
+    const color = COLORES_COLUMNAS[colIndex];
+    const zona = NOMBRES_ZONAS[colIndex];
+    
+    // Mostrar el número de fila con el color correspondiente
+    rowNumEl.textContent = displayRow;
+    rowNumEl.style.color = color;
+    colNumEl.textContent = zona;
+    colNumEl.style.color = color;
+    scannedCodeEl.className = 'value found';
+    scannedCodeEl.style.color = color;
+    
+    cellContentEl.innerHTML = `✅ <strong>${zona}</strong> - Posición ${displayRow}<div class="address-info">📍 ${direccion}</div>`;
+    cellContentEl.style.display = 'block';
+    cellContentEl.style.color = color;
     
-    return false;
+    statusEl.textContent = `✅ ${zona} - Posición ${displayRow}`;
+    statusEl.className = 'status success';
+    statusEl.style.color = color;
+    
+    // Añadir al historial con la dirección
+    addToHistory(barcode, displayRow, zona, color, direccion);
+    
+    // Vibrar para feedback (patrón de éxito)
+    if (navigator.vibrate) {
+        navigator.vibrate([100, 50, 100, 50, 200]);
+    }
+    
+    // Bloquear nuevos escaneos por 3 segundos para que se vea el resultado
+    isShowingResult = true;
+    setTimeout(() => {
+        isShowingResult = false;
+        statusEl.textContent = '🔍 Escaneando... Apunta al código de barras';
+        statusEl.className = 'status success';
+        statusEl.style.color = '';
+    }, 3000);
+    
+    console.log('¡Encontrado en fila', displayRow, 'zona', zona);
 }
 
 function getColumnLetter(colNum) {
@@ -889,6 +1008,19 @@ function searchBarcodeInLocalData(barcode) {
     
     const normalizedBarcode = barcode.toString().trim().toLowerCase();
     
+    // Búsqueda directa en el índice construido al cargar el CSV
+    const indexedRow = localBarcodeIndex.get(normalizedBarcode);
+    if (indexedRow !== undefined) {
+        const row = sheetData[indexedRow];
+        return {
+            found: true,
+            barcode: row[0].toString().trim(),
+            pcs: row[1] ? row[1].toString().trim() : '',
+            customer: row[2] ? row[2].toString().trim() : '',
+            row: indexedRow + 1
+        };
+    }
+    
     // Buscar a partir de la fila 1 (índex 1, perquè la 0 és capçalera)
     for (let i = 1; i < sheetData.length; i++) {
         const row = sheetData[i];
@@ -4,9 +4,14 @@
 window.BIKELOGIC_CONFIG = {
     // Web antigua (docs/index.html + docs/app.js)
     SHEET_CSV_URL: 'https://docs.google.com/spreadsheets/d/e/2PACX-1vSMUbPSH39x9bMdABa6O-S0up-GSRvZ7XmOJaxKhFgDhTYoLY-W4MIGuZyqWbLPQbZ7m6vB8VoHNLxq/pub?gid=0&single=true&output=csv',
+    // Indice codi -> zona/posicio de src/barcode_index.py. Porta adreces de clients:
+    // no el posis a docs/ (es publica); serveix-lo des d'una URL privada
+    BARCODE_INDEX_URL: '',
     EXCESOS_API_URL: 'https://script.google.com/macros/s/AKfycbzj8lnGkIDhABzlW3MSEcVSj88U-tUhZDQq8_eNPFG3Aklkmj0Rz4doeCqXZ1XgzmnK/exec',
 
     // Web de reordenacion (docs/reorder.html)
     REORDER_SHEET_CSV_URL: 'https://docs.google.com/spreadsheets/d/e/2PACX-1vSMUbPSH39x9bMdABa6O-S0up-GSRvZ7XmOJaxKhFgDhTYoLY-W4MIGuZyqWbLPQbZ7m6vB8VoHNLxq/pub?gid=0&single=true&output=csv',
     REORDER_API_URL: 'https://script.google.com/macros/s/AKfycbwv296duwtJgyGUEK8w61KlbyXClAxeq3yETLeWfzlGahjVI9TSb01dezuH3MBpDyH-/exec',
+    // API local d'optimitzacio de rutes (src/route_api.py), p. ex. 'http://127.0.0.1:8767'
+    ROUTE_API_URL: '',
 };
@@ -5,10 +5,16 @@ Optimizaciones:
 1. Lookup en Correccions.csv (instantáneo, sin cargar modelo)
 2. Cache de sesión para direcciones repetidas del mismo día
 3. Solo carga el modelo si hay direcciones nuevas
+4. Las salidas del modelo que se geocodifican dentro de una zona se aprenden
+   (correction_store.py) y pasan a resolverse por lookup
+5. Si el servidor de modelo (model_server.py) está activo, lo usa en lugar de cargar el modelo
 """
 import os
 from pathlib import Path
 import re
+from threading import RLock
+
+from instrumentation import etapa, contar
 
 # Variables globales
 _model = None
@@ -16,6 +22,7 @@ _tokenizer = None
 _lookup_dict = None
 _lookup_loaded = False
 _session_cache = {}  # Cache de direcciones procesadas en esta sesión
+_carga_lock = RLock()  # Varios hilos (multi_tenant.py) comparten un solo lookup y modelo
 
 
 def _normalizar_key(texto):
@@ -34,19 +41,40 @@ def _cargar_lookup():
     if _lookup_loaded:
         return _lookup_dict
     
+    with _carga_lock:
+        if _lookup_loaded:
+            return _lookup_dict
+        return _construir_lookup()
+
+
+def _construir_lookup():
+    global _lookup_dict, _lookup_loaded
+    
     lookup_path = Path(__file__).parent.parent / "data" / "Correccions.csv"
     _lookup_dict = {}
     
-    if lookup_path.exists():
-        import pandas as pd
-        df = pd.read_csv(lookup_path)
-        df.columns = ['raw', 'processed']
-        
-        for _, row in df.iterrows():
-            key = _normalizar_key(str(row['raw']))
-            _lookup_dict[key] = row['processed']
+    with etapa('carga_lookup'):
+        if lookup_path.exists():
+            import pandas as pd
+            df = pd.read_csv(lookup_path)
+            df.columns = ['raw', 'processed']
+            
+            for _, row in df.iterrows():
+                key = _normalizar_key(str(row['raw']))
+                _lookup_dict[key] = row['processed']
+            
+            print(f"  📚 Lookup dict cargado: {len(_lookup_dict)} entradas conocidas")
         
-        print(f"  📚 Lookup dict cargado: {len(_lookup_dict)} entradas conocidas")
+        # Correcciones aprendidas automáticamente (Correccions.csv tiene prioridad)
+        from correction_store import cargar_correcciones
+        aprendidas = 0
+        for key, resultado in cargar_correcciones().items():
+            if key not in _lookup_dict:
+                _lookup_dict[key] = resultado
+                aprendidas += 1
+    
+    if aprendidas:
+        print(f"  🧠 Correcciones aprendidas: {aprendidas} entradas")
     
     _lookup_loaded = True
     return _lookup_dict
@@ -59,23 +87,36 @@ def _cargar_modelo():
     if _model is not None:
         return _model, _tokenizer
     
+    with _carga_lock:
+        if _model is not None:
+            return _model, _tokenizer
+        return _construir_modelo()
+
+
+def _construir_modelo():
+    global _model, _tokenizer
+    
     try:
-        from transformers import T5Tokenizer, T5ForConditionalGeneration
-        import torch
-        
-        model_path = Path(__file__).parent.parent / "models" / "address_model4"
-        
-        if not model_path.exists():
-            raise FileNotFoundError(f"No se encontró el modelo en: {model_path}")
-        
-        print(f"  📦 Cargando modelo IA (para direcciones nuevas)...")
-        
-        _tokenizer = T5Tokenizer.from_pretrained("t5-small")
-        _model = T5ForConditionalGeneration.from_pretrained(str(model_path))
-        
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        _model = _model.to(device)
-        _model.eval()
+        with etapa('carga_modelo'):
+            from transformers import T5Tokenizer, T5ForConditionalGeneration
+            import torch
+            
+            model_path = Path(__file__).parent.parent / "models" / "address_model4"
+            
+            if not model_path.exists():
+                raise FileNotFoundError(f"No se encontró el modelo en: {model_path}")
+            
+            print(f"  📦 Cargando modelo IA (para direcciones nuevas)...")
+            
+            tokenizer = T5Tokenizer.from_pretrained("t5-small")
+            model = T5ForConditionalGeneration.from_pretrained(str(model_path))
+            
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+            model = model.to(device)
+            model.eval()
+            # Publicar solo el modelo ya listo (otros hilos lo leen sin lock)
+            _tokenizer = tokenizer
+            _model = model
         
         print(f"  ✅ Modelo cargado en {device.upper()}")
         
@@ -150,9 +191,42 @@ def _procesar_batch_con_modelo(direcciones_batch):
     Returns:
         list: Lista de direcciones procesadas
     """
-    import torch
     global _session_cache
     
+    if not direcciones_batch:
+        return []
+    
+    # Usar el servidor de modelo si está activo (modelo ya cargado en memoria)
+    from model_server import normalizar_con_servidor
+    with etapa('modelo_lote'):
+        resultados = normalizar_con_servidor(direcciones_batch)
+        
+        if resultados is None:
+            resultados = _inferir_batch(direcciones_batch)
+        else:
+            contar('modelo.lotes_servidor')
+    contar('modelo.lotes')
+    
+    # Guardar en cache
+    for direccion, resultado in zip(direcciones_batch, resultados):
+        key = _normalizar_key(direccion)
+        _session_cache[key] = resultado
+    
+    return resultados
+
+
+def _inferir_batch(direcciones_batch):
+    """
+    Ejecuta el modelo IA sobre un lote de direcciones (sin cache ni servidor).
+    
+    Args:
+        direcciones_batch (list): Lista de direcciones a procesar
+        
+    Returns:
+        list: Lista de direcciones procesadas, en el mismo orden
+    """
+    import torch
+    
     if not direcciones_batch:
         return []
     
@@ -181,17 +255,11 @@ def _procesar_batch_con_modelo(direcciones_batch):
         )
     
     # Decodificar resultados
-    resultados = tokenizer.batch_decode(outputs, skip_special_tokens=True)
-    
-    # Guardar en cache
-    for direccion, resultado in zip(direcciones_batch, resultados):
-        key = _normalizar_key(direccion)
-        _session_cache[key] = resultado
-    
-    return resultados
+    return tokenizer.batch_decode(outputs, skip_special_tokens=True)
 
 
-def procesar_direcciones_con_modelo(direcciones_raw, mostrar_comparativa=True, batch_size=16):
+def procesar_direcciones_con_modelo(direcciones_raw, mostrar_comparativa=True, batch_size=16, workers=None, devolver_fuentes=False,
+                                    reiniciar_cache=True, resueltas=None):
     """
     Procesa una lista de direcciones usando lookup + modelo IA.
     Optimizado con procesamiento por lotes (batch) para mayor velocidad.
@@ -200,12 +268,22 @@ def procesar_direcciones_con_modelo(direcciones_raw, mostrar_comparativa=True, b
         direcciones_raw (list): Lista de direcciones sin procesar
         mostrar_comparativa (bool): Si True, imprime antes/después
         batch_size (int): Número de direcciones a procesar por lote (default: 16)
+        workers (int): Procesos con réplica del modelo para inferencia paralela.
+                       Si es None, usa MODEL_WORKERS de config (1 = sin paralelo)
+        devolver_fuentes (bool): Si True, devuelve también la fuente de cada dirección
+        reiniciar_cache (bool): Si True, vacía el cache de sesión antes de empezar.
+                                Usar False al procesar por páginas la misma ejecución
+        resueltas (dict): {índice: dirección limpia} ya conocidas por código de barras
+                          (almacén de resultados); no pasan por lookup ni modelo
         
     Returns:
         list: Lista de direcciones procesadas
+              Si devolver_fuentes es True: tupla (direcciones, fuentes) donde cada
+              fuente es 'almacen', 'cache', 'lookup' o 'modelo'
     """
     global _session_cache
-    _session_cache = {}  # Limpiar cache al inicio de cada procesamiento
+    if reiniciar_cache:
+        _session_cache = {}  # Limpiar cache al inicio de cada procesamiento
     
     print("\n  🤖 Procesando direcciones...")
     
@@ -214,29 +292,61 @@ def procesar_direcciones_con_modelo(direcciones_raw, mostrar_comparativa=True, b
     
     # Separar direcciones: las que están en lookup/cache vs las que necesitan modelo
     direcciones_procesadas = [None] * len(direcciones_raw)  # Pre-alocar lista
+    fuentes = ['modelo'] * len(direcciones_raw)
     direcciones_para_modelo = []  # (índice, dirección)
-    stats = {'cache': 0, 'lookup': 0, 'modelo': 0}
+    stats = {'almacen': 0, 'cache': 0, 'lookup': 0, 'modelo': 0}
+    resueltas = resueltas or {}
     
-    # Primera pasada: resolver lookup y cache
+    # Primera pasada: resolver almacén, lookup y cache
     for i, direccion_raw in enumerate(direcciones_raw):
         key = _normalizar_key(direccion_raw)
         
+        # Mismo código y misma dirección que en una ejecución anterior
+        if i in resueltas:
+            direcciones_procesadas[i] = resueltas[i]
+            fuentes[i] = 'almacen'
+            stats['almacen'] += 1
         # Buscar en cache de sesión
-        if key in _session_cache:
+        elif key in _session_cache:
             direcciones_procesadas[i] = _session_cache[key]
+            fuentes[i] = 'cache'
             stats['cache'] += 1
         # Buscar en lookup
         elif key in lookup_dict:
             resultado = lookup_dict[key]
             _session_cache[key] = resultado
             direcciones_procesadas[i] = resultado
+            fuentes[i] = 'lookup'
             stats['lookup'] += 1
         else:
             # Marcar para procesar con modelo
             direcciones_para_modelo.append((i, direccion_raw))
     
+    if workers is None:
+        from parallel_inference import MODEL_WORKERS
+        workers = MODEL_WORKERS
+    
     # Segunda pasada: procesar con modelo en lotes (batch)
-    if direcciones_para_modelo:
+    usar_pool = False
+    if direcciones_para_modelo and workers > 1 and len(direcciones_para_modelo) > batch_size:
+        # Si el servidor de modelo está activo, es más rápido que cargar K réplicas
+        from model_server import servidor_activo
+        usar_pool = not servidor_activo()
+    
+    if usar_pool:
+        from parallel_inference import procesar_en_paralelo
+        print(f"  ⚡ Procesando {len(direcciones_para_modelo)} direcciones nuevas en {workers} procesos paralelos...")
+        
+        batch_direcciones = [item[1] for item in direcciones_para_modelo]
+        with etapa('modelo_paralelo'):
+            resultados = procesar_en_paralelo(batch_direcciones, batch_size=batch_size, workers=workers)
+        contar('modelo.lotes', -(-len(batch_direcciones) // batch_size))
+        
+        for (idx, direccion_raw), resultado in zip(direcciones_para_modelo, resultados):
+            _session_cache[_normalizar_key(direccion_raw)] = resultado
+            direcciones_procesadas[idx] = resultado
+            stats['modelo'] += 1
+    elif direcciones_para_modelo:
         print(f"  ⚡ Procesando {len(direcciones_para_modelo)} direcciones nuevas en lotes de {batch_size}...")
         
         # Procesar en batches
@@ -264,23 +374,19 @@ def procesar_direcciones_con_modelo(direcciones_raw, mostrar_comparativa=True, b
         print("="*80)
         
         for i, (direccion_raw, direccion_procesada) in enumerate(zip(direcciones_raw, direcciones_procesadas)):
-            key = _normalizar_key(direccion_raw)
-            # Determinar fuente
-            if key in lookup_dict:
-                fuente = 'lookup'
-            elif any(idx == i for idx, _ in direcciones_para_modelo):
-                fuente = 'modelo'
-            else:
-                fuente = 'cache'
-            
-            icono = {'cache': '♻️', 'lookup': '📚', 'modelo': '🤖'}[fuente]
+            icono = {'almacen': '💾', 'cache': '♻️', 'lookup': '📚', 'modelo': '🤖'}[fuentes[i]]
             print(f"\n  [{i+1}] {icono} ANTES:  {direccion_raw}")
             print(f"      DESPUÉS: {direccion_procesada}")
         
         print("\n" + "="*80)
     
+    for fuente, n in stats.items():
+        contar(f'limpieza.{fuente}', n)
+    
     # Mostrar estadísticas
     print(f"\n  📊 Estadísticas de procesamiento:")
+    if stats['almacen']:
+        print(f"     💾 Almacén (ejecuciones anteriores): {stats['almacen']}")
     print(f"     ♻️  Cache (repetidas): {stats['cache']}")
     print(f"     📚 Lookup (conocidas): {stats['lookup']}")
     print(f"     🤖 Modelo IA (nuevas): {stats['modelo']}")
@@ -290,4 +396,39 @@ def procesar_direcciones_con_modelo(direcciones_raw, mostrar_comparativa=True, b
     elif stats['modelo'] > 0:
         print(f"     ⚡ Procesadas en lotes de {batch_size} (mucho más rápido)")
     
+    if devolver_fuentes:
+        return direcciones_procesadas, fuentes
     return direcciones_procesadas
+
+
+def aprender_correcciones(direcciones_raw, direcciones_procesadas, fuentes, coords_por_direccion):
+    """
+    Promueve al lookup las salidas del modelo que se han geocodificado dentro de una zona.
+    
+    Args:
+        direcciones_raw (list): Direcciones sin procesar
+        direcciones_procesadas (list): Direcciones limpias (mismo orden)
+        fuentes (list): Fuente de cada dirección ('cache', 'lookup' o 'modelo')
+        coords_por_direccion (dict): {direccion_limpia: (lat, lon)} de la geocodificación
+        
+    Returns:
+        int: Número de correcciones nuevas registradas
+    """
+    global _lookup_loaded
+    from correction_store import registrar_correcciones
+    from zone_manager import determinar_zona
+    
+    pares = []
+    for raw, procesada, fuente in zip(direcciones_raw, direcciones_procesadas, fuentes):
+        if fuente != 'modelo':
+            continue
+        coords = coords_por_direccion.get(procesada)
+        if coords and determinar_zona(coords) != 'sin_zona':
+            pares.append((_normalizar_key(raw), raw, procesada))
+    
+    nuevas = registrar_correcciones(pares, conocidas=_cargar_lookup())
+    if nuevas:
+        # Recargar el lookup en la próxima llamada para incluirlas
+        _lookup_loaded = False
+    
+    return nuevas
@@ -0,0 +1,341 @@
+"""
+Reprocesado histórico (backfill) de las hojas diarias archivadas
+
+Cada día archivado es un CSV con el formato de la hoja (el del backend 'local',
+ver local_sheets.py) en BACKFILL_ARCHIVO_DIR, con el día como nombre:
+
+    archivo/2025-03-01.csv
+    archivo/2025-03-02.csv
+    ...
+
+Los días se reparten entre un pool de procesos. Cada día se procesa con
+procesar_rutas sobre una copia de su hoja y con sus propios ficheros (estado,
+índice de códigos, almacén y puntos de control) en BACKFILL_SALIDA_DIR/<día>/.
+Lo que comparten los procesos se protege entre ellos:
+
+    - el caché de geocodificación: cada guardado se hace con bloqueo de fichero
+      y conserva lo que otros procesos guardaron mientras tanto (geocoding.save_cache)
+    - el límite de peticiones a Google Maps: un solo reloj para todo el pool
+      (LimitadorTasaCompartido)
+    - las correcciones aprendidas: con bloqueo de fichero (correction_store.py)
+
+Un día terminado deja su resumen.json y no se repite en la siguiente ejecución
+(salvo con --rehacer): si el backfill se corta, se relanza y sigue por donde iba.
+Al final se escribe un informe con el crecimiento del caché, el reparto de
+fuentes de limpieza (almacén, caché, lookup o modelo) y las paradas por zona y
+día (backfill.json y backfill_dias.csv en el directorio de salida).
+
+Cada proceso carga su propio modelo IA; con model_server.py arrancado, todos
+usan el mismo.
+
+Uso:
+    cd src
+    python backfill.py [--archivo archivo] [--procesos 4] [--desde 2025-03-01] [--hasta 2025-03-31]
+"""
+import argparse
+import contextlib
+import csv
+import json
+import multiprocessing
+import os
+import shutil
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import config
+
+BACKFILL_ARCHIVO_DIR = getattr(config, 'BACKFILL_ARCHIVO_DIR', 'archivo')
+BACKFILL_SALIDA_DIR = getattr(config, 'BACKFILL_SALIDA_DIR', 'backfill')
+BACKFILL_PROCESOS = getattr(config, 'BACKFILL_PROCESOS', 4)
+BACKFILL_GEOCODING_MAX_QPS = getattr(config, 'BACKFILL_GEOCODING_MAX_QPS', 40)
+
+RESUMEN_DIA = 'resumen.json'
+
+
+def dias_archivados(archivo=BACKFILL_ARCHIVO_DIR, desde=None, hasta=None):
+    """
+    Días archivados en orden, opcionalmente entre dos fechas (incluidas).
+
+    Returns:
+        list: [(día, ruta del CSV), ...]
+    """
+    dias = []
+    for nombre in sorted(os.listdir(archivo)):
+        dia, extension = os.path.splitext(nombre)
+        if extension.lower() != '.csv':
+            continue
+        if (desde and dia < desde) or (hasta and dia > hasta):
+            continue
+        dias.append((dia, os.path.join(archivo, nombre)))
+    return dias
+
+
+def _tamano_cache():
+    from geocoding import load_cache
+    return len(load_cache())
+
+
+def _iniciar_proceso(max_qps, siguiente, lock):
+    """Inicializador de cada proceso del pool: límite de la API común a todos."""
+    from geocoding import configurar_limitador
+    configurar_limitador(max_qps, (siguiente, lock))
+
+
+def _procesar_dia(dia, hoja, salida):
+    """
+    Procesa un día archivado (en un proceso del pool).
+
+    Args:
+        dia (str): Día (nombre del CSV)
+        hoja (str): CSV archivado del día
+        salida (str): Directorio de salida del backfill
+
+    Returns:
+        dict: Resumen del día ({'dia', 'ok', 'filas', 'puntos', 'zonas', 'fuentes',
+              'api_llamadas', 'cache_antes', 'cache_despues', 'pared_s'} o 'error')
+    """
+    from instrumentation import iniciar_ejecucion, instrumentacion_actual
+    from main import procesar_rutas
+    from multi_tenant import Inquilino
+
+    directorio = os.path.join(salida, dia)
+    if os.path.isdir(directorio):
+        shutil.rmtree(directorio)
+    os.makedirs(directorio)
+    # Se trabaja sobre una copia: los resultados se escriben en la hoja y el archivo no se toca
+    copia = os.path.join(directorio, 'hoja.csv')
+    shutil.copyfile(hoja, copia)
+
+    inquilino = Inquilino(
+        f"dia_{dia}",
+        backend='local',
+        hoja_local=copia,
+        estado_file=os.path.join(directorio, 'estado.json'),
+        indice_codigos_file=os.path.join(directorio, 'barcode_index.json'),
+        results_db_file=os.path.join(directorio, 'resultados.db'),
+        checkpoints_dir=os.path.join(directorio, 'ejecucion_en_curso')
+    )
+
+    resultado = {'dia': dia, 'ok': False, 'cache_antes': _tamano_cache()}
+    iniciar_ejecucion(f"backfill_{dia}")
+    t0 = time.perf_counter()
+    # La salida de cada día va a su log: los procesos no se mezclan en la consola
+    with open(os.path.join(directorio, 'salida.log'), 'w', encoding='utf-8') as log, \
+            contextlib.redirect_stdout(log):
+        try:
+            resumen = procesar_rutas(inquilino=inquilino)
+            if resumen is not None:
+                resultado.update(resumen)
+                resultado['ok'] = True
+            else:
+                resultado['error'] = 'Sin direcciones geocodificadas'
+        except Exception as e:
+            traceback.print_exc(file=log)
+            resultado['error'] = str(e)
+
+    contadores = instrumentacion_actual().informe()['contadores']
+    resultado['pared_s'] = round(time.perf_counter() - t0, 3)
+    resultado['api_llamadas'] = contadores.get('geocoding.api_llamadas', 0)
+    resultado['cache_hits'] = contadores.get('geocoding.cache_hits', 0)
+    resultado['cache_despues'] = _tamano_cache()
+
+    if resultado['ok']:
+        # Marca de día terminado (escritura atómica)
+        path = os.path.join(directorio, RESUMEN_DIA)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+        os.replace(path + '.tmp', path)
+    return resultado
+
+
+def _resumen_guardado(salida, dia):
+    path = os.path.join(salida, dia, RESUMEN_DIA)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def ejecutar_backfill(dias, salida=BACKFILL_SALIDA_DIR, procesos=BACKFILL_PROCESOS,
+                      max_qps=BACKFILL_GEOCODING_MAX_QPS, rehacer=False):
+    """
+    Procesa los días archivados en un pool de procesos.
+
+    Args:
+        dias (list): [(día, CSV), ...] (ver dias_archivados)
+        salida (str): Directorio con un subdirectorio por día
+        procesos (int): Días procesados a la vez
+        max_qps (float): Peticiones por segundo a Google Maps entre todos los procesos
+                         (None = sin límite)
+        rehacer (bool): Si True, repite también los días ya terminados
+
+    Returns:
+        tuple: (resultados por día en orden, {'cache_inicial', 'cache_final'})
+    """
+    os.makedirs(salida, exist_ok=True)
+    resultados = {}
+    pendientes = []
+    for dia, hoja in dias:
+        guardado = None if rehacer else _resumen_guardado(salida, dia)
+        if guardado is not None:
+            resultados[dia] = {**guardado, 'saltado': True}
+        else:
+            pendientes.append((dia, hoja))
+
+    cache_inicial = _tamano_cache()
+    print(f"\n  🗄️ Backfill: {len(dias)} días ({len(dias) - len(pendientes)} ya hechos), "
+          f"{min(procesos, len(pendientes)) if pendientes else 0} procesos, caché con {cache_inicial} direcciones")
+
+    if pendientes:
+        contexto = multiprocessing.get_context()
+        # Reloj del límite de la API compartido por todos los procesos
+        siguiente = contexto.Value('d', 0.0, lock=False)
+        lock = contexto.Lock()
+        with ProcessPoolExecutor(max_workers=max(1, min(procesos, len(pendientes))), mp_context=contexto,
+                                 initializer=_iniciar_proceso, initargs=(max_qps, siguiente, lock)) as executor:
+            futuros = {executor.submit(_procesar_dia, dia, hoja, salida): dia for dia, hoja in pendientes}
+            for n, futuro in enumerate(as_completed(futuros), 1):
+                dia = futuros[futuro]
+                try:
+                    resultado = futuro.result()
+                except Exception as e:
+                    # El proceso murió (no un fallo del pipeline, que _procesar_dia ya recoge)
+                    resultado = {'dia': dia, 'ok': False, 'error': str(e)}
+                resultados[dia] = resultado
+                if resultado['ok']:
+                    print(f"  ✅ [{n}/{len(pendientes)}] {dia}: {resultado['puntos']} puntos, "
+                          f"{resultado['api_llamadas']} consultas a la API ({resultado['pared_s']:.1f} s)")
+                else:
+                    print(f"  ❌ [{n}/{len(pendientes)}] {dia}: {resultado.get('error')} "
+                          f"(ver {os.path.join(salida, dia, 'salida.log')})")
+
+    # El caché en memoria de este proceso no ha visto lo que guardaron los demás
+    cache_final = _tamano_cache()
+    return [resultados[dia] for dia, _ in dias], {'cache_inicial': cache_inicial, 'cache_final': cache_final}
+
+
+def agregar(resultados, cache):
+    """
+    Estadísticas agregadas del backfill.
+
+    Args:
+        resultados (list): Resultados por día (de ejecutar_backfill)
+        cache (dict): {'cache_inicial', 'cache_final'}
+
+    Returns:
+        dict: Totales, crecimiento del caché, reparto de fuentes, paradas por zona y día
+    """
+    correctos = [r for r in resultados if r['ok']]
+    fuentes = {}
+    for resultado in correctos:
+        for fuente, n in resultado.get('fuentes', {}).items():
+            fuentes[fuente] = fuentes.get(fuente, 0) + n
+    total_fuentes = sum(fuentes.values()) or 1
+
+    zonas = sorted({zona for r in correctos for zona in r.get('zonas', {})})
+    return {
+        'dias': len(resultados),
+        'dias_ok': len(correctos),
+        'dias_saltados': sum(1 for r in resultados if r.get('saltado')),
+        'dias_error': [r['dia'] for r in resultados if not r['ok']],
+        'filas': sum(r.get('filas', 0) for r in correctos),
+        'puntos': sum(r.get('puntos', 0) for r in correctos),
+        'no_encontradas': sum(r.get('no_encontradas', 0) for r in correctos),
+        'api_llamadas': sum(r.get('api_llamadas', 0) for r in resultados if not r.get('saltado')),
+        'cache': {**cache, 'crecimiento': cache['cache_final'] - cache['cache_inicial']},
+        'fuentes': {fuente: {'n': n, 'porcentaje': round(100 * n / total_fuentes, 1)}
+                    for fuente, n in sorted(fuentes.items())},
+        'paradas_por_zona': {
+            zona: {r['dia']: r['zonas'].get(zona, 0) for r in correctos} for zona in zonas
+        },
+    }
+
+
+def guardar_informe_backfill(resultados, agregado, salida=BACKFILL_SALIDA_DIR):
+    """
+    Escribe backfill.json (agregado + días) y backfill_dias.csv (una fila por día).
+
+    Returns:
+        tuple: (ruta del JSON, ruta del CSV)
+    """
+    path_json = os.path.join(salida, 'backfill.json')
+    with open(path_json + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'creado': datetime.now().isoformat(timespec='seconds'), **agregado, 'por_dia': resultados},
+                  f, ensure_ascii=False, indent=2)
+    os.replace(path_json + '.tmp', path_json)
+
+    zonas = list(agregado['paradas_por_zona'])
+    fuentes = list(agregado['fuentes'])
+    path_csv = os.path.join(salida, 'backfill_dias.csv')
+    with open(path_csv, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['dia', 'ok', 'filas', 'puntos', 'no_encontradas', 'api_llamadas',
+                         'cache_antes', 'cache_despues']
+                        + [f"zona_{zona}" for zona in zonas] + [f"fuente_{fuente}" for fuente in fuentes])
+        for r in resultados:
+            writer.writerow([r['dia'], int(r['ok']), r.get('filas', ''), r.get('puntos', ''),
+                             r.get('no_encontradas', ''), r.get('api_llamadas', ''),
+                             r.get('cache_antes', ''), r.get('cache_despues', '')]
+                            + [r.get('zonas', {}).get(zona, '') for zona in zonas]
+                            + [r.get('fuentes', {}).get(fuente, '') for fuente in fuentes])
+    return path_json, path_csv
+
+
+def imprimir_agregado(agregado):
+    print("\n" + "="*60)
+    print("  BACKFILL HISTÓRICO")
+    print("="*60)
+    print(f"  📅 Días: {agregado['dias_ok']}/{agregado['dias']} correctos "
+          f"({agregado['dias_saltados']} ya hechos antes)")
+    if agregado['dias_error']:
+        print(f"  ❌ Con error: {', '.join(agregado['dias_error'])}")
+    print(f"  📦 {agregado['filas']} filas, {agregado['puntos']} puntos, "
+          f"{agregado['no_encontradas']} no encontradas")
+    cache = agregado['cache']
+    print(f"  🗺️ Caché de geocodificación: {cache['cache_inicial']} → {cache['cache_final']} "
+          f"(+{cache['crecimiento']}), {agregado['api_llamadas']} consultas a la API")
+    if agregado['fuentes']:
+        print("  🤖 Fuentes de limpieza: " + ", ".join(
+            f"{fuente} {datos['porcentaje']}%" for fuente, datos in agregado['fuentes'].items()))
+    for zona, por_dia in agregado['paradas_por_zona'].items():
+        valores = list(por_dia.values())
+        print(f"     - {zona}: {sum(valores) / len(valores):.1f} paradas/día "
+              f"(mín {min(valores)}, máx {max(valores)})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BikeLogic - reprocesado de las hojas diarias archivadas")
+    parser.add_argument('--archivo', default=BACKFILL_ARCHIVO_DIR,
+                        help="Directorio con un CSV por día (<día>.csv)")
+    parser.add_argument('--salida', default=BACKFILL_SALIDA_DIR,
+                        help="Directorio de resultados (un subdirectorio por día)")
+    parser.add_argument('--procesos', type=int, default=BACKFILL_PROCESOS,
+                        help="Días procesados a la vez")
+    parser.add_argument('--max-qps', type=float, default=BACKFILL_GEOCODING_MAX_QPS,
+                        help="Peticiones por segundo a Google Maps entre todos los procesos (0 = sin límite)")
+    parser.add_argument('--desde', metavar='DIA', help="Primer día a procesar (incluido)")
+    parser.add_argument('--hasta', metavar='DIA', help="Último día a procesar (incluido)")
+    parser.add_argument('--rehacer', action='store_true',
+                        help="Repetir también los días ya terminados")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.archivo):
+        parser.error(f"No existe el directorio de archivo: {args.archivo}")
+    dias = dias_archivados(args.archivo, args.desde, args.hasta)
+    if not dias:
+        parser.error(f"No hay días archivados (<día>.csv) en {args.archivo}")
+
+    resultados, cache = ejecutar_backfill(dias, args.salida, args.procesos, args.max_qps or None, args.rehacer)
+    agregado = agregar(resultados, cache)
+    imprimir_agregado(agregado)
+    path_json, path_csv = guardar_informe_backfill(resultados, agregado, args.salida)
+    print(f"\n  📈 Informe del backfill: {path_json} (por día: {path_csv})")
+
+
+if __name__ == "__main__":
+    main()
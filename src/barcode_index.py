@@ -0,0 +1,84 @@
+"""
+Índice de códigos de barras para el escáner web (docs/app.js)
+
+Publica un JSON compacto código → (zona, posición, dirección) junto a la
+escritura de resultados, para que el escáner responda cada lectura con una
+sola búsqueda en un diccionario en lugar de recorrer todas las filas.
+
+Formato:
+    {
+        "generado": "2024-01-01T08:00:00",
+        "zonas": ["Indust", "Centre", "Mirasol", "sin_zona"],
+        "codigos": {"1234567890": [0, 5, "CARRER ..."], ...}
+    }
+donde cada valor es [índice en "zonas", posición (1 = primera fila), dirección].
+
+Contiene direcciones de clientes: se escribe fuera de docs/ (que se publica en
+GitHub Pages) y está en .gitignore. Para usarlo desde el escáner hay que
+servirlo en una URL privada y ponerla en BARCODE_INDEX_URL (docs/runtime-config.js).
+"""
+import json
+import os
+from datetime import datetime
+
+import config
+
+BARCODE_INDEX_FILE = getattr(config, 'BARCODE_INDEX_FILE', 'barcode_index.json')
+
+
+def construir_indice_codigos(zonas_ordenadas, excluir_inicio_fin=False):
+    """
+    Construye el índice a partir de los resultados ordenados por zona.
+
+    Args:
+        zonas_ordenadas (dict): {zona: [(coords, address, codigos_barras), ...]}
+        excluir_inicio_fin (bool): Igual que en escribir_resultados_por_zona,
+                                   para que las posiciones coincidan con la hoja
+
+    Returns:
+        dict: Índice listo para serializar
+    """
+    zonas = []
+    codigos = {}
+
+    for zona_name, items in zonas_ordenadas.items():
+        if excluir_inicio_fin:
+            items = items[1:-1] if len(items) > 2 else []
+        if not items:
+            continue
+
+        zona_idx = len(zonas)
+        zonas.append(zona_name)
+
+        for posicion, item in enumerate(items, 1):
+            address = item[1]
+            codigos_barras = item[2] if len(item) >= 3 else []
+            for codigo in codigos_barras:
+                clave = str(codigo).strip().lower()
+                if clave and clave not in codigos:
+                    codigos[clave] = [zona_idx, posicion, address]
+
+    return {
+        'generado': datetime.now().isoformat(timespec='seconds'),
+        'zonas': zonas,
+        'codigos': codigos
+    }
+
+
+def publicar_indice_codigos(zonas_ordenadas, path=BARCODE_INDEX_FILE, excluir_inicio_fin=False):
+    """
+    Escribe el índice de códigos en disco (escritura atómica).
+
+    Returns:
+        int: Número de códigos indexados
+    """
+    indice = construir_indice_codigos(zonas_ordenadas, excluir_inicio_fin)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        # Sin espacios: es un artefacto para el móvil, no para leer
+        json.dump(indice, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+    print(f"  ✓ Índice de códigos publicado: {len(indice['codigos'])} códigos en {path}")
+    return len(indice['codigos'])
@@ -0,0 +1,279 @@
+"""
+Benchmarks por etapa del pipeline con cargas sintéticas (no son tests)
+
+Mide por separado cada etapa con cargas de 1k, 10k y 100k paquetes generadas
+por synthetic_workload.py, sin red ni credenciales:
+
+    normalizar_lookup  _normalizar_key + búsqueda en el lookup
+    geocodificacion    geocode_and_store con caché vacío contra un sustituto local de la API
+    zonas              separar_por_zonas con los polígonos de data/
+    ordenacion         procesar_zonas_con_linea con las líneas de data/
+    escritura          escribir_fase_resultados sobre una hoja local en memoria
+
+Cada medida es la mejor de N repeticiones. Con --guardar-referencia los tiempos
+se guardan en BENCHMARK_BASELINES_FILE; en las siguientes ejecuciones se comparan
+con esa referencia y, si alguna etapa es más lenta que el umbral, el comando
+termina con código 1 (útil antes de subir un cambio). La referencia depende de
+la máquina: guárdala en la misma en la que vas a comparar.
+
+Uso:
+    cd src
+    python benchmark.py                              # 1k, 10k y 100k
+    python benchmark.py --tamanos 1000 10000 --etapas zonas ordenacion
+    python benchmark.py --guardar-referencia
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import config
+
+BENCHMARK_BASELINES_FILE = getattr(config, 'BENCHMARK_BASELINES_FILE', 'benchmark_baselines.json')
+BENCHMARK_UMBRAL_REGRESION = getattr(config, 'BENCHMARK_UMBRAL_REGRESION', 0.2)  # 20 % más lento
+BENCHMARK_MIN_S = 0.005  # Por debajo de 5 ms el ruido domina: no se marca como regresión
+
+TAMANOS = (1000, 10000, 100000)
+
+
+def _etapa_normalizar_lookup(carga, _):
+    from address_model_cleaner import _normalizar_key
+
+    lookup = carga['lookup']
+    raws = carga['direcciones_raw']
+
+    def ejecutar():
+        return [lookup.get(_normalizar_key(raw)) for raw in raws]
+    return ejecutar
+
+
+def _etapa_geocodificacion(carga, estado):
+    import geocoding
+
+    coordenadas = carga['coordenadas']
+    directorio = estado.setdefault('tmp', tempfile.mkdtemp(prefix='bench_geocoding_'))
+    geocoding.CACHE_FILE = os.path.join(directorio, 'geocoding_cache.json')
+    # Sustituto local de la API: mismas coordenadas que la carga, sin red
+    geocoding.geocode_with_google_maps = lambda address, google_maps_api_key=None: coordenadas.get(address)
+
+    def ejecutar():
+        # Caché vacío en cada repetición: mide llamadas, agrupación y guardado
+        if os.path.exists(geocoding.CACHE_FILE):
+            os.remove(geocoding.CACHE_FILE)
+        geocoding._cache_memoria.update(mtime=None, datos=None)
+        geocoded, not_found = geocoding.geocode_and_store(
+            carga['direcciones_limpias'], delay=0, use_parallel=False,
+            codigos_barras=list(carga['codigos'])
+        )
+        estado['geocoded'], estado['not_found'] = geocoded, not_found
+        return geocoded
+    return ejecutar
+
+
+def _etapa_zonas(carga, estado):
+    from zone_manager import construir_indice_zonas, separar_por_zonas
+
+    indice = construir_indice_zonas(carga['poligonos'])
+    geocoded = estado['geocoded']
+
+    def ejecutar():
+        estado['zonas'] = separar_por_zonas(geocoded, indice)
+        return estado['zonas']
+    return ejecutar
+
+
+def _etapa_ordenacion(carga, estado):
+    from line_distance_solver import procesar_zonas_con_linea
+
+    zonas = estado['zonas']
+
+    def ejecutar():
+        estado['zonas_ordenadas'] = procesar_zonas_con_linea(zonas, carga['lineas'])
+        return estado['zonas_ordenadas']
+    return ejecutar
+
+
+def _etapa_escritura(carga, estado):
+    from local_sheets import LocalSheetsManager
+
+    filas = [[codigo, '', '', '', raw] for codigo, raw in zip(carga['codigos'], carga['direcciones_raw'])]
+    zonas_ordenadas = estado['zonas_ordenadas']
+    not_found = estado['not_found']
+
+    def ejecutar():
+        manager = LocalSheetsManager.desde_filas(filas, cabecera=list('abcde'))
+        return manager.escribir_fase_resultados(zonas_ordenadas, not_found, excluir_inicio_fin=False)
+    return ejecutar
+
+
+# Cada etapa prepara sus entradas (fuera de la medida) a partir de la carga y de
+# las salidas de las etapas anteriores, y devuelve la función a medir
+ETAPAS = {
+    'normalizar_lookup': _etapa_normalizar_lookup,
+    'geocodificacion': _etapa_geocodificacion,
+    'zonas': _etapa_zonas,
+    'ordenacion': _etapa_ordenacion,
+    'escritura': _etapa_escritura,
+}
+# Etapas cuyas salidas necesitan las siguientes
+_DEPENDENCIAS = {'zonas': 'geocodificacion', 'ordenacion': 'zonas', 'escritura': 'ordenacion'}
+
+
+def _con_dependencias(etapas):
+    necesarias = set(etapas)
+    for etapa in etapas:
+        while etapa in _DEPENDENCIAS:
+            etapa = _DEPENDENCIAS[etapa]
+            necesarias.add(etapa)
+    return [etapa for etapa in ETAPAS if etapa in necesarias]
+
+
+def medir(funcion, repeticiones):
+    """
+    Returns:
+        dict: {'s': mejor tiempo, 'mediana_s'} de `repeticiones` ejecuciones
+    """
+    tiempos = []
+    # La salida de las etapas (prints por dirección/zona) no debe contar en la medida
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+        for _ in range(repeticiones):
+            t0 = time.perf_counter()
+            funcion()
+            tiempos.append(time.perf_counter() - t0)
+    return {'s': round(min(tiempos), 6), 'mediana_s': round(statistics.median(tiempos), 6)}
+
+
+def ejecutar_benchmarks(tamanos=TAMANOS, etapas=None, repeticiones=3, semilla=0):
+    """
+    Genera una carga por tamaño y mide las etapas pedidas.
+
+    Args:
+        tamanos (list): Números de paquetes
+        etapas (list): Etapas a medir (None = todas); las que necesitan se ejecutan igualmente
+        repeticiones (int): Repeticiones por medida (se guarda la mejor)
+        semilla (int): Semilla de la carga sintética
+
+    Returns:
+        dict: {str(tamaño): {etapa: {'s', 'mediana_s', 'us_por_paquete'}}}
+    """
+    from synthetic_workload import generar_carga
+
+    etapas = list(ETAPAS) if not etapas else etapas
+    resultados = {}
+    for tamano in tamanos:
+        print(f"\n  🧪 Carga sintética de {tamano} paquetes...")
+        t0 = time.perf_counter()
+        carga = generar_carga(tamano, semilla=semilla)
+        print(f"     Generada en {time.perf_counter() - t0:.2f} s ({len(carga['coordenadas'])} paradas)")
+
+        estado = {}
+        resultados[str(tamano)] = {}
+        for nombre in _con_dependencias(etapas):
+            funcion = ETAPAS[nombre](carga, estado)
+            # Las dependencias solo se ejecutan una vez, para producir sus salidas
+            medida = medir(funcion, repeticiones if nombre in etapas else 1)
+            if nombre not in etapas:
+                continue
+            medida['us_por_paquete'] = round(medida['s'] / tamano * 1e6, 3)
+            resultados[str(tamano)][nombre] = medida
+            print(f"     - {nombre}: {medida['s'] * 1000:.1f} ms ({medida['us_por_paquete']:.1f} µs/paquete)")
+
+        if 'tmp' in estado:
+            shutil.rmtree(estado['tmp'], ignore_errors=True)
+    return resultados
+
+
+def _entorno():
+    return {'python': sys.version.split()[0], 'plataforma': platform.platform(), 'cpus': os.cpu_count()}
+
+
+def cargar_referencia(path=BENCHMARK_BASELINES_FILE):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def guardar_referencia(resultados, path=BENCHMARK_BASELINES_FILE):
+    """Guarda (fusionando con la anterior) la referencia de tiempos por tamaño y etapa."""
+    referencia = cargar_referencia(path) or {'resultados': {}}
+    for tamano, etapas in resultados.items():
+        referencia['resultados'].setdefault(tamano, {}).update(etapas)
+    referencia['entorno'] = _entorno()
+    referencia['actualizado'] = datetime.now().isoformat(timespec='seconds')
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(referencia, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    print(f"\n  💾 Referencia guardada en {path}")
+
+
+def comparar(resultados, referencia, umbral=BENCHMARK_UMBRAL_REGRESION):
+    """
+    Compara con la referencia e imprime la variación de cada medida.
+
+    Returns:
+        list: Regresiones [(tamaño, etapa, referencia_s, actual_s)]
+    """
+    if referencia.get('entorno') != _entorno():
+        print("  ⚠️ La referencia se midió en otro entorno: las diferencias pueden no ser del código")
+
+    regresiones = []
+    print(f"\n  📊 Comparación con la referencia ({referencia.get('actualizado')}, umbral +{umbral:.0%}):")
+    for tamano, etapas in resultados.items():
+        for nombre, medida in etapas.items():
+            base = referencia['resultados'].get(tamano, {}).get(nombre)
+            if base is None:
+                print(f"     - {tamano} {nombre}: sin referencia")
+                continue
+            variacion = medida['s'] / base['s'] - 1 if base['s'] else 0.0
+            es_regresion = variacion > umbral and medida['s'] >= BENCHMARK_MIN_S
+            marca = '❌' if es_regresion else '✓'
+            print(f"     {marca} {tamano} {nombre}: {base['s'] * 1000:.1f} → {medida['s'] * 1000:.1f} ms "
+                  f"({variacion:+.0%})")
+            if es_regresion:
+                regresiones.append((tamano, nombre, base['s'], medida['s']))
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BikeLogic - benchmarks por etapa con cargas sintéticas")
+    parser.add_argument('--tamanos', type=int, nargs='+', default=list(TAMANOS),
+                        help="Paquetes por carga (por defecto 1000 10000 100000)")
+    parser.add_argument('--etapas', nargs='+', choices=list(ETAPAS), help="Etapas a medir (por defecto todas)")
+    parser.add_argument('--repeticiones', type=int, default=3, help="Repeticiones por medida (se usa la mejor)")
+    parser.add_argument('--semilla', type=int, default=0, help="Semilla de la carga sintética")
+    parser.add_argument('--umbral', type=float, default=BENCHMARK_UMBRAL_REGRESION,
+                        help="Variación máxima sobre la referencia antes de marcar regresión (0.2 = +20%%)")
+    parser.add_argument('--referencia', default=BENCHMARK_BASELINES_FILE, help="Fichero de referencia")
+    parser.add_argument('--guardar-referencia', action='store_true',
+                        help="Guardar estos tiempos como nueva referencia")
+    args = parser.parse_args()
+
+    resultados = ejecutar_benchmarks(args.tamanos, args.etapas, args.repeticiones, args.semilla)
+
+    regresiones = []
+    referencia = cargar_referencia(args.referencia)
+    if referencia and not args.guardar_referencia:
+        regresiones = comparar(resultados, referencia, args.umbral)
+    elif not referencia and not args.guardar_referencia:
+        print("\n  ℹ️ Sin referencia: usa --guardar-referencia para guardar estos tiempos")
+
+    if args.guardar_referencia:
+        guardar_referencia(resultados, args.referencia)
+
+    if regresiones:
+        print(f"\n  ❌ {len(regresiones)} regresiones por encima del {args.umbral:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+"""
+Grabación y reproducción de las llamadas externas de una ejecución (cassettes)
+
+En modo grabación, cada petición a la API de Google Sheets (por debajo de
+SheetsManager) y cada geocodificación de Google Maps (geocode_with_google_maps)
+se guarda con su respuesta y su latencia. El fichero es local y compacto:
+JSON por líneas comprimido con gzip. También se guarda al empezar una
+instantánea del estado local que cambia las rutas: caché de geocodificación,
+correcciones aprendidas y almacén de resultados (paquetes y memoria de rutas).
+
+En modo reproducción, las mismas peticiones reciben las respuestas grabadas sin
+red ni credenciales, con la latencia original o sin latencia. Así se puede
+repetir offline un día real y comparar tiempos y resultados de versiones
+distintas del pipeline. Las escrituras en la hoja no se envían: se comparan con
+las grabadas (iguales / distintas).
+
+Uso:
+    cd src
+    python main.py --grabar                          # CASSETTES_DIR/<fecha>_<hora>.jsonl.gz
+    python main.py --reproducir cassettes/20250301_071500.jsonl.gz [--latencia cero]
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import time
+from collections import deque
+from contextlib import closing
+from datetime import datetime
+from threading import Lock
+
+import config
+from instrumentation import contar
+
+CASSETTES_DIR = getattr(config, 'CASSETTES_DIR', 'cassettes')
+REPRODUCCIONES_DIR = getattr(config, 'REPRODUCCIONES_DIR', 'reproducciones')
+
+VERSION_CASSETTE = 1
+_TABLAS_ALMACEN = ('paquetes', 'memoria_rutas')  # Tablas de resultados.db en la instantánea
+_MAX_DIFERENCIAS = 50  # Escrituras distintas detalladas en el resumen
+
+
+class CassetteSinRespuesta(LookupError):
+    """La reproducción pide una lectura que no está grabada"""
+
+
+def _clave_peticion(metodo, uri, cuerpo):
+    return hashlib.sha1(f"{metodo}\x1f{uri}\x1f{cuerpo or ''}".encode('utf-8')).hexdigest()
+
+
+class Cassette:
+    """Fichero de peticiones y respuestas de una ejecución (seguro entre hilos)"""
+
+    def __init__(self, path, modo, latencia='original'):
+        """
+        Args:
+            path (str): Fichero .jsonl.gz
+            modo (str): 'grabar' o 'reproducir'
+            latencia (str): Al reproducir, 'original' (espera lo que tardó la
+                            llamada grabada) o 'cero'
+        """
+        if modo not in ('grabar', 'reproducir'):
+            raise ValueError(f"Modo de cassette desconocido: {modo!r} (usa 'grabar' o 'reproducir')")
+        if latencia not in ('original', 'cero'):
+            raise ValueError(f"Latencia desconocida: {latencia!r} (usa 'original' o 'cero')")
+
+        self.path = path
+        self.modo = modo
+        self.latencia = latencia
+        self.cabecera = None
+        self.instantaneas = {}
+        self.estadisticas = {
+            'sheets': 0, 'geocoding': 0, 'sin_respuesta': 0,
+            'escrituras_iguales': 0, 'escrituras_distintas': 0
+        }
+        self.diferencias = []
+        self._lock = Lock()
+        self._fichero = None
+
+        if self.grabando:
+            directorio = os.path.dirname(path)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            self._fichero = gzip.open(path, 'wt', encoding='utf-8')
+            self._escribir({'cassette': VERSION_CASSETTE, 'creado': datetime.now().isoformat(timespec='seconds')})
+        else:
+            self._cargar()
+
+    @property
+    def grabando(self):
+        return self.modo == 'grabar'
+
+    @property
+    def reproduciendo(self):
+        return self.modo == 'reproducir'
+
+    def _escribir(self, registro):
+        linea = json.dumps(registro, ensure_ascii=False, separators=(',', ':'))
+        with self._lock:
+            self._fichero.write(linea + '\n')
+
+    def _cargar(self):
+        self._sheets = {}  # {clave: deque(registros)}
+        self._escrituras_por_op = {}  # {op: deque(registros)} para escrituras que no coinciden
+        self._geocoding = {}  # {dirección: deque(registros)}
+
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                for linea in f:
+                    registro = json.loads(linea)
+                    tipo = registro.get('tipo')
+                    if 'cassette' in registro:
+                        self.cabecera = registro
+                    elif tipo == 'sheets':
+                        self._sheets.setdefault(registro['clave'], deque()).append(registro)
+                        if registro['metodo'] != 'GET':
+                            self._escrituras_por_op.setdefault(registro['op'], deque()).append(registro)
+                    elif tipo == 'geocoding':
+                        self._geocoding.setdefault(registro['direccion'], deque()).append(registro)
+                    elif tipo == 'instantanea':
+                        self.instantaneas[registro['nombre']] = registro['datos']
+        except EOFError:
+            # Grabación interrumpida (sin cierre del gzip): vale lo leído hasta ahí
+            print(f"  ⚠️ Cassette incompleto: {self.path} (se usa lo grabado hasta el corte)")
+
+        if self.cabecera is None:
+            raise ValueError(f"No es un cassette válido: {self.path}")
+
+    def _esperar(self, registro):
+        if self.latencia == 'original' and registro.get('ms'):
+            time.sleep(registro['ms'] / 1000)
+
+    def sheets(self, nombre, peticion, ejecutar):
+        """
+        Graba o reproduce una petición a la API de Sheets.
+
+        Args:
+            nombre (str): Primitiva de SheetsManager ('leer_rango_filas'...)
+            peticion (HttpRequest): Petición de googleapiclient (sin ejecutar)
+            ejecutar (callable): Ejecuta la petición real (solo al grabar)
+
+        Returns:
+            dict: Respuesta de la API (real o grabada)
+        """
+        clave = _clave_peticion(peticion.method, peticion.uri, peticion.body)
+
+        if self.grabando:
+            t0 = time.perf_counter()
+            respuesta = ejecutar()
+            ms = round((time.perf_counter() - t0) * 1000, 1)
+            self._escribir({'tipo': 'sheets', 'op': nombre, 'clave': clave, 'metodo': peticion.method,
+                            'uri': peticion.uri, 'cuerpo': peticion.body, 'respuesta': respuesta, 'ms': ms})
+            with self._lock:
+                self.estadisticas['sheets'] += 1
+            return respuesta
+
+        with self._lock:
+            self.estadisticas['sheets'] += 1
+            cola = self._sheets.get(clave)
+            if peticion.method == 'GET':
+                if not cola:
+                    self.estadisticas['sin_respuesta'] += 1
+                    raise CassetteSinRespuesta(f"Lectura no grabada: {nombre} {peticion.uri}")
+                # Lecturas repetidas más veces que al grabar: se repite la última respuesta
+                registro = cola.popleft() if len(cola) > 1 else cola[0]
+            elif cola:
+                registro = cola.popleft()
+                self._escrituras_por_op[nombre].remove(registro)
+                self.estadisticas['escrituras_iguales'] += 1
+            else:
+                # Escritura distinta de la grabada: se anota y se responde con la grabada de la misma primitiva
+                self.estadisticas['escrituras_distintas'] += 1
+                if len(self.diferencias) < _MAX_DIFERENCIAS:
+                    self.diferencias.append({'op': nombre, 'uri': peticion.uri})
+                cola_op = self._escrituras_por_op.get(nombre)
+                registro = cola_op.popleft() if cola_op else None
+                if registro is not None:
+                    self._sheets[registro['clave']].remove(registro)
+
+        contar('cassette.sheets_reproducidas')
+        if registro is None:
+            return {}
+        self._esperar(registro)
+        return registro['respuesta']
+
+    def geocodificar(self, direccion, consultar):
+        """
+        Graba o reproduce una geocodificación.
+
+        Args:
+            direccion (str): Dirección geocodificada
+            consultar (callable): Llama a la API real (solo al grabar)
+
+        Returns:
+            tuple: (lat, lon) o None
+        """
+        if self.grabando:
+            t0 = time.perf_counter()
+            coords = consultar()
+            ms = round((time.perf_counter() - t0) * 1000, 1)
+            self._escribir({'tipo': 'geocoding', 'direccion': direccion,
+                            'respuesta': list(coords) if coords else None, 'ms': ms})
+            with self._lock:
+                self.estadisticas['geocoding'] += 1
+            return coords
+
+        with self._lock:
+            self.estadisticas['geocoding'] += 1
+            cola = self._geocoding.get(direccion)
+            # Si la dirección se pidió varias veces, la última respuesta se reutiliza
+            registro = (cola.popleft() if len(cola) > 1 else cola[0]) if cola else None
+            if registro is None:
+                self.estadisticas['sin_respuesta'] += 1
+
+        if registro is None:
+            contar('cassette.geocoding_sin_respuesta')
+            return None
+        contar('cassette.geocoding_reproducidas')
+        self._esperar(registro)
+        return tuple(registro['respuesta']) if registro['respuesta'] else None
+
+    def guardar_instantanea(self, nombre, datos):
+        """Guarda un estado local al empezar (p. ej. el caché de geocodificación)."""
+        if self.grabando:
+            self._escribir({'tipo': 'instantanea', 'nombre': nombre, 'datos': datos})
+
+    def resumen(self):
+        with self._lock:
+            return {'modo': self.modo, 'fichero': self.path, 'latencia': self.latencia,
+                    **self.estadisticas, 'diferencias': list(self.diferencias)}
+
+    def cerrar(self):
+        if self._fichero is not None:
+            with self._lock:
+                self._fichero.close()
+                self._fichero = None
+
+
+_activo = None
+
+
+def activar(path, modo, latencia='original'):
+    """
+    Activa un cassette para todo el proceso (SheetsManager y geocoding lo consultan).
+
+    Returns:
+        Cassette: Cassette activo
+    """
+    global _activo
+    _activo = Cassette(path, modo, latencia)
+    return _activo
+
+
+def cassette_activo():
+    return _activo
+
+
+def desactivar():
+    """Cierra el cassette activo y devuelve su resumen (o None si no había)."""
+    global _activo
+    if _activo is None:
+        return None
+    _activo.cerrar()
+    resumen = _activo.resumen()
+    _activo = None
+    return resumen
+
+
+def nombre_grabacion():
+    """Ruta por defecto de una grabación nueva: CASSETTES_DIR/<fecha>_<hora>.jsonl.gz"""
+    return os.path.join(CASSETTES_DIR, f"{datetime.now():%Y%m%d_%H%M%S}.jsonl.gz")
+
+
+def _leer_tablas(db_file):
+    """Filas de las tablas del almacén -> {tabla: {'columnas', 'filas'}} (las que existan)."""
+    tablas = {}
+    if not os.path.exists(db_file):
+        return tablas
+    with closing(sqlite3.connect(db_file)) as conexion:
+        existentes = {fila[0] for fila in conexion.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for tabla in _TABLAS_ALMACEN:
+            if tabla in existentes:
+                cursor = conexion.execute(f"SELECT * FROM {tabla}")
+                tablas[tabla] = {'columnas': [d[0] for d in cursor.description],
+                                 'filas': [list(fila) for fila in cursor]}
+    return tablas
+
+
+def _restaurar_tablas(tablas, db_file):
+    """Crea el almacén de la reproducción con las filas grabadas."""
+    import results_store
+    import route_memory
+
+    # Los esquemas (tablas e índices) los crean los propios módulos
+    with closing(results_store._conectar(db_file)):
+        pass
+    with closing(route_memory._conectar(db_file)) as conexion:
+        with conexion:
+            for tabla, datos in tablas.items():
+                columnas = ', '.join(datos['columnas'])
+                marcas = ', '.join('?' * len(datos['columnas']))
+                conexion.executemany(f"INSERT OR REPLACE INTO {tabla} ({columnas}) VALUES ({marcas})",
+                                     datos['filas'])
+
+
+def grabar_estado_local(cassette, db_file=None):
+    """
+    Guarda en el cassette el estado local con el que empieza la ejecución.
+
+    Args:
+        cassette (Cassette): Cassette en modo grabación
+        db_file (str): Almacén de resultados (por defecto RESULTS_DB_FILE)
+    """
+    import correction_store
+    import geocoding
+    from results_store import RESULTS_DB_FILE
+
+    cassette.guardar_instantanea('geocoding_cache', geocoding.load_cache())
+
+    correcciones = {}
+    for atributo in ('CORRECCIONES_AUTO_FILE', 'CORRECCIONES_LOG_FILE'):
+        path = getattr(correction_store, atributo)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                correcciones[atributo] = f.read()
+        else:
+            correcciones[atributo] = None
+    cassette.guardar_instantanea('correcciones', correcciones)
+
+    cassette.guardar_instantanea('almacen', _leer_tablas(db_file or RESULTS_DB_FILE))
+
+
+def preparar_reproduccion(cassette):
+    """
+    Aísla los ficheros locales de una reproducción para no tocar los reales.
+    Caché de geocodificación, correcciones aprendidas y almacén de resultados
+    (paquetes y memoria de rutas) empiezan como al grabar; estado e índice de
+    códigos, vacíos. Los cassettes sin instantánea de correcciones usan una
+    copia de las actuales.
+
+    Args:
+        cassette (Cassette): Cassette en modo reproducción
+
+    Returns:
+        Inquilino: Configuración de config.py con los ficheros en el directorio
+                   de la reproducción (para procesar_rutas)
+    """
+    import correction_store
+    import geocoding
+    from multi_tenant import Inquilino
+
+    nombre = os.path.basename(cassette.path).split('.')[0]
+    directorio = os.path.join(REPRODUCCIONES_DIR, f"{nombre}_{datetime.now():%Y%m%d_%H%M%S}")
+    os.makedirs(directorio, exist_ok=True)
+
+    geocoding.CACHE_FILE = os.path.join(directorio, 'geocoding_cache.json')
+    geocoding._cache_memoria.update(mtime=None, datos=None)
+    geocoding.save_cache(cassette.instantaneas.get('geocoding_cache', {}))
+
+    correcciones = cassette.instantaneas.get('correcciones')
+    if correcciones is None:
+        print("  ⚠️ Cassette sin instantánea de correcciones: se usa una copia de las actuales")
+    for atributo in ('CORRECCIONES_AUTO_FILE', 'CORRECCIONES_LOG_FILE'):
+        original = getattr(correction_store, atributo)
+        copia = os.path.join(directorio, os.path.basename(original))
+        if correcciones is None:
+            if os.path.exists(original):
+                shutil.copyfile(original, copia)
+        elif correcciones.get(atributo) is not None:
+            with open(copia, 'w', encoding='utf-8') as f:
+                f.write(correcciones[atributo])
+        setattr(correction_store, atributo, type(original)(copia))
+
+    results_db_file = os.path.join(directorio, 'resultados.db')
+    _restaurar_tablas(cassette.instantaneas.get('almacen', {}), results_db_file)
+
+    print(f"  📼 Reproduciendo {cassette.path} (latencia {cassette.latencia}); ficheros en {directorio}")
+    return Inquilino(
+        'reproduccion',
+        estado_file=os.path.join(directorio, 'estado.json'),
+        indice_codigos_file=os.path.join(directorio, 'barcode_index.json'),
+        results_db_file=results_db_file,
+        checkpoints_dir=os.path.join(directorio, 'ejecucion_en_curso')
+    )
@@ -0,0 +1,128 @@
+"""
+Puntos de control de una ejecución de procesar_rutas (para reanudarla tras un fallo)
+
+Cada etapa guarda su salida en un directorio local de la ejecución en curso:
+
+    lectura_limpieza   filas leídas de la hoja y direcciones limpias
+    geocodificacion    puntos geocodificados y no encontradas
+    zonas              puntos por zona (y correcciones aprendidas)
+    ordenacion         rutas ordenadas por zona
+    escritura.*        marcas de cada escritura hecha (hoja, índice, estado, almacén)
+
+La geocodificación, además, anota cada resultado de la API en el diario del
+caché (ver geocoding.py): si falla en la dirección 700 de 900, las 700 ya
+están anotadas y la reanudación solo consulta las que faltan.
+
+Con --reanudar, las etapas completadas se cargan del directorio en lugar de
+repetirse. Una ejecución normal empieza con el directorio vacío, y una
+ejecución que termina bien lo borra.
+
+Uso:
+    cd src
+    python main.py --reanudar
+"""
+import json
+import os
+import shutil
+from datetime import datetime
+
+import config
+
+CHECKPOINTS_DIR = getattr(config, 'CHECKPOINTS_DIR', 'ejecucion_en_curso')
+
+MANIFIESTO = 'manifiesto.json'
+
+
+def _tuplas(items):
+    """Puntos (coords, dirección, códigos) con las coordenadas como tupla (en JSON llegan como listas)."""
+    return [(tuple(item[0]), *item[1:]) for item in items]
+
+
+# Cómo restaurar los tipos que JSON no conserva en la salida de cada etapa
+_RESTAURAR = {
+    'lectura_limpieza': lambda d: {
+        **d,
+        'filas_eliminadas': [tuple(fila) for fila in d['filas_eliminadas']],
+        'coordenadas_conocidas': {direccion: tuple(c) for direccion, c in d['coordenadas_conocidas'].items()}
+    },
+    'geocodificacion': lambda d: {**d, 'geocoded': _tuplas(d['geocoded'])},
+    'zonas': lambda d: {zona: _tuplas(items) for zona, items in d.items()},
+    'ordenacion': lambda d: {zona: _tuplas(items) for zona, items in d.items()},
+}
+
+
+class PuntosControl:
+    """Directorio con la salida de cada etapa completada de una ejecución"""
+
+    def __init__(self, directorio=CHECKPOINTS_DIR, reanudar=False):
+        """
+        Args:
+            directorio (str): Directorio de la ejecución en curso
+            reanudar (bool): Si True, conserva las etapas de la ejecución anterior;
+                             si False, empieza de cero
+        """
+        self.directorio = directorio
+        self.reanudar = reanudar
+        if not reanudar and os.path.isdir(directorio):
+            shutil.rmtree(directorio)
+        os.makedirs(directorio, exist_ok=True)
+
+        self.manifiesto = {'creado': datetime.now().isoformat(timespec='seconds'), 'etapas': {}}
+        path = os.path.join(directorio, MANIFIESTO)
+        if reanudar and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.manifiesto = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"  ⚠️ Puntos de control ilegibles ({e}): se empieza de cero")
+
+        if reanudar:
+            hechas = list(self.manifiesto['etapas'])
+            if hechas:
+                print(f"  ⏯️ Reanudando la ejecución del {self.manifiesto['creado']}: "
+                      f"etapas completadas {', '.join(hechas)}")
+            else:
+                print("  ℹ️ No hay ejecución a medias que reanudar: se procesa completo")
+
+    def completada(self, etapa):
+        return etapa in self.manifiesto['etapas']
+
+    def cargar(self, etapa):
+        """
+        Returns:
+            Salida guardada de la etapa (con los tipos restaurados), o None si
+            la etapa solo tiene marca
+        """
+        path = os.path.join(self.directorio, f"{etapa}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            datos = json.load(f)
+        return _RESTAURAR.get(etapa, lambda d: d)(datos)
+
+    def guardar(self, etapa, datos=None):
+        """
+        Marca la etapa como completada y guarda su salida (escrituras atómicas:
+        un fallo a mitad nunca deja una etapa completada a medias).
+
+        Args:
+            etapa (str): Nombre de la etapa
+            datos: Salida serializable en JSON (None = solo la marca)
+        """
+        if datos is not None:
+            path = os.path.join(self.directorio, f"{etapa}.json")
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(datos, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+
+        self.manifiesto['etapas'][etapa] = datetime.now().isoformat(timespec='seconds')
+        path = os.path.join(self.directorio, MANIFIESTO)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifiesto, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def finalizar(self):
+        """La ejecución terminó bien: ya no hay nada que reanudar."""
+        shutil.rmtree(self.directorio, ignore_errors=True)
@@ -0,0 +1,171 @@
+"""
+Almacén de correcciones aprendidas automáticamente
+
+Cuando una salida del modelo IA se geocodifica dentro de un polígono de zona,
+el par raw → limpia se registra aquí para que la próxima vez se resuelva por
+lookup (instantáneo) en lugar de con el modelo.
+
+Formato en disco (carpeta data/):
+- Correccions_auto.log: registro append-only, una línea JSON por corrección
+- Correccions_auto.csv: versión compactada (key, raw, processed, confirmaciones)
+
+Los ficheros se leen y escriben con bloqueo entre procesos (file_lock.py):
+backfill.py registra correcciones desde varios procesos a la vez.
+
+La compactación une el registro con el CSV, elimina duplicados y resuelve
+conflictos (misma key con distintas salidas) quedándose con la salida más
+confirmada; en caso de empate gana la más reciente.
+"""
+import csv
+import json
+import os
+from pathlib import Path
+from threading import Lock
+
+import config
+from file_lock import bloqueo_fichero
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+CORRECCIONES_AUTO_FILE = DATA_DIR / "Correccions_auto.csv"
+CORRECCIONES_LOG_FILE = DATA_DIR / "Correccions_auto.log"
+COMPACTAR_CADA = getattr(config, 'CORRECCIONES_COMPACTAR_CADA', 200)
+
+_store_lock = Lock()
+
+
+def _bloqueo():
+    """Bloqueo entre procesos de los dos ficheros del almacén."""
+    return bloqueo_fichero(str(CORRECCIONES_LOG_FILE) + '.lock')
+
+
+def _leer_compactado():
+    """Lee el CSV compactado -> {key: {'raw', 'votos': {processed: n}}}"""
+    entradas = {}
+    if not CORRECCIONES_AUTO_FILE.exists():
+        return entradas
+
+    with open(CORRECCIONES_AUTO_FILE, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            entradas[row['key']] = {
+                'raw': row['raw'],
+                'votos': {row['processed']: int(row.get('confirmaciones') or 1)}
+            }
+    return entradas
+
+
+def _leer_log():
+    """Lee el registro append-only. Ignora líneas corruptas (escritura interrumpida)."""
+    registros = []
+    if not CORRECCIONES_LOG_FILE.exists():
+        return registros
+
+    with open(CORRECCIONES_LOG_FILE, 'r', encoding='utf-8') as f:
+        for linea in f:
+            try:
+                registros.append(json.loads(linea))
+            except json.JSONDecodeError:
+                continue
+    return registros
+
+
+def _fusionar(entradas, registros):
+    """Aplica los registros del log sobre las entradas compactadas (in place)."""
+    for reg in registros:
+        entrada = entradas.setdefault(reg['key'], {'raw': reg['raw'], 'votos': {}})
+        votos = entrada['votos']
+        # Re-insertar para que la más reciente quede al final (desempate)
+        n = votos.pop(reg['processed'], 0)
+        votos[reg['processed']] = n + 1
+    return entradas
+
+
+def _ganadora(votos):
+    """Salida con más confirmaciones; en empate, la última registrada."""
+    mejor, mejor_n = None, -1
+    for processed, n in votos.items():
+        if n >= mejor_n:
+            mejor, mejor_n = processed, n
+    return mejor
+
+
+def cargar_correcciones():
+    """
+    Carga las correcciones aprendidas (compactadas + pendientes en el log).
+
+    Returns:
+        dict: {key_normalizada: direccion_limpia}
+    """
+    with _store_lock, _bloqueo():
+        entradas = _fusionar(_leer_compactado(), _leer_log())
+    return {key: _ganadora(e['votos']) for key, e in entradas.items()}
+
+
+def registrar_correcciones(pares, conocidas=None):
+    """
+    Añade correcciones confirmadas al registro.
+
+    Args:
+        pares (list): Lista de tuplas (key_normalizada, raw, processed)
+        conocidas (dict): Lookup actual {key: processed}; los pares que ya
+                          están con la misma salida no se vuelven a registrar
+
+    Returns:
+        int: Número de correcciones nuevas registradas
+    """
+    if conocidas is None:
+        conocidas = {}
+
+    nuevas = []
+    vistas = set()
+    for key, raw, processed in pares:
+        if not processed or conocidas.get(key) == processed or key in vistas:
+            continue
+        vistas.add(key)
+        nuevas.append({'key': key, 'raw': raw, 'processed': processed})
+
+    if not nuevas:
+        return 0
+
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    with _store_lock, _bloqueo():
+        with open(CORRECCIONES_LOG_FILE, 'a', encoding='utf-8') as f:
+            for reg in nuevas:
+                f.write(json.dumps(reg, ensure_ascii=False) + '\n')
+
+        if len(_leer_log()) >= COMPACTAR_CADA:
+            _compactar()
+
+    return len(nuevas)
+
+
+def _compactar():
+    """Reescribe el CSV compactado con el log fusionado y vacía el log (requiere lock)."""
+    entradas = _fusionar(_leer_compactado(), _leer_log())
+
+    conflictos = sum(1 for e in entradas.values() if len(e['votos']) > 1)
+    if conflictos:
+        print(f"  ⚠️ {conflictos} correcciones con salidas distintas: se mantiene la más confirmada")
+
+    # Escritura atómica: fichero temporal + replace
+    tmp_path = CORRECCIONES_AUTO_FILE.with_suffix('.csv.tmp')
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['key', 'raw', 'processed', 'confirmaciones'])
+        for key, e in entradas.items():
+            ganadora = _ganadora(e['votos'])
+            writer.writerow([key, e['raw'], ganadora, e['votos'][ganadora]])
+    os.replace(tmp_path, CORRECCIONES_AUTO_FILE)
+
+    CORRECCIONES_LOG_FILE.unlink(missing_ok=True)
+    return len(entradas)
+
+
+def compactar():
+    """
+    Compacta el almacén de correcciones.
+
+    Returns:
+        int: Número de entradas únicas tras la compactación
+    """
+    with _store_lock, _bloqueo():
+        return _compactar()
@@ -0,0 +1,254 @@
+"""
+Modo servicio: vigila el spreadsheet y reprocesa automáticamente los cambios
+
+Arranca una vez (cliente de Sheets, caché de geocodificación, lookup, índice de
+zonas y, opcionalmente, el modelo IA) y cada DAEMON_INTERVALO_S segundos
+comprueba la huella de las columnas de entrada (A-E). Si ha cambiado, lanza
+procesar_rutas en modo incremental con todo ya cargado en memoria.
+
+Uso:
+    cd src
+    python daemon.py
+
+Endpoints locales (por defecto http://127.0.0.1:8766):
+    GET /salud     → estado del servicio y de la última comprobación/ejecución
+    GET /metricas  → latencias (comprobación y procesamiento) e informe de la
+                     última ejecución (tiempos por etapa y contadores)
+"""
+import json
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import config
+from instrumentation import iniciar_ejecucion, instrumentacion_actual, guardar_informe
+
+DAEMON_HOST = getattr(config, 'DAEMON_HOST', '127.0.0.1')
+DAEMON_PORT = getattr(config, 'DAEMON_PORT', 8766)
+DAEMON_INTERVALO_S = getattr(config, 'DAEMON_INTERVALO_S', 60)
+DAEMON_PRECARGAR_MODELO = getattr(config, 'DAEMON_PRECARGAR_MODELO', True)
+
+_MUESTRAS_LATENCIA = 100  # Últimas mediciones guardadas para las métricas
+
+
+def _resumen_latencias(muestras):
+    """Resumen en milisegundos de una lista de duraciones en segundos."""
+    if not muestras:
+        return {'n': 0}
+    ordenadas = sorted(muestras)
+    return {
+        'n': len(ordenadas),
+        'ultima_ms': round(muestras[-1] * 1000, 1),
+        'media_ms': round(sum(ordenadas) / len(ordenadas) * 1000, 1),
+        'p50_ms': round(ordenadas[len(ordenadas) // 2] * 1000, 1),
+        'p95_ms': round(ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * 0.95))] * 1000, 1),
+        'max_ms': round(ordenadas[-1] * 1000, 1)
+    }
+
+
+class ServicioRutas:
+    """Mantiene el pipeline caliente y reprocesa cuando cambia la hoja"""
+
+    def __init__(self, intervalo_s=DAEMON_INTERVALO_S, precargar_modelo=DAEMON_PRECARGAR_MODELO):
+        """
+        Args:
+            intervalo_s (float): Segundos entre comprobaciones de la hoja
+            precargar_modelo (bool): Si True, carga el modelo IA al arrancar
+                                     (salvo que el servidor de modelo esté activo)
+        """
+        self.intervalo = intervalo_s
+        self.precargar_modelo = precargar_modelo
+        self.sheets_manager = None
+        self.huella = None
+        self.inicio = datetime.now()
+        self.estado = {
+            'comprobaciones': 0,
+            'ejecuciones': 0,
+            'errores': 0,
+            'ultima_comprobacion': None,
+            'ultimo_cambio': None,
+            'ultima_ejecucion': None,
+            'ultimo_error': None,
+            'procesando': False
+        }
+        self.latencias = {
+            'comprobacion': deque(maxlen=_MUESTRAS_LATENCIA),
+            'procesamiento': deque(maxlen=_MUESTRAS_LATENCIA)
+        }
+        self.ultimo_informe = None
+        self.tiempos_calentamiento = {}
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+
+    def calentar(self):
+        """Carga una vez todo lo que una ejecución de main.py cargaría en frío."""
+        from sheets_manager import crear_manager_sheets
+        from geocoding import load_cache
+        from address_model_cleaner import _cargar_lookup, _cargar_modelo
+        from zone_manager import cargar_indice_zonas
+        from model_server import servidor_activo
+
+        pasos = [
+            ('sheets', lambda: self._conectar(crear_manager_sheets)),
+            ('cache_geocodificacion', load_cache),
+            ('lookup', _cargar_lookup),
+            ('indice_zonas', cargar_indice_zonas),
+        ]
+        if self.precargar_modelo and not servidor_activo():
+            pasos.append(('modelo', _cargar_modelo))
+
+        print("  🔥 Calentando servicio...")
+        for nombre, paso in pasos:
+            t0 = time.perf_counter()
+            paso()
+            self.tiempos_calentamiento[nombre] = round(time.perf_counter() - t0, 3)
+            print(f"     ✓ {nombre}: {self.tiempos_calentamiento[nombre]*1000:.0f} ms")
+
+    def _conectar(self, crear_manager_sheets):
+        self.sheets_manager = crear_manager_sheets()
+        if hasattr(self.sheets_manager, 'calentar'):
+            self.sheets_manager.calentar()
+
+    def comprobar(self):
+        """
+        Comprueba si la hoja ha cambiado y, si es así, la procesa.
+
+        Returns:
+            bool: True si se lanzó un procesamiento
+        """
+        t0 = time.perf_counter()
+        huella = self.sheets_manager.huella_entrada()
+        self.latencias['comprobacion'].append(time.perf_counter() - t0)
+
+        with self._lock:
+            self.estado['comprobaciones'] += 1
+            self.estado['ultima_comprobacion'] = datetime.now().isoformat(timespec='seconds')
+
+        if huella == self.huella:
+            return False
+
+        print(f"\n  🔔 Cambios detectados en la hoja ({datetime.now():%H:%M:%S}), procesando...")
+        with self._lock:
+            self.estado['ultimo_cambio'] = self.estado['ultima_comprobacion']
+            self.estado['procesando'] = True
+
+        try:
+            self._procesar()
+        finally:
+            with self._lock:
+                self.estado['procesando'] = False
+
+        # Solo se da por procesada si terminó bien: si falla, se reintenta en la siguiente vuelta
+        self.huella = huella
+        return True
+
+    def _procesar(self):
+        from main import procesar_rutas
+
+        iniciar_ejecucion('daemon')
+        t0 = time.perf_counter()
+        try:
+            procesar_rutas(incremental=True, sheets_manager=self.sheets_manager)
+        finally:
+            self.latencias['procesamiento'].append(time.perf_counter() - t0)
+            self.ultimo_informe = instrumentacion_actual().informe()
+            guardar_informe()
+
+        with self._lock:
+            self.estado['ejecuciones'] += 1
+            self.estado['ultima_ejecucion'] = datetime.now().isoformat(timespec='seconds')
+
+    def bucle(self):
+        """Comprueba la hoja cada `intervalo` segundos hasta que se llame a parar()."""
+        while not self._parar.is_set():
+            try:
+                self.comprobar()
+            except Exception as e:
+                traceback.print_exc()
+                with self._lock:
+                    self.estado['errores'] += 1
+                    self.estado['ultimo_error'] = f"{datetime.now():%Y-%m-%d %H:%M:%S} {e}"
+            self._parar.wait(self.intervalo)
+
+    def parar(self):
+        self._parar.set()
+
+    def salud(self):
+        with self._lock:
+            estado = dict(self.estado)
+        return {
+            'ok': self.sheets_manager is not None,
+            'desde': self.inicio.isoformat(timespec='seconds'),
+            'intervalo_s': self.intervalo,
+            **estado
+        }
+
+    def metricas(self):
+        return {
+            'calentamiento_s': self.tiempos_calentamiento,
+            'latencias': {nombre: _resumen_latencias(list(muestras))
+                          for nombre, muestras in self.latencias.items()},
+            'ultimo_informe': self.ultimo_informe
+        }
+
+
+def _crear_handler(servicio):
+    class DaemonRequestHandler(BaseHTTPRequestHandler):
+        def _responder(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/salud':
+                salud = servicio.salud()
+                self._responder(200 if salud['ok'] else 503, salud)
+            elif self.path == '/metricas':
+                self._responder(200, servicio.metricas())
+            else:
+                self._responder(404, {'ok': False, 'message': 'Ruta no encontrada'})
+
+        def log_message(self, format, *args):
+            # Silenciar el log por petición de http.server
+            pass
+
+    return DaemonRequestHandler
+
+
+def iniciar_daemon(host=DAEMON_HOST, port=DAEMON_PORT, intervalo_s=DAEMON_INTERVALO_S):
+    """
+    Calienta el servicio, expone /salud y /metricas y vigila la hoja hasta que
+    se interrumpa el proceso.
+
+    Args:
+        host (str): Interfaz del endpoint de métricas (por defecto solo localhost)
+        port (int): Puerto TCP del endpoint
+        intervalo_s (float): Segundos entre comprobaciones de la hoja
+    """
+    servicio = ServicioRutas(intervalo_s)
+    servicio.calentar()
+
+    server = ThreadingHTTPServer((host, port), _crear_handler(servicio))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    print(f"  🟢 Servicio de rutas activo: comprobando la hoja cada {intervalo_s} s")
+    print(f"     Salud y métricas en http://{host}:{port}/salud y /metricas")
+
+    try:
+        servicio.bucle()
+    except KeyboardInterrupt:
+        print("\n  ⏹ Servicio de rutas detenido")
+    finally:
+        servicio.parar()
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    iniciar_daemon()
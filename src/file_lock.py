@@ -0,0 +1,52 @@
+"""
+Bloqueo de ficheros entre procesos
+
+Los locks de threading solo protegen dentro de un proceso. Cuando varios
+procesos comparten un fichero (backfill.py con su pool de procesos, el servicio
+y una ejecución manual a la vez...), el que lee-modifica-escribe lo hace con
+bloqueo_fichero sobre un fichero '.lock' al lado del de datos.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def bloqueo_fichero(path):
+    """
+    Bloqueo exclusivo (bloqueante) sobre `path` mientras dura el bloque.
+
+    Args:
+        path (str): Fichero de bloqueo (se crea si no existe)
+    """
+    directorio = os.path.dirname(path)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+
+    with open(path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        else:
+            # msvcrt no espera indefinidamente: reintentar hasta conseguirlo
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.01)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
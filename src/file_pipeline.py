@@ -0,0 +1,234 @@
+"""
+Modo fichero: procesa paquetes desde CSV/Parquet sin pasar por Google Sheets
+
+Pensado para backfills y análisis what-if con decenas de miles de paquetes.
+Usa las mismas etapas que procesar_rutas (limpieza, geocodificación, zonas con
+rebalanceo, y ordenar_zonas: memoria de rutas o línea, y búsqueda local), así
+las mismas filas dan las mismas rutas que en la hoja, pero:
+- lee la entrada por bloques (pandas chunks / pyarrow batches) y limpia y
+  geocodifica cada bloque al llegar
+- solo guarda en memoria los puntos de entrega únicos (con sus códigos), no las
+  filas: con direcciones que se repiten, la memoria crece con las paradas
+- no escribe en el almacén de resultados ni en la memoria de rutas (la lee)
+
+Uso:
+    cd src
+    python main.py --entrada paquetes.parquet --salida rutas.parquet
+"""
+import csv
+from pathlib import Path
+
+from address_model_cleaner import procesar_direcciones_con_modelo
+from geocoding import geocode_and_store_fast
+from zone_manager import (separar_por_zonas, rebalancear_zonas, GeometriaCacheada, ZONAS_RESULTADOS,
+                          CACHE_GEOMETRIA_ACTIVA, REBALANCEO_ACTIVO)
+from route_memory import ordenar_zonas
+from results_store import RESULTS_DB_FILE
+from sheets_manager import es_fila_excluida
+from instrumentation import etapa, contar
+from parallel_inference import cerrar_pool
+from config import GOOGLE_MAPS_API_KEY, ZONE_ROUTE_LINES, DEPOT_COORDS
+
+# Columnas por defecto del fichero de entrada
+COLUMNAS_ENTRADA = {'codigo': 'codigo', 'filtro': 'filtro', 'direccion': 'direccion'}
+COLUMNAS_SALIDA = ['zona', 'orden', 'direccion', 'codigos', 'lat', 'lon']
+ZONA_NO_ENCONTRADAS = 'no_encontradas'
+
+
+def _es_parquet(path):
+    return Path(path).suffix.lower() in ('.parquet', '.pq')
+
+
+def leer_bloques(path, tam_bloque=5000, columnas=None):
+    """
+    Lee el fichero de entrada por bloques.
+
+    Args:
+        path (str): CSV o Parquet
+        tam_bloque (int): Filas por bloque
+        columnas (dict): Nombres de columna {'codigo', 'filtro', 'direccion'}
+
+    Yields:
+        tuple: (codigos, filtros, direcciones) de cada bloque
+    """
+    columnas = {**COLUMNAS_ENTRADA, **(columnas or {})}
+    nombres = [columnas['codigo'], columnas['filtro'], columnas['direccion']]
+
+    if _es_parquet(path):
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(path)
+        disponibles = [n for n in nombres if n in parquet.schema_arrow.names]
+        for batch in parquet.iter_batches(batch_size=tam_bloque, columns=disponibles):
+            datos = batch.to_pydict()
+            n = batch.num_rows
+            yield tuple(
+                ['' if v is None else str(v) for v in datos.get(nombre, [''] * n)]
+                for nombre in nombres
+            )
+    else:
+        import pandas as pd
+        for chunk in pd.read_csv(path, chunksize=tam_bloque, dtype=str, keep_default_na=False,
+                                 usecols=lambda c: c in nombres):
+            n = len(chunk)
+            yield tuple(
+                chunk[nombre].tolist() if nombre in chunk else [''] * n
+                for nombre in nombres
+            )
+
+
+class _EscritorSalida:
+    """Escribe filas de salida en CSV o Parquet de forma incremental."""
+
+    def __init__(self, path, filas_por_lote=10000):
+        self.path = path
+        self.parquet = _es_parquet(path)
+        self.filas_por_lote = filas_por_lote
+        self._pendientes = []
+        self._writer = None
+        self.filas_escritas = 0
+
+        if not self.parquet:
+            self._file = open(path, 'w', encoding='utf-8', newline='')
+            self._csv = csv.writer(self._file)
+            self._csv.writerow(COLUMNAS_SALIDA)
+
+    def escribir(self, fila):
+        self.filas_escritas += 1
+        if self.parquet:
+            self._pendientes.append(fila)
+            if len(self._pendientes) >= self.filas_por_lote:
+                self._volcar()
+        else:
+            self._csv.writerow(fila)
+
+    def _volcar(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self._pendientes:
+            return
+        columnas = list(zip(*self._pendientes))
+        schema = pa.schema([
+            ('zona', pa.string()), ('orden', pa.int64()), ('direccion', pa.string()),
+            ('codigos', pa.string()), ('lat', pa.float64()), ('lon', pa.float64())
+        ])
+        tabla = pa.table({nombre: list(valores) for nombre, valores in zip(COLUMNAS_SALIDA, columnas)}, schema=schema)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, schema)
+        self._writer.write_table(tabla)
+        self._pendientes = []
+
+    def cerrar(self):
+        if self.parquet:
+            self._volcar()
+            if self._writer is not None:
+                self._writer.close()
+        else:
+            self._file.close()
+
+
+def procesar_rutas_desde_fichero(entrada, salida, tam_bloque=5000, columnas=None, lineas_por_zona=None,
+                                 inicio=DEPOT_COORDS, db_file=RESULTS_DB_FILE):
+    """
+    Procesa un fichero de paquetes y escribe las rutas ordenadas por zona.
+
+    Args:
+        entrada (str): CSV o Parquet con columnas de código, filtro y dirección
+        salida (str): CSV o Parquet de salida (columnas: zona, orden, direccion,
+                      codigos, lat, lon); las no encontradas van con zona 'no_encontradas'
+        tam_bloque (int): Filas por bloque de lectura
+        columnas (dict): Nombres de columna de entrada (ver COLUMNAS_ENTRADA)
+        lineas_por_zona (dict): Líneas de ruta; si es None usa ZONE_ROUTE_LINES
+        inicio (tuple): Punto de salida de las rutas (el depósito)
+        db_file (str): Base de datos con la memoria de rutas
+
+    Returns:
+        dict: Estadísticas (filas leídas, excluidas, puntos por zona, no encontradas,
+              paradas rebalanceadas)
+    """
+    if lineas_por_zona is None:
+        lineas_por_zona = ZONE_ROUTE_LINES
+
+    stats = {'filas': 0, 'excluidas': 0, 'no_encontradas': 0, 'zonas': {}, 'rebalanceo': []}
+    # Puntos únicos en orden de primera aparición: {coords: (coords, address, codigos, zona)}
+    puntos = {}
+    no_encontradas = {}  # {dirección: None}, una vez aunque se repita entre bloques
+    # Zona y posición de las direcciones ya vistas salen del caché de geocodificación
+    geometria = GeometriaCacheada(lineas_por_zona=lineas_por_zona) if CACHE_GEOMETRIA_ACTIVA else None
+
+    for num_bloque, (codigos, filtros, direcciones) in enumerate(leer_bloques(entrada, tam_bloque, columnas)):
+        stats['filas'] += len(direcciones)
+
+        # Mismo filtro que la lectura de Sheets (Q-PRINTING y sin dirección)
+        filas = [(c, d) for c, f, d in zip(codigos, filtros, direcciones)
+                 if d and not es_fila_excluida(f)]
+        stats['excluidas'] += len(direcciones) - len(filas)
+        if not filas:
+            continue
+
+        print(f"\n  📦 Bloque {num_bloque + 1}: {len(filas)} filas")
+        codigos_bloque = [c for c, _ in filas]
+        with etapa('limpieza'):
+            limpias = procesar_direcciones_con_modelo([d for _, d in filas], mostrar_comparativa=False)
+        with etapa('geocodificacion'):
+            geocoded, not_found = geocode_and_store_fast(
+                limpias, GOOGLE_MAPS_API_KEY, max_workers=10, codigos_barras=codigos_bloque
+            )
+
+        with etapa('zonas'):
+            zonas_bloque = geometria.separar_por_zonas(geocoded) if geometria is not None \
+                else separar_por_zonas(geocoded)
+        for zona, items in zonas_bloque.items():
+            for coords, address, codigos_punto in items:
+                coords = tuple(coords)
+                if coords in puntos:
+                    # El mismo punto en otro bloque: un solo punto con todos sus códigos
+                    acumulados = puntos[coords][2]
+                    acumulados.extend(c for c in codigos_punto if c not in acumulados)
+                else:
+                    puntos[coords] = (coords, address, list(codigos_punto), zona)
+        no_encontradas.update(dict.fromkeys(item[0] for item in not_found))
+        contar('fichero.bloques')
+    # Un solo pool de réplicas del modelo para todos los bloques
+    cerrar_pool()
+
+    # Mismas etapas que procesar_rutas sobre los puntos únicos de todo el fichero
+    zonas_dict = {zona: [] for zona in ZONAS_RESULTADOS}
+    zonas_dict['sin_zona'] = []
+    for coords, address, codigos_punto, zona in puntos.values():
+        zonas_dict[zona].append((coords, address, codigos_punto))
+    del puntos
+    if REBALANCEO_ACTIVO:
+        with etapa('rebalanceo'):
+            zonas_dict, stats['rebalanceo'] = rebalancear_zonas(zonas_dict, lineas_por_zona)
+    if geometria is not None:
+        geometria.ajustar_a_zonas(zonas_dict)
+        geometria.guardar()
+
+    with etapa('ordenacion'):
+        zonas_ordenadas, _, _ = ordenar_zonas(
+            zonas_dict, lineas_por_zona, inicio, db_file,
+            geometria.posiciones if geometria is not None else None
+        )
+
+    print(f"\n  💾 Escribiendo rutas en {salida}...")
+    with etapa('escritura'):
+        escritor = _EscritorSalida(salida)
+        try:
+            for zona, items in zonas_ordenadas.items():
+                if not items:
+                    continue
+                for orden, (coords, address, codigos_punto) in enumerate(items, 1):
+                    escritor.escribir([zona, orden, address, ', '.join(codigos_punto), coords[0], coords[1]])
+                stats['zonas'][zona] = len(items)
+                print(f"     ✓ {zona}: {len(items)} puntos")
+            for orden, address in enumerate(no_encontradas, 1):
+                escritor.escribir([ZONA_NO_ENCONTRADAS, orden, address, '', None, None])
+            stats['no_encontradas'] = len(no_encontradas)
+        finally:
+            escritor.cerrar()
+
+    contar('fichero.filas_escritas', escritor.filas_escritas)
+    print(f"\n  ✓ {stats['filas']} filas leídas, {stats['excluidas']} excluidas, "
+          f"{escritor.filas_escritas} filas escritas en {salida}")
+    return stats
@@ -1,19 +1,168 @@
 """
 Módulo para geocodificación de direcciones usando Google Maps API
 con caché persistente y procesamiento paralelo
+
+Varios procesos pueden usar el mismo caché a la vez (backfill.py y la ejecución
+de la mañana, por ejemplo):
+
+- save_cache guarda con bloqueo de fichero y fusiona lo que otros procesos
+  guardaron mientras tanto.
+- Cada resultado de la API se anota al momento en un diario compartido
+  (CACHE_FILE + '.diario') que save_cache vuelca en el caché; el resto de
+  procesos lo ve antes de pagar la misma consulta.
+- El diario es también el punto de control: si la geocodificación falla a
+  mitad, load_cache recupera lo ya consultado sin reescribir el caché entero
+  cada pocos resultados.
+- Una dirección nunca se consulta dos veces a la vez: los hilos del proceso
+  esperan a la consulta en curso, y entre procesos cada consulta se hace con
+  el bloqueo de su cubeta (CACHE_FILE + '.vuelo/'). Quien espera recibe el
+  resultado del diario (contadores geocoding.coalescidas y geocoding.compartidas).
 """
+import hashlib
 import time
 import requests
 import json
 import os
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from threading import Lock
+from threading import Event, Lock
+import config
+from cassette import cassette_activo
+from file_lock import bloqueo_fichero
+from instrumentation import etapa, contar, instrumentacion_actual
 from config import GOOGLE_MAPS_API_KEY
 
 # Archivo de caché
 CACHE_FILE = 'geocoding_cache.json'
 _cache_lock = Lock()
 
+# Límite de peticiones por segundo a la API, común a todos los hilos del proceso
+# (None = sin límite; multi_tenant.py lo activa para todos los inquilinos)
+GEOCODING_MAX_QPS = getattr(config, 'GEOCODING_MAX_QPS', None)
+
+# Coordinación entre procesos que comparten el caché (mirar el diario antes de
+# consultar y una sola consulta en vuelo); el diario se escribe siempre
+GEOCODING_COMPARTIDO = getattr(config, 'GEOCODING_COMPARTIDO', True)
+GEOCODING_VUELO_CUBETAS = getattr(config, 'GEOCODING_VUELO_CUBETAS', 256)  # Ficheros de bloqueo de consultas
+
+# Cada entrada del caché es [lat, lon] o None; las geocodificadas pueden llevar un
+# tercer elemento con datos derivados por versión de geometría ({versión: [zona,
+# posición en la línea]}, ver zone_manager.GeometriaCacheada). Se conservan los de
+# las últimas N versiones (varios inquilinos comparten el caché con geometrías distintas)
+CACHE_GEOMETRIA_VERSIONES = getattr(config, 'CACHE_GEOMETRIA_VERSIONES', 4)
+
+# Caché ya cargado en este proceso: se reutiliza mientras el archivo no cambie
+# (procesos de larga duración como daemon.py no lo releen en cada ejecución)
+_cache_memoria = {'mtime': None, 'datos': None}
+
+# Última versión del archivo leída para buscar lo que otro proceso ya consultó; va
+# aparte de _cache_memoria para no dar por fusionado un diccionario que no lo está
+_cache_disco = {'mtime': None, 'datos': {}}
+
+
+# Consultas en vuelo en este proceso: {dirección: _Vuelo}
+_en_vuelo = {}
+_vuelo_lock = Lock()
+
+# Parte ya leída del diario compartido: {'ino', 'offset', 'datos': {dirección: coords}}
+_diario = {'ino': None, 'offset': 0, 'datos': {}}
+_diario_lock = Lock()
+
+
+class _Vuelo:
+    """Consulta en curso de una dirección; los demás hilos esperan su resultado"""
+    
+    def __init__(self):
+        self.evento = Event()
+        self.coords = None
+        self.error = None
+
+
+class LimitadorTasa:
+    """Cubo de fichas compartido entre hilos: como máximo `qps` peticiones por segundo"""
+    
+    def __init__(self, qps):
+        self.qps = float(qps)
+        self._fichas = self.qps
+        self._ultimo = time.monotonic()
+        self._lock = Lock()
+        self.esperado_s = 0.0
+    
+    def esperar(self):
+        """Bloquea hasta que haya una ficha disponible y la consume."""
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self._fichas = min(self.qps, self._fichas + (ahora - self._ultimo) * self.qps)
+                self._ultimo = ahora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                espera = (1 - self._fichas) / self.qps
+                self.esperado_s += espera
+            time.sleep(espera)
+
+
+class LimitadorTasaCompartido:
+    """
+    Límite de `qps` peticiones por segundo común a varios procesos (backfill.py):
+    cada petición reserva el siguiente hueco libre en un reloj compartido.
+    """
+    
+    def __init__(self, qps, siguiente, lock):
+        """
+        Args:
+            qps (float): Peticiones por segundo entre todos los procesos
+            siguiente (multiprocessing.Value): Instante (time.time) del próximo hueco libre
+            lock (multiprocessing.Lock): Protege `siguiente`
+        """
+        self.intervalo = 1.0 / float(qps)
+        self._siguiente = siguiente
+        self._lock = lock
+        self.esperado_s = 0.0
+    
+    def esperar(self):
+        """Reserva un hueco y espera hasta él."""
+        with self._lock:
+            ahora = time.time()
+            hueco = max(self._siguiente.value, ahora)
+            self._siguiente.value = hueco + self.intervalo
+        espera = hueco - ahora
+        if espera > 0:
+            self.esperado_s += espera
+            time.sleep(espera)
+
+
+_limitador = LimitadorTasa(GEOCODING_MAX_QPS) if GEOCODING_MAX_QPS else None
+
+
+def configurar_limitador(qps, compartido=None):
+    """
+    Activa (o desactiva con None) el límite de peticiones por segundo a la API.
+    
+    Args:
+        qps (float): Peticiones por segundo (None = sin límite)
+        compartido (tuple): (multiprocessing.Value, multiprocessing.Lock) para
+                            repartir el límite entre procesos; None = solo este proceso
+    
+    Returns:
+        LimitadorTasa: Limitador activo o None
+    """
+    global _limitador
+    if not qps:
+        _limitador = None
+    elif compartido is not None:
+        _limitador = LimitadorTasaCompartido(qps, *compartido)
+    else:
+        _limitador = LimitadorTasa(qps)
+    return _limitador
+
+
+def _mtime_cache():
+    try:
+        return os.path.getmtime(CACHE_FILE)
+    except OSError:
+        return None
+
 
 def load_cache():
     """
@@ -22,14 +171,96 @@ def load_cache():
     Returns:
         dict: Diccionario con direcciones ya geocodificadas
     """
-    if os.path.exists(CACHE_FILE):
+    # Con lock: los hilos que cargan a la vez reciben el mismo diccionario
+    with _cache_lock:
+        mtime = _mtime_cache()
+        if _cache_memoria['datos'] is not None and mtime == _cache_memoria['mtime']:
+            return _cache_memoria['datos']
+        
+        datos = {}
+        if mtime is not None:
+            try:
+                with open(CACHE_FILE, 'r', encoding='utf-8') as f:
+                    datos = json.load(f)
+            except Exception as e:
+                print(f"  ⚠️ Error cargando caché: {e}")
+                return {}
+        # Resultados anotados y aún no volcados (p. ej. de una ejecución que falló a mitad)
+        for address, coords in _leer_diario().items():
+            if datos.get(address) is None and (coords is not None or address not in datos):
+                datos[address] = coords
+        # También el caché vacío (sin archivo): así todos los hilos añaden al mismo
+        _cache_memoria.update(mtime=mtime, datos=datos)
+        return datos
+
+
+def _path_diario():
+    return CACHE_FILE + '.diario'
+
+
+def _leer_diario():
+    """
+    Lee lo nuevo del diario compartido (desde la última lectura).
+    
+    Returns:
+        dict: {dirección: coords} anotadas por cualquier proceso desde el último volcado
+    """
+    with _diario_lock:
         try:
-            with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"  ⚠️ Error cargando caché: {e}")
-            return {}
-    return {}
+            st = os.stat(_path_diario())
+        except OSError:
+            st = None
+        ino = (st.st_dev, st.st_ino) if st else None
+        if ino != _diario['ino'] or (st and st.st_size < _diario['offset']):
+            # Diario volcado al caché (y borrado) por otro proceso: lo que tenía
+            # está ya en el archivo del caché (load_cache lo relee)
+            _diario.update(ino=ino, offset=0, datos={})
+        if st is None or st.st_size == _diario['offset']:
+            return _diario['datos']
+        
+        with open(_path_diario(), 'rb') as f:
+            f.seek(_diario['offset'])
+            nuevo = f.read()
+        # Solo líneas completas: la última puede estar a medio escribir
+        completo = nuevo[:nuevo.rfind(b'\n') + 1]
+        for linea in completo.splitlines():
+            try:
+                registro = json.loads(linea)
+            except ValueError:
+                continue
+            _diario['datos'][registro['a']] = registro['c']
+        _diario['offset'] += len(completo)
+        return _diario['datos']
+
+
+def _leer_cache_disco():
+    """
+    Archivo del caché tal como está ahora (releído solo si cambió), sin tocar
+    el caché cargado en memoria.
+    
+    Returns:
+        dict: Entradas guardadas en el archivo
+    """
+    with _diario_lock:
+        mtime = _mtime_cache()
+        if mtime != _cache_disco['mtime']:
+            datos = {}
+            if mtime is not None:
+                try:
+                    with open(CACHE_FILE, 'r', encoding='utf-8') as f:
+                        datos = json.load(f)
+                except (OSError, ValueError):
+                    datos = {}
+            _cache_disco.update(mtime=mtime, datos=datos)
+        return _cache_disco['datos']
+
+
+def _anotar_diario(address, coords):
+    """Anota un resultado de la API en el diario compartido."""
+    linea = json.dumps({'a': address, 'c': list(coords) if coords else None}, ensure_ascii=False)
+    with bloqueo_fichero(CACHE_FILE + '.lock'):
+        with open(_path_diario(), 'a', encoding='utf-8') as f:
+            f.write(linea + '\n')
 
 
 def save_cache(cache):
@@ -40,9 +271,39 @@ def save_cache(cache):
         cache (dict): Diccionario con direcciones geocodificadas
     """
     try:
-        with _cache_lock:
-            with open(CACHE_FILE, 'w', encoding='utf-8') as f:
+        with _cache_lock, bloqueo_fichero(CACHE_FILE + '.lock'):
+            # Resultados anotados por cualquier proceso y aún no volcados
+            for address, coords in _leer_diario().items():
+                if cache.get(address) is None and (coords is not None or address not in cache):
+                    cache[address] = coords
+            
+            # Otro proceso guardó desde que se cargó este diccionario (o es uno que ya no
+            # es el cargado en memoria): las entradas del archivo se conservan
+            mtime = _mtime_cache()
+            if mtime is not None and (mtime != _cache_memoria['mtime'] or cache is not _cache_memoria['datos']):
+                with open(CACHE_FILE, 'r', encoding='utf-8') as f:
+                    en_disco = json.load(f)
+                for address, coords in en_disco.items():
+                    actual = cache.get(address)
+                    if actual is None and (coords is not None or address not in cache):
+                        cache[address] = coords
+                    elif (actual and coords and len(coords) == 3 and len(actual) == 2
+                          and actual[:2] == coords[:2]):
+                        # Mismas coordenadas con datos derivados calculados por otro proceso
+                        cache[address] = coords
+            
+            # Escritura atómica: nadie lee nunca un caché a medio escribir
+            tmp_path = CACHE_FILE + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
                 json.dump(cache, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, CACHE_FILE)
+            _cache_memoria.update(mtime=_mtime_cache(), datos=cache)
+            
+            # Todo lo del diario está ya en el caché: se empieza uno nuevo
+            if os.path.exists(_path_diario()):
+                os.remove(_path_diario())
+                with _diario_lock:
+                    _diario.update(ino=None, offset=0, datos={})
     except Exception as e:
         print(f"  ⚠️ Error guardando caché: {e}")
 
@@ -60,8 +321,8 @@ def get_from_cache(address, cache):
     """
     if address in cache:
         coords = cache[address]
-        if coords and isinstance(coords, list) and len(coords) == 2:
-            return tuple(coords)
+        if coords and isinstance(coords, list) and len(coords) >= 2:
+            return tuple(coords[:2])
     return None
 
 
@@ -81,9 +342,50 @@ def add_to_cache(address, coords, cache):
             cache[address] = None
 
 
+def get_derivados(address, cache, version):
+    """
+    Datos derivados de una dirección para una versión de geometría.
+    
+    Args:
+        address (str): Dirección
+        cache (dict): Caché de geocodificaciones
+        version (str): Versión de la geometría (zone_manager.version_geometria)
+        
+    Returns:
+        list: [zona, posición] o None si no están calculados para esa versión
+    """
+    entrada = cache.get(address)
+    if isinstance(entrada, list) and len(entrada) == 3:
+        return entrada[2].get(version)
+    return None
+
+
+def add_derivados(address, version, derivados, cache):
+    """
+    Guarda datos derivados de una dirección ya geocodificada (las versiones más
+    antiguas que CACHE_GEOMETRIA_VERSIONES se descartan).
+    
+    Args:
+        address (str): Dirección
+        version (str): Versión de la geometría
+        derivados (list): [zona, posición]
+        cache (dict): Caché de geocodificaciones
+    """
+    with _cache_lock:
+        entrada = cache.get(address)
+        if not entrada:
+            return
+        versiones = {v: d for v, d in (entrada[2] if len(entrada) == 3 else {}).items() if v != version}
+        versiones = dict(list(versiones.items())[-(CACHE_GEOMETRIA_VERSIONES - 1):]) \
+            if CACHE_GEOMETRIA_VERSIONES > 1 else {}
+        versiones[version] = derivados
+        cache[address] = [entrada[0], entrada[1], versiones]
+
+
 def geocode_with_google_maps(address, google_maps_api_key=GOOGLE_MAPS_API_KEY):
     """
     Geocodifica una dirección usando Google Maps Geocoding API.
+    Con un cassette activo la consulta se graba o se reproduce (ver cassette.py).
     
     Args:
         address (str): Dirección a geocodificar
@@ -92,7 +394,67 @@ def geocode_with_google_maps(address, google_maps_api_key=GOOGLE_MAPS_API_KEY):
     Returns:
         tuple: (latitud, longitud) o None si no se pudo geocodificar
     """
+    # Si otro hilo ya está consultando esta dirección, se espera a su resultado
+    with _vuelo_lock:
+        vuelo = _en_vuelo.get(address)
+        propio = vuelo is None
+        if propio:
+            vuelo = _en_vuelo[address] = _Vuelo()
+    if not propio:
+        vuelo.evento.wait()
+        contar('geocoding.coalescidas')
+        if vuelo.error is not None:
+            raise vuelo.error
+        return vuelo.coords
+    
+    try:
+        vuelo.coords = _geocodificar_compartido(address, google_maps_api_key)
+        return vuelo.coords
+    except Exception as e:
+        vuelo.error = e
+        raise
+    finally:
+        with _vuelo_lock:
+            del _en_vuelo[address]
+        vuelo.evento.set()
+
+
+def _geocodificar_compartido(address, google_maps_api_key):
+    """
+    Consulta una dirección sin repetir la de otro proceso: con el bloqueo de su
+    cubeta, mira primero el diario compartido y solo si no está llama a la API.
+    """
+    cassette = cassette_activo()
+    if cassette is not None:
+        return cassette.geocodificar(address, lambda: _consultar_google_maps(address, google_maps_api_key))
+    if not GEOCODING_COMPARTIDO:
+        coords = _consultar_google_maps(address, google_maps_api_key)
+        _anotar_diario(address, coords)
+        return coords
+    
+    cubeta = int(hashlib.sha1(address.encode('utf-8')).hexdigest(), 16) % GEOCODING_VUELO_CUBETAS
+    with bloqueo_fichero(os.path.join(CACHE_FILE + '.vuelo', f"{cubeta:03d}.lock")):
+        anotadas = _leer_diario()
+        if address in anotadas:
+            coords = anotadas[address]
+        else:
+            # O ya la volcó al caché (las no encontradas sí se reintentan, como siempre)
+            coords = _leer_cache_disco().get(address)
+            if not coords:
+                coords = _consultar_google_maps(address, google_maps_api_key)
+                _anotar_diario(address, coords)
+                return coords
+        # Otro proceso la acaba de consultar (o la consultó mientras esperábamos)
+        contar('geocoding.compartidas')
+        return tuple(coords[:2]) if coords else None
+
+
+def _consultar_google_maps(address, google_maps_api_key):
+    """Petición real a la API de geocodificación (respetando el límite de peticiones)."""
+    if _limitador is not None:
+        _limitador.esperar()
     print(f"  🌐 API Google Maps: Geocodificando '{address[:60]}...'")
+    contar('geocoding.api_llamadas')
     
     base_url = "https://maps.googleapis.com/maps/api/geocode/json"
     params = {"address": address, "key": google_maps_api_key}
@@ -114,7 +476,8 @@ def geocode_with_google_maps(address, google_maps_api_key=GOOGLE_MAPS_API_KEY):
     return None
 
 
-def geocode_and_store(addresses, google_maps_api_key=GOOGLE_MAPS_API_KEY, delay=0.3, use_cache=True, use_parallel=False, max_workers=5, codigos_barras=None):
+def geocode_and_store(addresses, google_maps_api_key=GOOGLE_MAPS_API_KEY, delay=0.3, use_cache=True, use_parallel=False, max_workers=5, codigos_barras=None,
+                      coordenadas_conocidas=None):
     """
     Geocodifica una lista de direcciones eliminando duplicados (mismas coordenadas).
     Solo mantiene la primera dirección por cada coordenada única, pero agrupa todos los códigos de barras.
@@ -127,6 +490,8 @@ def geocode_and_store(addresses, google_maps_api_key=GOOGLE_MAPS_API_KEY, delay=
         use_parallel (bool): Si True, usa procesamiento paralelo
         max_workers (int): Número máximo de hilos paralelos
         codigos_barras (list): Lista de códigos de barras asociados a cada dirección
+        coordenadas_conocidas (dict): {dirección: (lat, lon)} ya resueltas en ejecuciones
+                                      anteriores (almacén de resultados); se usan como caché
         
     Returns:
         tuple: (geocoded_addresses, not_found_addresses)
@@ -154,6 +519,11 @@ def geocode_and_store(addresses, google_maps_api_key=GOOGLE_MAPS_API_KEY, delay=
     
     # Cargar caché si está habilitado
     cache = load_cache() if use_cache else {}
+    cache_sembrado = False
+    for address, coords in (coordenadas_conocidas or {}).items():
+        if get_from_cache(address, cache) is None:
+            add_to_cache(address, coords, cache)
+            cache_sembrado = True
     cache_hits = 0
     cache_misses = 0
     
@@ -181,38 +551,48 @@ def geocode_and_store(addresses, google_maps_api_key=GOOGLE_MAPS_API_KEY, delay=
                 addresses_to_geocode.append(address)
                 addresses_already_queued.add(address)
     
+    contar('geocoding.cache_hits', cache_hits)
+    contar('geocoding.cache_misses', cache_misses)
     if use_cache and cache_hits > 0:
         print(f"  ✓ Caché: {cache_hits} direcciones recuperadas, {cache_misses} nuevas a geocodificar")
     
     # Geocodificar direcciones no encontradas en caché
     if addresses_to_geocode:
-        if use_parallel and len(addresses_to_geocode) > 10:
-            # Geocodificación paralela
-            _geocode_parallel(
-                addresses_to_geocode, 
-                geocoded_addresses_dict, 
-                not_found_addresses,
-                cache,
-                google_maps_api_key,
-                max_workers,
-                delay,
-                address_to_codigos
-            )
-        else:
-            # Geocodificación secuencial
-            _geocode_sequential(
-                addresses_to_geocode,
-                geocoded_addresses_dict,
-                not_found_addresses,
-                cache,
-                google_maps_api_key,
-                delay,
-                address_to_codigos
-            )
+        ahorradas_antes = consultas_ahorradas()
+        with etapa('api'):
+            if use_parallel and len(addresses_to_geocode) > 10:
+                # Geocodificación paralela
+                _geocode_parallel(
+                    addresses_to_geocode, 
+                    geocoded_addresses_dict, 
+                    not_found_addresses,
+                    cache,
+                    google_maps_api_key,
+                    max_workers,
+                    delay,
+                    address_to_codigos
+                )
+            else:
+                # Geocodificación secuencial
+                _geocode_sequential(
+                    addresses_to_geocode,
+                    geocoded_addresses_dict,
+                    not_found_addresses,
+                    cache,
+                    google_maps_api_key,
+                    delay,
+                    address_to_codigos
+                )
+    
+        ahorradas = {k: v - ahorradas_antes[k] for k, v in consultas_ahorradas().items()}
+        if any(ahorradas.values()):
+            print(f"  🤝 {sum(ahorradas.values())} consultas ahorradas: {ahorradas['coalescidas']} en curso en otro hilo, "
+                  f"{ahorradas['compartidas']} resueltas por otro proceso")
     
     # Guardar caché actualizado
-    if use_cache and addresses_to_geocode:
-        save_cache(cache)
+    if use_cache and (addresses_to_geocode or cache_sembrado):
+        with etapa('guardar_cache'):
+            save_cache(cache)
     
     # Detectar y reportar duplicados
     total_codigos = sum(len(data['codigos']) for data in geocoded_addresses_dict.values())
@@ -227,9 +607,25 @@ def geocode_and_store(addresses, google_maps_api_key=GOOGLE_MAPS_API_KEY, delay=
         for coords, data in geocoded_addresses_dict.items()
     ]
     
+    contar('geocoding.no_encontradas', len(not_found_addresses))
     return geocoded_addresses, not_found_addresses
 
 
+def consultas_ahorradas():
+    """
+    Consultas a la API ahorradas en la ejecución activa por no repetir una
+    consulta en curso.
+    
+    Returns:
+        dict: {'coalescidas': esperando a otro hilo, 'compartidas': resueltas por otro proceso}
+    """
+    contadores = instrumentacion_actual().informe()['contadores']
+    return {
+        'coalescidas': contadores.get('geocoding.coalescidas', 0),
+        'compartidas': contadores.get('geocoding.compartidas', 0),
+    }
+
+
 def _geocode_sequential(addresses, geocoded_dict, not_found_list, cache, api_key, delay, address_to_codigos=None):
     """
     Geocodificación secuencial (una por una).
@@ -298,8 +694,14 @@ def _geocode_parallel(addresses, geocoded_dict, not_found_list, cache, api_key,
         }
         
         # Procesar resultados a medida que se completan
+        error = None
         for i, future in enumerate(as_completed(future_to_address)):
-            address, coords = future.result()
+            try:
+                address, coords = future.result()
+            except Exception as e:
+                # Se conservan los resultados de las demás peticiones antes de fallar
+                error = error or e
+                continue
             codigos_list = address_to_codigos.get(address, [])
             
             if coords:
@@ -319,9 +721,14 @@ def _geocode_parallel(addresses, geocoded_dict, not_found_list, cache, api_key,
             # Pequeño delay cada cierto número de peticiones
             if delay > 0 and (i + 1) % max_workers == 0:
                 time.sleep(delay)
+    
+    # Lo ya consultado está en el diario: la reanudación no lo vuelve a pedir
+    if error is not None:
+        raise error
 
 
-def geocode_and_store_fast(addresses, google_maps_api_key=GOOGLE_MAPS_API_KEY, max_workers=10, codigos_barras=None):
+def geocode_and_store_fast(addresses, google_maps_api_key=GOOGLE_MAPS_API_KEY, max_workers=10, codigos_barras=None,
+                           coordenadas_conocidas=None):
     """
     Versión rápida de geocodificación con caché y paralelización habilitados.
     Recomendado para grandes volúmenes de direcciones.
@@ -331,6 +738,7 @@ def geocode_and_store_fast(addresses, google_maps_api_key=GOOGLE_MAPS_API_KEY, m
         google_maps_api_key (str): API key de Google Maps
         max_workers (int): Número de hilos paralelos (default: 10)
         codigos_barras (list): Lista de códigos de barras asociados a cada dirección
+        coordenadas_conocidas (dict): {dirección: (lat, lon)} de ejecuciones anteriores
         
     Returns:
         tuple: (geocoded_addresses, not_found_addresses)
@@ -344,7 +752,8 @@ def geocode_and_store_fast(addresses, google_maps_api_key=GOOGLE_MAPS_API_KEY, m
         use_cache=True,
         use_parallel=True,
         max_workers=max_workers,
-        codigos_barras=codigos_barras
+        codigos_barras=codigos_barras,
+        coordenadas_conocidas=coordenadas_conocidas
     )
 
 
@@ -353,6 +762,8 @@ def clear_cache():
     Elimina el archivo de caché de geocodificaciones.
     Útil si las geocodificaciones antiguas son incorrectas.
     """
+    _cache_memoria.update(mtime=None, datos=None)
+    _cache_disco.update(mtime=None, datos={})
     if os.path.exists(CACHE_FILE):
         os.remove(CACHE_FILE)
         print(f"  ✓ Caché eliminado: {CACHE_FILE}")
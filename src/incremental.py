@@ -0,0 +1,282 @@
+"""
+Modo incremental: reprocesa solo las filas del spreadsheet que han cambiado
+
+Cada ejecución guarda el estado por fila (huella = código + columna D + dirección,
+dirección limpia, coordenadas y zona) y el orden final de cada zona. En la
+siguiente ejecución con --incremental:
+- las filas nuevas o modificadas se limpian, geocodifican y clasifican
+- las filas eliminadas se quitan de su zona
+- las paradas nuevas se insertan en la ruta publicada de su zona sin mover
+  las que ya estaban (INCREMENTAL_INSERTAR; si es False, se reordena la zona)
+- solo se reescriben las zonas afectadas
+"""
+import json
+import os
+
+import config
+
+from address_model_cleaner import procesar_direcciones_con_modelo
+from geocoding import geocode_and_store_fast, load_cache, get_from_cache
+from zone_manager import clasificar_zona
+from line_distance_solver import procesar_zonas_con_linea, insertar_en_ruta_ordenada
+from barcode_index import publicar_indice_codigos
+from results_store import registrar_ejecucion
+from sheets_manager import COLUMNAS_RESULTADOS, COLUMNA_NO_ENCONTRADAS, columna_completa
+from config import GOOGLE_MAPS_API_KEY, DEPOT_COORDS, ZONE_ROUTE_LINES
+
+# Archivo de estado de la última ejecución
+ESTADO_FILE = 'estado_ultima_ejecucion.json'
+
+# Paradas nuevas: insertarlas en la ruta ya publicada (True) o reordenar la zona entera (False)
+INCREMENTAL_INSERTAR = getattr(config, 'INCREMENTAL_INSERTAR', True)
+
+
+def cargar_estado():
+    """
+    Carga el estado de la última ejecución.
+
+    Returns:
+        dict: {'filas': {huella: registro}, 'zonas': {zona: [items]}} o None si no existe
+    """
+    if not os.path.exists(ESTADO_FILE):
+        return None
+
+    try:
+        with open(ESTADO_FILE, 'r', encoding='utf-8') as f:
+            estado = json.load(f)
+    except Exception as e:
+        print(f"  ⚠️ Error cargando estado incremental: {e}")
+        return None
+
+    # JSON no tiene tuplas: restaurar coordenadas como tuplas
+    for registro in estado['filas'].values():
+        if registro['coords'] is not None:
+            registro['coords'] = tuple(registro['coords'])
+    estado['zonas'] = {
+        zona: [(tuple(coords), address, codigos) for coords, address, codigos in items]
+        for zona, items in estado['zonas'].items()
+    }
+    return estado
+
+
+def guardar_estado(filas, zonas_ordenadas, path=ESTADO_FILE):
+    """
+    Guarda el estado de esta ejecución para la siguiente en modo incremental.
+
+    Args:
+        filas (dict): {huella: {'codigo', 'raw', 'direccion', 'coords', 'zona'}}
+        zonas_ordenadas (dict): Resultado ordenado por zona
+        path (str): Archivo de estado (multi_tenant.py usa uno por inquilino)
+    """
+    estado = {
+        'filas': filas,
+        'zonas': {
+            zona: [[list(item[0]), item[1], list(item[2]) if len(item) >= 3 else []] for item in items]
+            for zona, items in zonas_ordenadas.items()
+        }
+    }
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(estado, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def construir_registros(huellas, direcciones_raw, codigos_barras, direcciones_limpias, zonas_ordenadas=None):
+    """
+    Construye los registros por fila a partir de una ejecución.
+
+    Args:
+        huellas (list): Huella de cada fila (SheetsManager.huellas)
+        direcciones_raw (list): Direcciones sin procesar
+        codigos_barras (list): Códigos de barras
+        direcciones_limpias (list): Direcciones limpias
+        zonas_ordenadas (dict): Si se indica, la zona se toma de aquí en vez de recalcularla
+
+    Returns:
+        dict: {huella: {'codigo', 'raw', 'direccion', 'coords', 'zona'}}
+    """
+    zona_por_coords = {}
+    if zonas_ordenadas:
+        for zona, items in zonas_ordenadas.items():
+            for item in items:
+                zona_por_coords[tuple(item[0])] = zona
+
+    cache = load_cache()
+    registros = {}
+    for huella, raw, codigo, direccion in zip(huellas, direcciones_raw, codigos_barras, direcciones_limpias):
+        coords = get_from_cache(direccion, cache)
+        if coords is None:
+            zona = None
+        elif coords in zona_por_coords:
+            zona = zona_por_coords[coords]
+        else:
+            zona = clasificar_zona(coords)
+
+        registros[huella] = {
+            'codigo': codigo,
+            'raw': raw,
+            'direccion': direccion,
+            'coords': coords,
+            'zona': zona
+        }
+    return registros
+
+
+def _agrupar_por_coordenadas(registros):
+    """Agrupa registros con las mismas coordenadas (mismo criterio que geocode_and_store)."""
+    agrupados = {}
+    for registro in registros:
+        coords = registro['coords']
+        if coords not in agrupados:
+            agrupados[coords] = {'address': registro['direccion'], 'codigos': []}
+        codigo = registro['codigo']
+        if codigo and codigo not in agrupados[coords]['codigos']:
+            agrupados[coords]['codigos'].append(codigo)
+    return [(coords, data['address'], data['codigos']) for coords, data in agrupados.items()]
+
+
+def actualizar_ruta_publicada(items_publicados, items_actuales, linea_puntos):
+    """
+    Actualiza la ruta publicada de una zona con sus paradas actuales: quita las
+    que ya no están, actualiza códigos y dirección de las que siguen (en el
+    mismo orden) e inserta las nuevas donde menos alargan la ruta.
+
+    Args:
+        items_publicados (list): Ruta de la última ejecución [(coords, address, codigos), ...]
+        items_actuales (list): Paradas actuales de la zona (agrupadas por coordenadas)
+        linea_puntos (list): Línea de ruta de la zona
+
+    Returns:
+        tuple: (ruta actualizada, número de paradas insertadas, metros añadidos)
+    """
+    actuales = {item[0]: item for item in items_actuales}
+    publicadas = [actuales[item[0]] for item in items_publicados if item[0] in actuales]
+    vistas = {item[0] for item in publicadas}
+    nuevas = [item for item in items_actuales if item[0] not in vistas]
+
+    ruta, incremento = insertar_en_ruta_ordenada(publicadas, nuevas, linea_puntos, DEPOT_COORDS)
+    return ruta, len(nuevas), incremento
+
+
+def procesar_rutas_incremental(sheets_manager):
+    """
+    Procesa solo las filas añadidas, modificadas o eliminadas desde la última ejecución.
+
+    Args:
+        sheets_manager (SheetsManager): Gestor ya conectado
+
+    Returns:
+        bool: True si se procesó en modo incremental, False si no hay estado
+              previo (hay que hacer una ejecución completa)
+    """
+    estado = cargar_estado()
+    if estado is None:
+        print("  ℹ️ No hay estado de una ejecución anterior: se hará una ejecución completa")
+        return False
+
+    print("\n[2/7] Leyendo spreadsheet y comparando con la última ejecución...")
+    direcciones_raw, codigos_barras, _ = sheets_manager.leer_direcciones_completas()
+    huellas = sheets_manager.huellas
+
+    filas_previas = estado['filas']
+    actuales = set(huellas)
+    eliminadas = [filas_previas[h] for h in filas_previas if h not in actuales]
+    indices_nuevas = []
+    vistas = set()
+    for i, huella in enumerate(huellas):
+        if huella not in filas_previas and huella not in vistas:
+            indices_nuevas.append(i)
+            vistas.add(huella)
+
+    print(f"  ✓ {len(huellas)} filas: {len(indices_nuevas)} nuevas/modificadas, {len(eliminadas)} eliminadas")
+
+    if not indices_nuevas and not eliminadas:
+        print("\n  ✅ Sin cambios desde la última ejecución, nada que escribir")
+        return True
+
+    # 3-4. Limpiar y geocodificar solo las filas nuevas
+    nuevos_registros = {}
+    if indices_nuevas:
+        print(f"\n[3/7] Limpiando {len(indices_nuevas)} direcciones nuevas...")
+        raw_nuevas = [direcciones_raw[i] for i in indices_nuevas]
+        codigos_nuevos = [codigos_barras[i] for i in indices_nuevas]
+        limpias = procesar_direcciones_con_modelo(raw_nuevas, mostrar_comparativa=True)
+
+        print(f"\n[4/7] Geocodificando {len(limpias)} direcciones nuevas...")
+        geocode_and_store_fast(limpias, GOOGLE_MAPS_API_KEY, max_workers=10, codigos_barras=list(codigos_nuevos))
+
+        nuevos_registros = construir_registros(
+            [huellas[i] for i in indices_nuevas], raw_nuevas, codigos_nuevos, limpias
+        )
+
+    # 5. Zonas afectadas por filas nuevas o eliminadas
+    cambiadas = list(nuevos_registros.values()) + eliminadas
+    zonas_afectadas = {r['zona'] for r in cambiadas if r['zona'] is not None}
+    no_encontradas_cambiadas = any(r['coords'] is None for r in cambiadas)
+
+    registros = {h: filas_previas.get(h) or nuevos_registros[h] for h in huellas}
+    registros_ordenados = [registros[h] for h in dict.fromkeys(huellas)]
+
+    print(f"\n[5/7] Zonas afectadas: {', '.join(sorted(zonas_afectadas)) or 'ninguna'}")
+
+    # 6. Actualizar solo las zonas afectadas; el resto conserva su orden anterior
+    zonas_ordenadas = dict(estado['zonas'])
+    if zonas_afectadas:
+        zonas_dict = {
+            zona: _agrupar_por_coordenadas([r for r in registros_ordenados if r['zona'] == zona])
+            for zona in zonas_afectadas
+        }
+        if INCREMENTAL_INSERTAR:
+            # El repartidor ya tiene la ruta: las paradas nuevas se insertan sin mover las demás
+            print("\n[6/7] Insertando paradas nuevas en las rutas publicadas...")
+            for zona, items in zonas_dict.items():
+                ruta, insertadas, incremento = actualizar_ruta_publicada(
+                    zonas_ordenadas.get(zona, []), items, ZONE_ROUTE_LINES.get(zona, [])
+                )
+                zonas_ordenadas[zona] = ruta
+                print(f"  ✓ {zona}: {insertadas} paradas insertadas (+{incremento:.0f} m), {len(ruta)} en total")
+        else:
+            print("\n[6/7] Optimizando rutas de las zonas afectadas...")
+            zonas_ordenadas.update(procesar_zonas_con_linea(zonas_dict))
+
+    # 7. Reescribir solo las columnas afectadas
+    print("\n[7/7] Reescribiendo columnas afectadas...")
+    columnas_destino = {z: cols for z, cols in COLUMNAS_RESULTADOS.items() if z in zonas_afectadas}
+    columnas_limpiar = [columna_completa(c) for cols in columnas_destino.values() for c in cols]
+
+    # La columna de no encontradas coincide con la de códigos de sin_zona: reescribir juntas
+    reescribir_no_encontradas = no_encontradas_cambiadas or 'sin_zona' in zonas_afectadas
+    not_found_addresses = []
+    if reescribir_no_encontradas:
+        direcciones_no_encontradas = dict.fromkeys(
+            r['direccion'] for r in registros_ordenados if r['coords'] is None
+        )
+        not_found_addresses = [[d] for d in direcciones_no_encontradas]
+        columnas_limpiar.append(columna_completa(COLUMNA_NO_ENCONTRADAS))
+        if 'sin_zona' not in columnas_destino:
+            columnas_destino['sin_zona'] = COLUMNAS_RESULTADOS['sin_zona']
+            columnas_limpiar.extend(columna_completa(c) for c in COLUMNAS_RESULTADOS['sin_zona'])
+
+    sheets_manager.escribir_fase_resultados(
+        {z: zonas_ordenadas.get(z, []) for z in columnas_destino},
+        not_found_addresses,
+        columnas_destino=columnas_destino,
+        excluir_inicio_fin=False,
+        columnas_limpiar=list(dict.fromkeys(columnas_limpiar)),
+        rango_no_encontradas=COLUMNA_NO_ENCONTRADAS if reescribir_no_encontradas else None
+    )
+
+    publicar_indice_codigos(zonas_ordenadas, excluir_inicio_fin=False)
+    guardar_estado(registros, zonas_ordenadas)
+    registrar_ejecucion(
+        zonas_ordenadas,
+        [r['codigo'] for r in registros_ordenados],
+        [r['raw'] for r in registros_ordenados],
+        [r['direccion'] for r in registros_ordenados]
+    )
+
+    print("\n" + "="*60)
+    print("  ✅ PROCESO INCREMENTAL COMPLETADO")
+    print("="*60)
+    return True
@@ -0,0 +1,251 @@
+"""
+Instrumentación por etapas: tiempos, contadores e informe JSON de cada ejecución
+
+Uso:
+    from instrumentation import etapa, contar
+
+    with etapa('geocodificacion'):
+        with etapa('api'):          # Sub-etapa: 'geocodificacion/api'
+            ...
+        contar('geocoding.api_llamadas')
+
+Cada etapa acumula llamadas, tiempo de pared y tiempo de CPU del proceso. Al
+final de la ejecución, guardar_informe() escribe un JSON en INFORMES_DIR con
+las etapas, los contadores y, si se pidió, el perfil de las etapas indicadas:
+- 'cprofile': guarda un .prof por etapa (abrir con snakeviz o pstats) y las
+  funciones con más tiempo acumulado en el informe
+- 'tracemalloc': pico de memoria y líneas con más memoria reservada
+"""
+import json
+import logging
+import os
+import platform
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from threading import Lock, local
+
+import config
+
+INFORMES_DIR = getattr(config, 'INFORMES_DIR', 'informes_ejecucion')
+PERFIL_ETAPAS = getattr(config, 'PERFIL_ETAPAS', [])  # Etapas a perfilar ('*' = todas)
+PERFIL_MODO = getattr(config, 'PERFIL_MODO', 'cprofile')  # 'cprofile' o 'tracemalloc'
+
+_TOP_PERFIL = 20  # Entradas del perfil incluidas en el informe
+
+
+class Instrumentacion:
+    """Acumula etapas y contadores de una ejecución (segura entre hilos)"""
+
+    def __init__(self, nombre='ejecucion', perfil_etapas=None, perfil_modo=None):
+        self.nombre = nombre
+        self.inicio = datetime.now()
+        self._t0 = time.perf_counter()
+        self._cpu0 = time.process_time()
+        self.etapas = {}  # {ruta: {'llamadas', 'pared_s', 'cpu_s'}}
+        self.contadores = {}
+        self.perfiles = {}
+        self.perfil_etapas = set(PERFIL_ETAPAS if perfil_etapas is None else perfil_etapas)
+        self.perfil_modo = PERFIL_MODO if perfil_modo is None else perfil_modo
+        self._lock = Lock()
+        self._pila = local()
+
+    def _ruta_actual(self):
+        return getattr(self._pila, 'rutas', [])
+
+    def _debe_perfilar(self, ruta):
+        # Vale la ruta completa ('geocodificacion/api') o solo el nombre ('api')
+        return ('*' in self.perfil_etapas or ruta in self.perfil_etapas
+                or ruta.rsplit('/', 1)[-1] in self.perfil_etapas)
+
+    @contextmanager
+    def etapa(self, nombre):
+        """Mide una etapa; las etapas anidadas en el mismo hilo se registran como 'padre/hijo'."""
+        rutas = self._ruta_actual()
+        ruta = f"{rutas[-1]}/{nombre}" if rutas else nombre
+        self._pila.rutas = rutas + [ruta]
+
+        perfil = self._iniciar_perfil(ruta) if self._debe_perfilar(ruta) else None
+        t0 = time.perf_counter()
+        cpu0 = time.process_time()
+        try:
+            yield
+        finally:
+            pared = time.perf_counter() - t0
+            cpu = time.process_time() - cpu0
+            if perfil is not None:
+                self._terminar_perfil(ruta, perfil)
+            self._pila.rutas = rutas
+
+            with self._lock:
+                datos = self.etapas.setdefault(ruta, {'llamadas': 0, 'pared_s': 0.0, 'cpu_s': 0.0})
+                datos['llamadas'] += 1
+                datos['pared_s'] += pared
+                datos['cpu_s'] += cpu
+
+    def contar(self, nombre, n=1):
+        with self._lock:
+            self.contadores[nombre] = self.contadores.get(nombre, 0) + n
+
+    def _iniciar_perfil(self, ruta):
+        if self.perfil_modo == 'tracemalloc':
+            import tracemalloc
+            ya_activo = tracemalloc.is_tracing()
+            if not ya_activo:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            return ('tracemalloc', tracemalloc.take_snapshot(), ya_activo)
+
+        import cProfile
+        perfilador = cProfile.Profile()
+        try:
+            perfilador.enable()
+        except ValueError:
+            # Ya hay otro perfilador activo (etapa anidada también perfilada)
+            return None
+        return ('cprofile', perfilador, None)
+
+    def _terminar_perfil(self, ruta, perfil):
+        modo, objeto, ya_activo = perfil
+
+        if modo == 'tracemalloc':
+            import tracemalloc
+            _, pico = tracemalloc.get_traced_memory()
+            diferencias = tracemalloc.take_snapshot().compare_to(objeto, 'lineno')
+            if not ya_activo:
+                tracemalloc.stop()
+            self.perfiles[ruta] = {
+                'modo': modo,
+                'pico_mb': round(pico / 1024 / 1024, 3),
+                'top': [
+                    {'linea': str(d.traceback), 'kb': round(d.size_diff / 1024, 1), 'bloques': d.count_diff}
+                    for d in diferencias[:_TOP_PERFIL]
+                ]
+            }
+            return
+
+        import pstats
+        objeto.disable()
+        os.makedirs(INFORMES_DIR, exist_ok=True)
+        prof_path = os.path.join(
+            INFORMES_DIR, f"{self.inicio:%Y%m%d_%H%M%S}_{ruta.replace('/', '.')}.prof"
+        )
+        objeto.dump_stats(prof_path)
+
+        estadisticas = pstats.Stats(objeto)
+        filas = sorted(estadisticas.stats.items(), key=lambda kv: kv[1][3], reverse=True)
+        self.perfiles[ruta] = {
+            'modo': modo,
+            'fichero': prof_path,
+            'top': [
+                {'funcion': f"{archivo}:{linea}({funcion})", 'llamadas': nc,
+                 'tottime_s': round(tt, 6), 'cumtime_s': round(ct, 6)}
+                for (archivo, linea, funcion), (_, nc, tt, ct, _) in filas[:_TOP_PERFIL]
+            ]
+        }
+
+    def informe(self):
+        """
+        Returns:
+            dict: Informe de la ejecución listo para serializar
+        """
+        with self._lock:
+            etapas = {
+                ruta: {k: round(v, 6) if isinstance(v, float) else v for k, v in datos.items()}
+                for ruta, datos in self.etapas.items()
+            }
+            contadores = dict(sorted(self.contadores.items()))
+
+        return {
+            'nombre': self.nombre,
+            'inicio': self.inicio.isoformat(timespec='seconds'),
+            'pared_s': round(time.perf_counter() - self._t0, 6),
+            'cpu_s': round(time.process_time() - self._cpu0, 6),
+            'entorno': {'python': sys.version.split()[0], 'plataforma': platform.platform(),
+                        'cpus': os.cpu_count()},
+            'etapas': etapas,
+            'contadores': contadores,
+            'perfiles': self.perfiles
+        }
+
+
+class _ContadorReintentos(logging.Filter):
+    """Cuenta los reintentos que googleapiclient solo anuncia en el log"""
+
+    def filter(self, record):
+        # Filtro y no handler: no cambia dónde se muestran los avisos
+        try:
+            if 'retry' in record.getMessage().lower():
+                contar('sheets.reintentos')
+        except Exception:
+            pass
+        return True
+
+
+_actual = Instrumentacion()
+logging.getLogger('googleapiclient.http').addFilter(_ContadorReintentos())
+
+
+def iniciar_ejecucion(nombre='ejecucion', perfil_etapas=None, perfil_modo=None):
+    """
+    Empieza una ejecución nueva (descarta etapas y contadores anteriores).
+
+    Args:
+        nombre (str): Nombre de la ejecución (aparece en el informe y en el fichero)
+        perfil_etapas (list): Etapas a perfilar; si es None usa PERFIL_ETAPAS
+        perfil_modo (str): 'cprofile' o 'tracemalloc'; si es None usa PERFIL_MODO
+
+    Returns:
+        Instrumentacion: La instrumentación activa
+    """
+    global _actual
+    _actual = Instrumentacion(nombre, perfil_etapas, perfil_modo)
+    return _actual
+
+
+def instrumentacion_actual():
+    return _actual
+
+
+def etapa(nombre):
+    """Context manager que mide una etapa en la ejecución activa."""
+    return _actual.etapa(nombre)
+
+
+def contar(nombre, n=1):
+    """Suma n al contador indicado en la ejecución activa."""
+    _actual.contar(nombre, n)
+
+
+def guardar_informe(path=None, extra=None):
+    """
+    Escribe el informe JSON de la ejecución activa.
+
+    Args:
+        path (str): Ruta del informe; por defecto INFORMES_DIR/<fecha>_<nombre>.json
+        extra (dict): Secciones adicionales del informe (p. ej. resultados por inquilino)
+
+    Returns:
+        str: Ruta del informe escrito
+    """
+    informe = _actual.informe()
+    informe.update(extra or {})
+    if path is None:
+        os.makedirs(INFORMES_DIR, exist_ok=True)
+        path = os.path.join(INFORMES_DIR, f"{_actual.inicio:%Y%m%d_%H%M%S}_{_actual.nombre}.json")
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(informe, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def imprimir_resumen():
+    """Imprime las etapas de primer nivel con su tiempo de pared y de CPU."""
+    informe = _actual.informe()
+    print(f"\n  ⏱️  Tiempos por etapa (total {informe['pared_s']:.2f} s, CPU {informe['cpu_s']:.2f} s):")
+    for ruta, datos in informe['etapas'].items():
+        if '/' not in ruta:
+            print(f"     - {ruta}: {datos['pared_s']:.2f} s (CPU {datos['cpu_s']:.2f} s)")
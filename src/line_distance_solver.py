@@ -1,133 +1,158 @@
 """
 Módulo para ordenar paquetes según su distancia a una línea de ruta
 """
+import time
+from bisect import bisect_right
+
 import numpy as np
+import config
 from config import ZONE_ROUTE_LINES
 
+RADIO_TIERRA_M = 6371000
+
+# Huecos evaluados a cada lado de la proyección de una parada nueva al insertarla
+# en una ruta ya publicada (ver RutaInsercion)
+INSERCION_VENTANA = getattr(config, 'INSERCION_VENTANA', 32)
+
+# Búsqueda local (2-opt y Or-opt) tras ordenar por la línea: las paradas lejos de
+# la línea que se proyectan juntas quedan intercaladas de un lado y otro de la calle
+MEJORA_LOCAL_ACTIVA = getattr(config, 'MEJORA_LOCAL_ACTIVA', True)
+MEJORA_LOCAL_MAX_ITERACIONES = getattr(config, 'MEJORA_LOCAL_MAX_ITERACIONES', 500)  # Por zona
+MEJORA_LOCAL_MAX_SEGUNDOS = getattr(config, 'MEJORA_LOCAL_MAX_SEGUNDOS', 0.5)  # Por zona
+MEJORA_LOCAL_VECINOS = getattr(config, 'MEJORA_LOCAL_VECINOS', 10)  # Candidatos por parada
+MEJORA_LOCAL_MAX_PARADAS = getattr(config, 'MEJORA_LOCAL_MAX_PARADAS', 3000)  # Zonas mayores no se mejoran
 
-def calcular_distancia_y_posicion(punto, linea_inicio, linea_fin):
+
+def calcular_posicion_en_ruta_multi_segmento(punto, linea_puntos):
     """
-    Calcula tanto la distancia perpendicular como la posición de un punto respecto a una línea.
-    Esta función optimiza el cálculo haciendo ambas operaciones en una sola pasada.
+    Calcula la posición de un punto a lo largo de una ruta con múltiples segmentos
+    (un solo punto de posiciones_en_ruta).
     
     Args:
         punto (tuple): Coordenadas del punto (lat, lon)
-        linea_inicio (tuple): Punto inicial de la línea (lat, lon)
-        linea_fin (tuple): Punto final de la línea (lat, lon)
+        linea_puntos (list): Lista de puntos que definen la ruta [(lat1, lon1), (lat2, lon2), ...]
         
     Returns:
-        tuple: (distancia, posicion_relativa)
-            - distancia: Distancia perpendicular del punto a la línea
-            - posicion_relativa: Posición relativa (0-1, puede ser <0 o >1 si está fuera)
-    """
-    # Convertir a arrays numpy para cálculos vectoriales
-    p = np.array(punto)
-    l1 = np.array(linea_inicio)
-    l2 = np.array(linea_fin)
-    
-    # Vector de la línea
-    linea_vec = l2 - l1
-    linea_len = np.linalg.norm(linea_vec)
-    
-    if linea_len == 0:
-        # Si la línea tiene longitud 0, retorna distancia al punto y posición 0
-        return np.linalg.norm(p - l1), 0
-    
-    # Vector normalizado de la línea
-    linea_unitvec = linea_vec / linea_len
-    
-    # Vector del punto inicial al punto
-    punto_vec = p - l1
-    
-    # Proyección del punto sobre la línea (distancia a lo largo de la línea)
-    proyeccion = np.dot(punto_vec, linea_unitvec)
-    
-    # Posición relativa (normalizada 0-1)
-    posicion_relativa = proyeccion / linea_len
-    
-    # Punto más cercano en la línea
-    if proyeccion < 0:
-        # Antes del inicio de la línea
-        punto_cercano = l1
-    elif proyeccion > linea_len:
-        # Después del fin de la línea
-        punto_cercano = l2
-    else:
-        # Dentro de la línea
-        punto_cercano = l1 + proyeccion * linea_unitvec
-    
-    # Distancia perpendicular
-    distancia = np.linalg.norm(p - punto_cercano)
-    
-    return distancia, posicion_relativa
+        tuple: (posicion_en_ruta, distancia_minima)
+            - posicion_en_ruta: Posición normalizada (0-1) a lo largo de toda la ruta
+            - distancia_minima: Distancia perpendicular mínima a cualquier segmento
+    """
+    posiciones, distancias = posiciones_en_ruta([punto], linea_puntos)
+    return float(posiciones[0]), float(distancias[0])
 
-def calcular_posicion_en_ruta_multi_segmento(punto, linea_puntos):
+
+def posiciones_en_ruta(puntos, linea_puntos):
     """
-    Calcula la posición de un punto a lo largo de una ruta con múltiples segmentos.
+    Posición de muchos puntos a lo largo de una ruta con múltiples segmentos,
+    en una sola pasada de NumPy. Es la única implementación de la proyección:
+    calcular_posicion_en_ruta_multi_segmento, ordenar_por_linea y el almacén
+    de resultados la usan.
     
     Args:
-        punto (tuple): Coordenadas del punto (lat, lon)
-        linea_puntos (list): Lista de puntos que definen la ruta [(lat1, lon1), (lat2, lon2), ...]
+        puntos (list): Lista de coordenadas (lat, lon)
+        linea_puntos (list): Lista de puntos que definen la ruta
         
     Returns:
-        tuple: (posicion_en_ruta, distancia_minima)
-            - posicion_en_ruta: Posición acumulada a lo largo de toda la ruta
-            - distancia_minima: Distancia perpendicular mínima a cualquier segmento
+        tuple: (posiciones, distancias) como arrays de NumPy
+            - posiciones: Posición normalizada (0-1) de cada punto en la ruta
+            - distancias: Distancia mínima de cada punto a la ruta
     """
+    P = np.asarray(puntos, dtype=float).reshape(-1, 2)
     if len(linea_puntos) < 2:
-        return 0, float('inf')
-    
-    distancia_minima = float('inf')
-    posicion_en_ruta = 0
-    longitud_acumulada = 0
-    
-    # Calcular longitud total de la ruta
-    longitud_total = 0
-    for i in range(len(linea_puntos) - 1):
-        seg_vec = np.array(linea_puntos[i + 1]) - np.array(linea_puntos[i])
-        longitud_total += np.linalg.norm(seg_vec)
-    
-    # Encontrar el segmento más cercano
-    for i in range(len(linea_puntos) - 1):
-        inicio_seg = linea_puntos[i]
-        fin_seg = linea_puntos[i + 1]
-        
-        # Longitud de este segmento
-        seg_vec = np.array(fin_seg) - np.array(inicio_seg)
-        longitud_segmento = np.linalg.norm(seg_vec)
-        
-        # Calcular distancia y posición en este segmento (optimizado en una sola llamada)
-        dist, pos_rel = calcular_distancia_y_posicion(punto, inicio_seg, fin_seg)
-        
-        # Si este segmento está más cerca
-        if dist < distancia_minima:
-            distancia_minima = dist
-            # Calcular posición absoluta en la ruta
-            if pos_rel < 0:
-                posicion_en_ruta = longitud_acumulada
-            elif pos_rel > 1:
-                posicion_en_ruta = longitud_acumulada + longitud_segmento
-            else:
-                posicion_en_ruta = longitud_acumulada + pos_rel * longitud_segmento
-        
-        longitud_acumulada += longitud_segmento
+        return np.zeros(len(P)), np.full(len(P), np.inf)
+    
+    linea = np.asarray(linea_puntos, dtype=float)
+    A, B = linea[:-1], linea[1:]
+    V = B - A
+    L = np.linalg.norm(V, axis=1)
+    acumulada = np.concatenate(([0.0], np.cumsum(L)[:-1]))
+    longitud_total = L.sum()
+    
+    # t: posición relativa en cada segmento (puntos x segmentos); 0 en segmentos de longitud 0
+    PA = P[:, None, :] - A[None, :, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(L > 0, np.einsum('nmk,mk->nm', PA, V) / (L ** 2), 0.0)
+    t_recortada = np.clip(t, 0.0, 1.0)
+    
+    cercanos = A[None, :, :] + t_recortada[:, :, None] * V[None, :, :]
+    distancias = np.linalg.norm(P[:, None, :] - cercanos, axis=2)
+    
+    # Primer segmento con la distancia mínima (igual que la versión por punto)
+    mejor = np.argmin(distancias, axis=1)
+    filas = np.arange(len(P))
+    posiciones = acumulada[mejor] + t_recortada[filas, mejor] * L[mejor]
     
-    # Normalizar la posición (0-1)
     if longitud_total > 0:
-        posicion_normalizada = posicion_en_ruta / longitud_total
+        posiciones = posiciones / longitud_total
     else:
-        posicion_normalizada = 0
+        posiciones = np.zeros(len(P))
     
-    return posicion_normalizada, distancia_minima
+    return posiciones, distancias[filas, mejor]
 
 
-def ordenar_por_linea(geocoded_addresses, linea_puntos):
+def distancias_haversine(origenes, destinos):
+    """
+    Distancias en metros entre pares de coordenadas (vectorizado).
+    
+    Args:
+        origenes (array): Coordenadas (lat, lon) con forma (..., 2)
+        destinos (array): Coordenadas (lat, lon) con la misma forma (o difundible)
+        
+    Returns:
+        np.ndarray: Distancias en metros
+    """
+    a = np.radians(np.asarray(origenes, dtype=float))
+    b = np.radians(np.asarray(destinos, dtype=float))
+    h = (np.sin((b[..., 0] - a[..., 0]) / 2) ** 2
+         + np.cos(a[..., 0]) * np.cos(b[..., 0]) * np.sin((b[..., 1] - a[..., 1]) / 2) ** 2)
+    return 2 * RADIO_TIERRA_M * np.arcsin(np.sqrt(h))
+
+
+def distancia_haversine(punto_a, punto_b):
+    """
+    Distancia en metros entre dos coordenadas (lat, lon).
+    """
+    return float(distancias_haversine(punto_a, punto_b))
+
+
+def longitud_ruta(coords_ordenadas, inicio=None):
+    """
+    Longitud en metros de una ruta que visita los puntos en el orden dado.
+    
+    Args:
+        coords_ordenadas (list): Lista de coordenadas (lat, lon) en orden de visita
+        inicio (tuple): Punto de salida opcional (p. ej. el depósito)
+        
+    Returns:
+        float: Suma de las distancias entre paradas consecutivas (metros)
+    """
+    puntos = ([inicio] if inicio is not None else []) + list(coords_ordenadas)
+    if len(puntos) < 2:
+        return 0.0
+    
+    # Vectorizado: una sola pasada sobre todos los tramos
+    coords = np.asarray(puntos, dtype=float)
+    return float(np.sum(distancias_haversine(coords[:-1], coords[1:])))
+
+
+def _coordenadas_validas(coords):
+    """True si coords es un par (lat, lon) de números finitos."""
+    try:
+        valores = np.asarray(coords, dtype=float)
+    except (TypeError, ValueError):
+        return False
+    return valores.shape == (2,) and bool(np.isfinite(valores).all())
+
+
+def ordenar_por_linea(geocoded_addresses, linea_puntos, posiciones=None):
     """
     Ordena direcciones según su posición a lo largo de una línea de ruta.
     
     Args:
         geocoded_addresses (list): Lista de tuplas [(coords, address, codigos_barras), ...]
         linea_puntos (list): Lista de puntos que definen la ruta
+        posiciones (dict): {address: posición} ya calculadas en esta línea
+                           (zone_manager.GeometriaCacheada); las que falten se calculan
         
     Returns:
         list: Lista de tuplas ordenadas [(coords, address, codigos_barras), ...]
@@ -139,45 +164,378 @@ def ordenar_por_linea(geocoded_addresses, linea_puntos):
         print(f"  ⚠️ Línea de ruta tiene menos de 2 puntos, retornando orden original")
         return geocoded_addresses
     
-    # Calcular posición de cada dirección a lo largo de la línea
-    direcciones_con_posicion = []
-    direcciones_problematicas = []
-    
-    for item in geocoded_addresses:
-        # Manejar tuplas de 2 o 3 elementos
-        coords = item[0]
-        address = item[1]
-        codigos_barras = item[2] if len(item) >= 3 else []
-        
-        try:
-            posicion, distancia = calcular_posicion_en_ruta_multi_segmento(coords, linea_puntos)
-            
-            # Verificar que los valores sean válidos
-            if posicion is None or distancia is None or not isinstance(posicion, (int, float)) or not isinstance(distancia, (int, float)):
-                print(f"  ⚠️ Valores inválidos para '{address[:50]}...': pos={posicion}, dist={distancia}")
-                direcciones_problematicas.append((float('inf'), float('inf'), (coords, address, codigos_barras)))
-            else:
-                direcciones_con_posicion.append((posicion, distancia, (coords, address, codigos_barras)))
-        except Exception as e:
-            print(f"  ⚠️ Error procesando '{address[:50]}...': {e}")
-            # Colocar al final si hay error
-            direcciones_problematicas.append((float('inf'), float('inf'), (coords, address, codigos_barras)))
+    # Las posiciones ya calculadas se reutilizan; las que faltan se proyectan todas a la vez
+    items = [(item[0], item[1], item[2] if len(item) >= 3 else []) for item in geocoded_addresses]
+    posiciones_items = [None] * len(items)
+    por_calcular = []
+    for i, (coords, address, _) in enumerate(items):
+        if posiciones is not None and posiciones.get(address) is not None:
+            posiciones_items[i] = posiciones[address]
+        elif _coordenadas_validas(coords):
+            por_calcular.append(i)
+        else:
+            print(f"  ⚠️ Coordenadas inválidas para '{address[:50]}...': {coords}")
     
-    # Ordenar por posición a lo largo de la línea (menor posición = más cerca del inicio)
-    direcciones_con_posicion.sort(key=lambda x: x[0])
+    if por_calcular:
+        calculadas, _ = posiciones_en_ruta([items[i][0] for i in por_calcular], linea_puntos)
+        for i, posicion in zip(por_calcular, calculadas):
+            posiciones_items[i] = float(posicion)
     
-    # Extraer las tuplas completas ordenadas
-    direcciones_ordenadas = [item_tuple for _, _, item_tuple in direcciones_con_posicion]
+    # Ordenar por posición a lo largo de la línea (menor posición = más cerca del inicio);
+    # orden estable: los empates conservan el orden de entrada
+    con_posicion = sorted((i for i, p in enumerate(posiciones_items) if p is not None),
+                          key=lambda i: posiciones_items[i])
+    direcciones_ordenadas = [items[i] for i in con_posicion]
     
     # Añadir direcciones problemáticas al final
-    if direcciones_problematicas:
-        print(f"  ⚠️ {len(direcciones_problematicas)} direcciones colocadas al final por error en procesamiento")
-        direcciones_ordenadas.extend([item_tuple for _, _, item_tuple in direcciones_problematicas])
+    problematicas = [items[i] for i, p in enumerate(posiciones_items) if p is None]
+    if problematicas:
+        print(f"  ⚠️ {len(problematicas)} direcciones colocadas al final por error en procesamiento")
+        direcciones_ordenadas.extend(problematicas)
     
     return direcciones_ordenadas
 
 
-def procesar_zonas_con_linea(zonas_dict, lineas_por_zona=None):
+class RutaInsercion:
+    """
+    Ruta ya ordenada (publicada) en la que insertar paradas nuevas sin mover
+    las existentes.
+
+    Las posiciones de las paradas en la línea de ruta se calculan una vez. La
+    proyección de cada parada nueva se busca por bisección en ellas (O(log n))
+    y solo se evalúa el coste de inserción en los INSERCION_VENTANA huecos a
+    cada lado, no en toda la ruta. La inserción en sí (list.insert en items y
+    en las claves) es O(n) por parada; con las decenas o pocos cientos de
+    paradas de una zona es una copia de memoria despreciable frente al cálculo
+    de costes.
+    """
+
+    def __init__(self, items_ordenados, linea_puntos, inicio=None, ventana=INSERCION_VENTANA):
+        """
+        Args:
+            items_ordenados (list): Paradas en su orden actual [(coords, address, codigos), ...]
+            linea_puntos (list): Línea de ruta de la zona
+            inicio (tuple): Punto de salida opcional (p. ej. el depósito)
+            ventana (int): Huecos evaluados a cada lado de la proyección
+        """
+        self.items = list(items_ordenados)
+        self.linea_puntos = linea_puntos
+        self.inicio = inicio
+        self.ventana = ventana
+
+        if self.items and len(linea_puntos) >= 2:
+            posiciones, _ = posiciones_en_ruta([item[0] for item in self.items], linea_puntos)
+            # Si la ruta se editó a mano las posiciones no son crecientes: se usa
+            # el máximo acumulado, que sí lo es y conserva el orden para la búsqueda
+            self._claves = np.maximum.accumulate(posiciones).tolist()
+        else:
+            self._claves = [0.0] * len(self.items)
+
+    def _costes(self, huecos, coords):
+        """Metros que añade insertar `coords` en cada hueco (antes de items[hueco])."""
+        n = len(self.items)
+        nuevo = np.asarray(coords, dtype=float)
+        # Sin punto de salida, el hueco 0 no tiene anterior; tras la última parada no hay siguiente
+        anteriores = np.array([self.items[h - 1][0] if h > 0 else (self.inicio or (np.nan, np.nan))
+                               for h in huecos], dtype=float)
+        siguientes = np.array([self.items[h][0] if h < n else (np.nan, np.nan) for h in huecos], dtype=float)
+
+        hasta_nuevo = np.nan_to_num(distancias_haversine(anteriores, nuevo))
+        desde_nuevo = np.nan_to_num(distancias_haversine(nuevo, siguientes))
+        tramo = np.nan_to_num(distancias_haversine(anteriores, siguientes))
+        return hasta_nuevo + desde_nuevo - tramo
+
+    def insertar(self, item, posicion=None):
+        """
+        Inserta una parada en el hueco más barato cerca de su proyección.
+
+        Buscar el hueco es O(log n + ventana); desplazar la lista para insertar, O(n).
+
+        Args:
+            item (tuple): Parada (coords, address, codigos)
+            posicion (float): Posición ya calculada en la línea (None = calcularla)
+
+        Returns:
+            tuple: (índice donde quedó, metros añadidos a la ruta)
+        """
+        if posicion is None:
+            posicion = float(posiciones_en_ruta([item[0]], self.linea_puntos)[0][0]) \
+                if len(self.linea_puntos) >= 2 else 0.0
+
+        centro = bisect_right(self._claves, posicion)
+        huecos = range(max(0, centro - self.ventana), min(len(self.items), centro + self.ventana) + 1)
+        costes = self._costes(huecos, item[0])
+        mejor = int(np.argmin(costes))
+        indice = huecos[mejor]
+
+        # Clave entre las de sus vecinos: las claves siguen crecientes sin tocar el resto
+        minimo = self._claves[indice - 1] if indice > 0 else float('-inf')
+        maximo = self._claves[indice] if indice < len(self._claves) else float('inf')
+        self.items.insert(indice, item)
+        self._claves.insert(indice, min(max(posicion, minimo), maximo))
+        return indice, float(costes[mejor])
+
+    def insertar_varias(self, nuevos):
+        """
+        Inserta varias paradas (proyectadas todas a la vez) una tras otra.
+
+        Returns:
+            list: (item, índice, metros añadidos) por parada, en el orden recibido
+        """
+        if not nuevos:
+            return []
+        if len(self.linea_puntos) >= 2:
+            posiciones, _ = posiciones_en_ruta([item[0] for item in nuevos], self.linea_puntos)
+        else:
+            posiciones = np.zeros(len(nuevos))
+        colocadas = []
+        for item, posicion in zip(nuevos, posiciones):
+            indice, incremento = self.insertar(item, float(posicion))
+            colocadas.append((item, indice, incremento))
+        return colocadas
+
+
+def insertar_en_ruta_ordenada(items_ordenados, nuevos, linea_puntos, inicio=None):
+    """
+    Añade paradas tardías a una zona ya ordenada sin cambiar el orden relativo
+    de las que ya estaban.
+
+    Args:
+        items_ordenados (list): Paradas publicadas [(coords, address, codigos), ...]
+        nuevos (list): Paradas nuevas geocodificadas con el mismo formato
+        linea_puntos (list): Línea de ruta de la zona
+        inicio (tuple): Punto de salida opcional (p. ej. el depósito)
+
+    Returns:
+        tuple: (paradas resultantes, metros añadidos en total)
+    """
+    ruta = RutaInsercion(items_ordenados, linea_puntos, inicio)
+    colocadas = ruta.insertar_varias(nuevos)
+    return ruta.items, sum(incremento for _, _, incremento in colocadas)
+
+
+def _proyeccion_local(coords):
+    """
+    Coordenadas (lat, lon) en metros sobre una proyección equirectangular
+    centrada en los puntos: a escala de ciudad difiere de haversine en menos
+    de un 0,1 % y evita la trigonometría al comparar distancias.
+    """
+    puntos = np.radians(np.asarray(coords, dtype=float).reshape(-1, 2)) * RADIO_TIERRA_M
+    x = puntos[:, 1] * np.cos(np.mean(puntos[:, 0]) / RADIO_TIERRA_M)
+    return np.column_stack((x, puntos[:, 0]))
+
+
+def vecinos_cercanos(coords, k, bloque=512):
+    """
+    Los k puntos más cercanos a cada punto, sin matriz n x n en memoria
+    (por bloques de filas, en metros sobre una proyección local).
+    
+    Args:
+        coords (list): Lista de coordenadas (lat, lon)
+        k (int): Vecinos por punto
+        bloque (int): Filas calculadas a la vez
+        
+    Returns:
+        np.ndarray: Índices (n x k) de los vecinos de cada punto, del más cercano al más lejano
+    """
+    x, y = _proyeccion_local(coords).T
+    n = len(x)
+    k = min(k, n - 1)
+    vecinos = np.empty((n, k), dtype=np.intp)
+    for desde in range(0, n, bloque):
+        filas = np.arange(desde, min(desde + bloque, n))
+        d2 = (x[filas, None] - x[None, :]) ** 2 + (y[filas, None] - y[None, :]) ** 2
+        d2[filas - desde, filas] = np.inf
+        cercanos = np.argpartition(d2, k - 1, axis=1)[:, :k]
+        orden = np.argsort(np.take_along_axis(d2, cercanos, axis=1), axis=1)
+        vecinos[filas] = np.take_along_axis(cercanos, orden, axis=1)
+    return vecinos
+
+
+class _RutaAbierta:
+    """
+    Ruta abierta como permutación de nodos: 0 = salida (o ficticio), 1..n =
+    paradas, n+1 = final ficticio. Los ficticios están a distancia 0 de todos.
+    Las distancias se calculan al evaluar cada movimiento (sin matriz), en metros
+    sobre la proyección local, entre posiciones de la ruta.
+    """
+    
+    def __init__(self, coords, inicio):
+        self.n = len(coords)
+        salida = inicio if inicio is not None else coords[0]
+        self._puntos = _proyeccion_local([salida] + list(coords) + [coords[-1]])
+        self._real = np.ones(self.n + 2, dtype=bool)
+        self._real[self.n + 1] = False
+        self._real[0] = inicio is not None
+        self.ruta = np.arange(self.n + 2)
+        self.posicion = np.arange(self.n + 2)
+        self._actualizar()
+    
+    def _actualizar(self):
+        # Coordenadas por posición: los movimientos se evalúan sin pasar por el nodo
+        self.x, self.y = self._puntos[self.ruta].T.copy()
+        self.real = self._real[self.ruta]
+        self.posicion[self.ruta] = np.arange(self.n + 2)
+        self.arista = self.distancia(np.arange(self.n + 1), np.arange(1, self.n + 2))
+    
+    def distancia(self, p, q):
+        """Distancia entre las paradas en las posiciones p y q (arrays de índices)."""
+        d = np.sqrt((self.x[p] - self.x[q]) ** 2 + (self.y[p] - self.y[q]) ** 2)
+        return np.where(self.real[p] & self.real[q], d, 0.0)
+    
+    def aplicar_2opt(self, i, j):
+        self.ruta[i:j + 1] = self.ruta[i:j + 1][::-1]
+        self._actualizar()
+    
+    def aplicar_or_opt(self, i, L, k, invertido):
+        tramo = self.ruta[i:i + L]
+        if invertido:
+            tramo = tramo[::-1]
+        resto = np.concatenate((self.ruta[:i], self.ruta[i + L:]))
+        destino = k + 1 if k < i else k + 1 - L
+        self.ruta = np.concatenate((resto[:destino], tramo, resto[destino:]))
+        self._actualizar()
+
+
+def _mejor_2opt(ruta, vecinos):
+    """
+    Mejor inversión de un tramo ruta[i..j] (1 <= i < j <= n) que crea un arco
+    entre una parada y uno de sus vecinos (o con los extremos): (ahorro, i, j).
+    """
+    n = ruta.n
+    P = np.arange(n + 2)[:, None]
+    # Posiciones candidatas: las de los vecinos de cada parada, y los dos extremos
+    Q = np.concatenate((ruta.posicion[vecinos[ruta.ruta]], np.broadcast_to([0, n + 1], (n + 2, 2))), axis=1)
+    a, b = np.minimum(P, Q), np.maximum(P, Q)
+    mejor = (np.inf, 0, 0)
+    # Arco nuevo entre las posiciones a y b: o bien invierte [a+1..b] o bien [a..b-1]
+    for i, j in ((a + 1, b), (a, b - 1)):
+        valido = (i >= 1) & (i < j) & (j <= n)
+        i, j = i[valido], j[valido]
+        if not len(i):
+            continue
+        delta = ruta.distancia(i - 1, j) + ruta.distancia(i, j + 1) - ruta.arista[i - 1] - ruta.arista[j]
+        indice = int(np.argmin(delta))
+        if delta[indice] < mejor[0]:
+            mejor = (float(delta[indice]), int(i[indice]), int(j[indice]))
+    return mejor
+
+
+def _mejor_or_opt(ruta, vecinos, max_tramo=3):
+    """
+    Mejor traslado de un tramo de 1 a max_tramo paradas, opcionalmente invertido,
+    junto a un vecino de uno de sus extremos (o a un extremo de la ruta):
+    (ahorro, i, L, k, invertido), insertando entre las posiciones k y k+1.
+    """
+    n = ruta.n
+    arista = ruta.arista
+    mejor = (np.inf, 0, 0, 0, False)
+    for L in range(1, min(max_tramo, n - 1) + 1):
+        I = np.arange(1, n - L + 2)
+        E = I + L - 1
+        # Quitar el tramo une (i-1) con (e+1)
+        ganancia = arista[I - 1] + arista[E] - ruta.distancia(I - 1, E + 1)
+        Q = np.concatenate((ruta.posicion[vecinos[ruta.ruta[I]]], ruta.posicion[vecinos[ruta.ruta[E]]]), axis=1)
+        K = np.concatenate((Q, Q - 1, np.broadcast_to([0, n], (len(I), 2))), axis=1)
+        # No se puede insertar en los arcos que se quitan ni dentro del tramo
+        valido = ((K < (I - 1)[:, None]) | (K > E[:, None])) & (K >= 0) & (K <= n)
+        fila, K = np.nonzero(valido)[0], K[valido]
+        if not len(K):
+            continue
+        I_, E_ = I[fila], E[fila]
+        for sentido, (primero, ultimo) in ((False, (I_, E_)), (True, (E_, I_))):
+            delta = (ruta.distancia(K, primero) + ruta.distancia(ultimo, K + 1)
+                     - arista[K] - ganancia[fila])
+            indice = int(np.argmin(delta))
+            if delta[indice] < mejor[0]:
+                mejor = (float(delta[indice]), int(I_[indice]), L, int(K[indice]), sentido)
+    return mejor
+
+
+def mejorar_ruta(items_ordenados, inicio=None, max_iteraciones=MEJORA_LOCAL_MAX_ITERACIONES,
+                 max_segundos=MEJORA_LOCAL_MAX_SEGUNDOS):
+    """
+    Búsqueda local (2-opt y Or-opt) sobre una ruta ya ordenada: en cada
+    iteración se aplica el movimiento que más acorta la ruta, hasta que ninguno
+    mejora o se agota el presupuesto.
+    
+    La ruta es abierta (sale de `inicio` y termina en la última parada), igual
+    que longitud_ruta: se modela con nodos ficticios a distancia 0 de todos al
+    final (y al principio si no hay punto de salida).
+    
+    Solo se evalúan movimientos que acercan una parada a uno de sus
+    MEJORA_LOCAL_VECINOS vecinos más cercanos: cada iteración cuesta O(n·k) en
+    tiempo y memoria. Las zonas de más de MEJORA_LOCAL_MAX_PARADAS paradas se
+    dejan como están.
+    
+    Args:
+        items_ordenados (list): Paradas en orden [(coords, address, codigos), ...]
+        inicio (tuple): Punto de salida fijo (p. ej. el depósito)
+        max_iteraciones (int): Movimientos como máximo
+        max_segundos (float): Tiempo máximo
+        
+    Returns:
+        tuple: (paradas reordenadas, {'antes_m', 'despues_m', 'movimientos'})
+    """
+    n = len(items_ordenados)
+    coords = [item[0] for item in items_ordenados]
+    antes = longitud_ruta(coords, inicio)
+    if n < 3 or n > MEJORA_LOCAL_MAX_PARADAS:
+        return list(items_ordenados), {'antes_m': antes, 'despues_m': antes, 'movimientos': 0}
+    
+    limite = time.perf_counter() + max_segundos
+    ruta = _RutaAbierta(coords, inicio)
+    # Vecinos por nodo (los ficticios solo se enlazan con los extremos, ya candidatos siempre)
+    vecinos = np.full((n + 2, min(MEJORA_LOCAL_VECINOS, n - 1)), n + 1, dtype=np.intp)
+    vecinos[1:n + 1] = vecinos_cercanos(coords, MEJORA_LOCAL_VECINOS) + 1
+    
+    movimientos = 0
+    while movimientos < max_iteraciones and time.perf_counter() < limite:
+        ahorro_2opt, i, j = _mejor_2opt(ruta, vecinos)
+        ahorro_or, o_i, o_l, o_k, o_inv = _mejor_or_opt(ruta, vecinos)
+        # Por debajo de un centímetro no compensa (evita ciclos por redondeo)
+        if min(ahorro_2opt, ahorro_or) > -0.01:
+            break
+        if ahorro_2opt <= ahorro_or:
+            ruta.aplicar_2opt(i, j)
+        else:
+            ruta.aplicar_or_opt(o_i, o_l, o_k, o_inv)
+        movimientos += 1
+    
+    mejorados = [items_ordenados[nodo - 1] for nodo in ruta.ruta[1:n + 1]]
+    despues = longitud_ruta([item[0] for item in mejorados], inicio)
+    return mejorados, {'antes_m': antes, 'despues_m': despues, 'movimientos': movimientos}
+
+
+def mejorar_zonas(zonas_ordenadas, inicio=None, zonas=None):
+    """
+    Aplica mejorar_ruta a cada zona e imprime cuánto se acorta cada una.
+    
+    Args:
+        zonas_ordenadas (dict): {zona: [(coords, address, codigos), ...]} ya ordenadas
+        inicio (tuple): Punto de salida (el depósito)
+        zonas (iterable): Zonas a mejorar; si es None, todas
+        
+    Returns:
+        tuple: (zonas mejoradas, {zona: {'antes_m', 'despues_m', 'movimientos'}})
+    """
+    mejoradas = dict(zonas_ordenadas)
+    informe = {}
+    for zona in (zonas_ordenadas if zonas is None else zonas):
+        items = zonas_ordenadas.get(zona) or []
+        if len(items) < 3:
+            continue
+        if len(items) > MEJORA_LOCAL_MAX_PARADAS:
+            print(f"  ⏭️ {zona}: {len(items)} paradas, sin búsqueda local (máximo {MEJORA_LOCAL_MAX_PARADAS})")
+        mejoradas[zona], informe[zona] = mejorar_ruta(items, inicio)
+        antes, despues = informe[zona]['antes_m'], informe[zona]['despues_m']
+        if despues < antes:
+            print(f"  ✂️ {zona}: {antes / 1000:.2f} km → {despues / 1000:.2f} km "
+                  f"(-{100 * (antes - despues) / antes:.1f} %, {informe[zona]['movimientos']} movimientos)")
+    return mejoradas, informe
+
+
+def procesar_zonas_con_linea(zonas_dict, lineas_por_zona=None, posiciones=None):
     """
     Procesa todas las zonas usando el algoritmo de distancia a línea.
     
@@ -185,6 +543,7 @@ def procesar_zonas_con_linea(zonas_dict, lineas_por_zona=None):
         zonas_dict (dict): Diccionario de zonas con direcciones
         lineas_por_zona (dict): Diccionario con líneas de ruta por zona
                                 Si es None, usa ZONE_ROUTE_LINES de config
+        posiciones (dict): {address: posición en la línea de su zona} ya calculadas
         
     Returns:
         dict: Diccionario con direcciones ordenadas por zona (tuplas completas)
@@ -209,7 +568,7 @@ def procesar_zonas_con_linea(zonas_dict, lineas_por_zona=None):
                 print(f"    ... y {len(direcciones) - 3} más")
             
             # Ordenar
-            resultado = ordenar_por_linea(direcciones, linea)
+            resultado = ordenar_por_linea(direcciones, linea, posiciones)
             zonas_ordenadas[zona_name] = resultado
             
             # Verificar resultado
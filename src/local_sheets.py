@@ -0,0 +1,213 @@
+"""
+Backend local (en memoria / CSV) para el gestor de hojas
+
+Implementa las mismas primitivas que SheetsManager sobre una cuadrícula en
+memoria, opcionalmente cargada desde un CSV y guardada de vuelta. Permite
+ejecutar, perfilar y hacer pruebas de carga del pipeline sin credenciales ni
+red. Cuenta las llamadas por primitiva y puede simular la latencia de la API.
+"""
+import csv
+import os
+import re
+import time
+
+from instrumentation import contar
+from sheets_manager import BaseSheetsManager, HOJA_DATOS
+
+_CELDA_RE = re.compile(r'^([A-Za-z]+)(\d*)$')
+
+
+def _indice_columna(letras):
+    """'A' -> 0, 'Z' -> 25, 'AA' -> 26"""
+    indice = 0
+    for letra in letras.upper():
+        indice = indice * 26 + (ord(letra) - ord('A') + 1)
+    return indice - 1
+
+
+def _parsear_rango(rango):
+    """
+    Parsea un rango A1 ('Hoja 1!a2:e501', 'g2', 'g2:g', 'q2').
+
+    Returns:
+        tuple: (hoja, fila_ini, col_ini, fila_fin, col_fin) con índices base 0;
+               fila_fin es None si el rango es abierto o una sola celda
+               (fila_fin == fila_ini para una sola celda)
+    """
+    hoja = HOJA_DATOS
+    if '!' in rango:
+        hoja, rango = rango.rsplit('!', 1)
+        hoja = hoja.strip("'")
+
+    inicio, _, fin = rango.partition(':')
+    m_ini = _CELDA_RE.match(inicio)
+    if not m_ini:
+        raise ValueError(f"Rango no válido: {rango}")
+
+    col_ini = _indice_columna(m_ini.group(1))
+    fila_ini = int(m_ini.group(2) or 1) - 1
+
+    if not fin:
+        return hoja, fila_ini, col_ini, fila_ini, col_ini
+
+    m_fin = _CELDA_RE.match(fin)
+    if not m_fin:
+        raise ValueError(f"Rango no válido: {rango}")
+
+    col_fin = _indice_columna(m_fin.group(1))
+    fila_fin = int(m_fin.group(2)) - 1 if m_fin.group(2) else None
+    return hoja, fila_ini, col_ini, fila_fin, col_fin
+
+
+class LocalSheetsManager(BaseSheetsManager):
+    """Gestor de hojas en memoria, con persistencia opcional en CSV"""
+
+    def __init__(self, csv_path=None, latencia_ms=0, num_filas=1000, guardar_al_escribir=True):
+        """
+        Args:
+            csv_path (str): CSV con el contenido de la hoja (fila 1 = cabecera).
+                            Si es None, la hoja empieza vacía y solo vive en memoria
+            latencia_ms (float): Latencia simulada por llamada (milisegundos)
+            num_filas (int): Número mínimo de filas de la cuadrícula
+            guardar_al_escribir (bool): Si True, guarda el CSV tras cada escritura
+        """
+        super().__init__()
+        self.csv_path = csv_path
+        self.latencia = latencia_ms / 1000
+        self.guardar_al_escribir = guardar_al_escribir
+        self.llamadas = {}
+        self.celdas = []  # Cuadrícula: lista de filas (listas de str)
+
+        self._mtime_csv = None
+        if csv_path and os.path.exists(csv_path):
+            self._cargar_csv()
+
+        self.num_filas = max(num_filas, len(self.celdas))
+
+    @classmethod
+    def desde_filas(cls, filas, cabecera=None, **kwargs):
+        """
+        Crea una hoja en memoria a partir de filas A-E (sin CSV).
+
+        Args:
+            filas (list): Filas de datos (listas de valores) a partir de la fila 2
+            cabecera (list): Fila 1 (opcional)
+        """
+        manager = cls(**kwargs)
+        manager.celdas = [list(cabecera or [])] + [[str(v) for v in fila] for fila in filas]
+        manager.num_filas = max(manager.num_filas, len(manager.celdas))
+        return manager
+
+    def _cargar_csv(self):
+        with open(self.csv_path, 'r', encoding='utf-8', newline='') as f:
+            self.celdas = [list(fila) for fila in csv.reader(f)]
+        self._mtime_csv = os.path.getmtime(self.csv_path)
+
+    def huella_entrada(self, hoja=HOJA_DATOS):
+        # Si otro proceso ha editado el CSV, recargarlo antes de comparar (modo servicio)
+        if self.csv_path and os.path.exists(self.csv_path) \
+                and os.path.getmtime(self.csv_path) != self._mtime_csv:
+            self._cargar_csv()
+            self.num_filas = max(self.num_filas, len(self.celdas))
+        return super().huella_entrada(hoja)
+
+    def _registrar_llamada(self, nombre):
+        self.llamadas[nombre] = self.llamadas.get(nombre, 0) + 1
+        contar('sheets.llamadas')
+        if self.latencia > 0:
+            time.sleep(self.latencia)
+
+    def _asegurar_tamano(self, filas, columnas):
+        while len(self.celdas) < filas:
+            self.celdas.append([])
+        for fila in self.celdas[:filas]:
+            if len(fila) < columnas:
+                fila.extend([''] * (columnas - len(fila)))
+        self.num_filas = max(self.num_filas, filas)
+
+    def _escribir(self, rango, datos):
+        _, fila_ini, col_ini, _, _ = _parsear_rango(rango)
+        if datos and not isinstance(datos[0], list):
+            datos = [[item] for item in datos]
+
+        ancho = max((len(fila) for fila in datos), default=0)
+        self._asegurar_tamano(fila_ini + len(datos), col_ini + ancho)
+        for i, valores in enumerate(datos):
+            for j, valor in enumerate(valores):
+                self.celdas[fila_ini + i][col_ini + j] = '' if valor is None else str(valor)
+        return {'updatedRange': rango, 'updatedRows': len(datos)}
+
+    def leer_rango_filas(self, rango):
+        self._registrar_llamada('leer_rango_filas')
+        _, fila_ini, col_ini, fila_fin, col_fin = _parsear_rango(rango)
+        if fila_fin is None:
+            fila_fin = len(self.celdas) - 1
+
+        filas = []
+        for fila in self.celdas[fila_ini:fila_fin + 1]:
+            valores = fila[col_ini:col_fin + 1]
+            # Como la API: sin celdas vacías al final de cada fila
+            while valores and valores[-1] == '':
+                valores.pop()
+            filas.append(valores)
+
+        # Como la API: sin filas vacías al final
+        while filas and not filas[-1]:
+            filas.pop()
+        return filas
+
+    def escribir_columna(self, rango, datos):
+        self._registrar_llamada('escribir_columna')
+        resultado = self._escribir(rango, datos)
+        self._guardar_si_procede()
+        return resultado
+
+    def escribir_rangos(self, datos_por_rango):
+        datos_por_rango = [(rango, datos) for rango, datos in datos_por_rango if datos]
+        if not datos_por_rango:
+            return None
+
+        self._registrar_llamada('escribir_rangos')
+        respuestas = [self._escribir(rango, datos) for rango, datos in datos_por_rango]
+        self._guardar_si_procede()
+        return {'responses': respuestas}
+
+    def limpiar_rangos(self, rangos):
+        if not rangos:
+            return None
+
+        self._registrar_llamada('limpiar_rangos')
+        for rango in rangos:
+            _, fila_ini, col_ini, fila_fin, col_fin = _parsear_rango(rango)
+            if fila_fin is None:
+                fila_fin = len(self.celdas) - 1
+            for fila in self.celdas[fila_ini:fila_fin + 1]:
+                for j in range(col_ini, min(col_fin + 1, len(fila))):
+                    fila[j] = ''
+        self._guardar_si_procede()
+        return {'clearedRanges': list(rangos)}
+
+    def obtener_num_filas(self, hoja=HOJA_DATOS):
+        self._registrar_llamada('obtener_num_filas')
+        return self.num_filas
+
+    def _guardar_si_procede(self):
+        if self.guardar_al_escribir and self.csv_path:
+            self.guardar()
+
+    def guardar(self, csv_path=None):
+        """Guarda la cuadrícula en CSV."""
+        csv_path = csv_path or self.csv_path
+        tmp_path = csv_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+            csv.writer(f).writerows(self.celdas)
+        os.replace(tmp_path, csv_path)
+        if csv_path == self.csv_path:
+            self._mtime_csv = os.path.getmtime(csv_path)
+
+    def resumen_llamadas(self):
+        """
+        Returns:
+            dict: Llamadas por primitiva y total
+        """
+        return {**self.llamadas, 'total': sum(self.llamadas.values())}
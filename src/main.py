@@ -5,34 +5,149 @@ Optimiza rutas usando distancia a línea de ruta predefinida.
 Limpieza de direcciones con modelo IA (T5 fine-tuned).
 """
 
+import argparse
 import sys
 from sheets_manager import crear_manager_sheets
-from address_model_cleaner import procesar_direcciones_con_modelo
-from geocoding import geocode_and_store_fast, get_cache_stats
-from zone_manager import separar_por_zonas, obtener_estadisticas_zonas
-from line_distance_solver import procesar_zonas_con_linea
+from address_model_cleaner import procesar_direcciones_con_modelo, aprender_correcciones
+from geocoding import geocode_and_store_fast, get_cache_stats, load_cache, get_from_cache
+from zone_manager import (separar_por_zonas, obtener_estadisticas_zonas, rebalancear_zonas, GeometriaCacheada,
+                          CACHE_GEOMETRIA_ACTIVA, REBALANCEO_ACTIVO)
+from line_distance_solver import longitud_ruta
+from incremental import procesar_rutas_incremental, construir_registros, guardar_estado
+from barcode_index import publicar_indice_codigos
+from results_store import resultados_reutilizables, registrar_ejecucion
+from route_memory import ordenar_zonas, registrar_rutas
+from instrumentation import etapa, iniciar_ejecucion, guardar_informe, imprimir_resumen
+from parallel_inference import cerrar_pool
+from multi_tenant import Inquilino
+from checkpoints import PuntosControl
+import cassette
 from config import GOOGLE_MAPS_API_KEY
 
 
-def procesar_rutas():
+def procesar_rutas(incremental=False, sheets_manager=None, inquilino=None, reanudar=False):
     """
     Función principal que procesa las rutas.
     Usa método Línea de Ruta + Limpieza IA.
+    
+    Args:
+        incremental (bool): Si True, solo reprocesa las filas que han cambiado
+                            desde la última ejecución (si hay estado guardado)
+        sheets_manager (BaseSheetsManager): Gestor ya conectado (p. ej. desde daemon.py).
+                                            Si es None, se crea uno nuevo
+        inquilino (Inquilino): Hoja, depósito, zonas, líneas y ficheros a usar
+                               (multi_tenant.py). Si es None, los de config
+        reanudar (bool): Si True, continúa la última ejecución que falló a medias
+                         cargando la salida de sus etapas completadas (checkpoints.py)
+    
+    Returns:
+        dict: Resumen de la ejecución completa ({'filas', 'puntos', 'no_encontradas',
+              'zonas', 'longitud_m', 'fuentes', 'mejora_local_m', 'rebalanceo'}) o None si no se completó o fue incremental
     """
+    try:
+        return _procesar_rutas(incremental, sheets_manager, inquilino, reanudar)
+    finally:
+        # Las réplicas del modelo se reutilizan entre páginas; se liberan al terminar
+        cerrar_pool()
+
+
+def _procesar_rutas(incremental, sheets_manager, inquilino, reanudar):
+    """Cuerpo de procesar_rutas (ver su docstring)."""
+    varios_inquilinos = inquilino is not None
+    if inquilino is None:
+        inquilino = Inquilino.desde_config()
+    
     print("\n" + "="*60)
-    print("  PROCESANDO RUTAS")
+    print("  PROCESANDO RUTAS" + (f" ({inquilino.nombre})" if varios_inquilinos else ""))
     print("  Método: LÍNEA DE RUTA + LIMPIEZA IA")
     print("="*60)
     
     # 1. Conexión con Google Sheets
     print("\n[1/7] Conectando con Google Sheets...")
-    sheets_manager = crear_manager_sheets()
-    print("  ✓ Conectado exitosamente")
+    with etapa('conexion'):
+        if sheets_manager is None:
+            sheets_manager = inquilino.crear_manager_sheets() if varios_inquilinos else crear_manager_sheets()
+    tiempos = getattr(sheets_manager, 'tiempos_conexion', None)
+    if tiempos:
+        print(f"  ✓ Conectado exitosamente (credenciales {tiempos['credenciales']*1000:.0f} ms, "
+              f"cliente {tiempos['cliente']*1000:.0f} ms)")
+    else:
+        print("  ✓ Conectado exitosamente")
+    
+    if incremental and varios_inquilinos:
+        # El modo incremental usa las zonas y ficheros de config
+        print("  ⚠️ Modo incremental no disponible por inquilino: procesando completo")
+    elif incremental:
+        with etapa('incremental'):
+            if procesar_rutas_incremental(sheets_manager):
+                return
+    
+    # Cada etapa guarda su salida; con reanudar, las ya completadas se cargan
+    puntos_control = PuntosControl(inquilino.checkpoints_dir, reanudar=reanudar)
     
-    # 2. Leer datos del spreadsheet (columna A: códigos, columna D: filtro, columna E: direcciones)
-    print("\n[2/7] Leyendo códigos de barras (A) y direcciones (E)...")
-    direcciones_raw, codigos_barras, filas_eliminadas = sheets_manager.leer_direcciones_completas()
-    print(f"  ✓ {len(direcciones_raw)} direcciones leídas")
+    # 2-3. Leer datos del spreadsheet por páginas (columna A: códigos, columna D: filtro,
+    # columna E: direcciones) y limpiar cada página con el modelo IA mientras llega la siguiente
+    print("\n[2/7] Leyendo códigos de barras (A) y direcciones (E) por páginas...")
+    print("[3/7] Limpiando direcciones con modelo IA a medida que llegan...")
+    direcciones_raw = []
+    codigos_barras = []
+    filas_eliminadas = []
+    direcciones_completas = []
+    fuentes_limpieza = []
+    coordenadas_conocidas = {}
+    
+    if puntos_control.completada('lectura_limpieza'):
+        # Las filas leídas y limpiadas en la ejecución que falló (no se vuelve a leer la hoja)
+        leidas = puntos_control.cargar('lectura_limpieza')
+        direcciones_raw = leidas['direcciones_raw']
+        codigos_barras = leidas['codigos_barras']
+        filas_eliminadas = leidas['filas_eliminadas']
+        direcciones_completas = leidas['direcciones_completas']
+        fuentes_limpieza = leidas['fuentes_limpieza']
+        coordenadas_conocidas = leidas['coordenadas_conocidas']
+        sheets_manager.huellas = leidas['huellas']
+        sheets_manager.ultima_fila = leidas['ultima_fila']
+        print("  ⏭️ Lectura y limpieza cargadas del punto de control")
+    else:
+        with etapa('lectura_limpieza'):
+            paginas = sheets_manager.iterar_direcciones_por_paginas()
+            for num_pagina, (dirs_pagina, codigos_pagina, eliminadas_pagina) in enumerate(paginas, 1):
+                print(f"\n  📄 Página {num_pagina}: {len(dirs_pagina)} direcciones")
+                direcciones_raw.extend(dirs_pagina)
+                codigos_barras.extend(codigos_pagina)
+                filas_eliminadas.extend(eliminadas_pagina)
+                
+                # Filas con el mismo código y dirección que en ejecuciones anteriores: reutilizar
+                with etapa('almacen'):
+                    resueltas_pagina, coords_pagina = resultados_reutilizables(
+                        codigos_pagina, dirs_pagina, inquilino.results_db_file
+                    )
+                coordenadas_conocidas.update(coords_pagina)
+                
+                with etapa('limpieza'):
+                    limpias_pagina, fuentes_pagina = procesar_direcciones_con_modelo(
+                        dirs_pagina,
+                        mostrar_comparativa=True,  # Mostrar antes/después
+                        devolver_fuentes=True,
+                        # Con varios inquilinos el cache de sesión es común a todos
+                        reiniciar_cache=(num_pagina == 1 and not varios_inquilinos),
+                        resueltas=resueltas_pagina
+                    )
+                direcciones_completas.extend(limpias_pagina)
+                fuentes_limpieza.extend(fuentes_pagina)
+        
+        puntos_control.guardar('lectura_limpieza', {
+            'direcciones_raw': direcciones_raw,
+            'codigos_barras': codigos_barras,
+            'filas_eliminadas': filas_eliminadas,
+            'direcciones_completas': direcciones_completas,
+            'fuentes_limpieza': fuentes_limpieza,
+            'coordenadas_conocidas': coordenadas_conocidas,
+            'huellas': sheets_manager.huellas,
+            'ultima_fila': sheets_manager.ultima_fila
+        })
+    
+    print(f"\n  ✓ {len(direcciones_raw)} direcciones leídas (hasta la fila {sheets_manager.ultima_fila})")
     print(f"  ✓ {len(codigos_barras)} códigos de barras leídos")
     
     # Mostrar filas eliminadas por Q-PRINTING
@@ -41,13 +156,6 @@ def procesar_rutas():
         for fila_num, codigo, texto_d in filas_eliminadas:
             print(f"     Fila {fila_num}: Código={codigo}, Columna D='{texto_d}'")
     
-    # 3. Limpiar direcciones con modelo IA
-    print("\n[3/7] Limpiando direcciones con modelo IA...")
-    
-    direcciones_completas = procesar_direcciones_con_modelo(
-        direcciones_raw, 
-        mostrar_comparativa=True  # Mostrar antes/después
-    )
     print(f"  ✓ {len(direcciones_completas)} direcciones procesadas")
     
     # 4. Geocodificar direcciones
@@ -60,12 +168,21 @@ def procesar_rutas():
     
     # Usar geocodificación rápida (con caché y paralelo)
     # Retorna 2 valores: direcciones únicas y no encontradas
-    geocoded_addresses, not_found_addresses = geocode_and_store_fast(
-        direcciones_completas,
-        GOOGLE_MAPS_API_KEY,
-        max_workers=10,  # 10 hilos en paralelo
-        codigos_barras=codigos_barras  # Pasar códigos de barras
-    )
+    # (si falló a mitad, lo ya geocodificado está en el caché: solo se piden las que faltan)
+    if puntos_control.completada('geocodificacion'):
+        geocodificadas = puntos_control.cargar('geocodificacion')
+        geocoded_addresses, not_found_addresses = geocodificadas['geocoded'], geocodificadas['not_found']
+        print("  ⏭️ Geocodificación cargada del punto de control")
+    else:
+        with etapa('geocodificacion'):
+            geocoded_addresses, not_found_addresses = geocode_and_store_fast(
+                direcciones_completas,
+                GOOGLE_MAPS_API_KEY,
+                max_workers=10,  # 10 hilos en paralelo
+                codigos_barras=codigos_barras,  # Pasar códigos de barras
+                coordenadas_conocidas=coordenadas_conocidas
+            )
+        puntos_control.guardar('geocodificacion', {'geocoded': geocoded_addresses, 'not_found': not_found_addresses})
     
     print(f"  ✓ {len(geocoded_addresses)} puntos únicos de entrega geocodificados")
     
@@ -74,11 +191,39 @@ def procesar_rutas():
     
     if not geocoded_addresses:
         print("\n❌ ERROR: No se pudieron geocodificar direcciones. Abortando proceso.")
-        return
+        return None
     
     # 5. Separar por zonas
     print("\n[5/7] Separando direcciones por zonas...")
-    zonas_dict = separar_por_zonas(geocoded_addresses)
+    # Zona y posición en la línea de las direcciones repetidas salen del caché de geocodificación
+    geometria = GeometriaCacheada(inquilino.zonas, inquilino.lineas, inquilino.zonas_resultados,
+                                  inquilino.indice_zonas()) if CACHE_GEOMETRIA_ACTIVA else None
+    zonas_completada = puntos_control.completada('zonas')
+    rebalanceo = []
+    if zonas_completada:
+        zonas_dict = puntos_control.cargar('zonas')
+        if geometria is not None:
+            geometria.zonas_y_posiciones([item for items in zonas_dict.values() for item in items])
+        print("  ⏭️ Zonas cargadas del punto de control")
+    else:
+        with etapa('zonas'):
+            if geometria is not None:
+                zonas_dict = geometria.separar_por_zonas(geocoded_addresses)
+            else:
+                zonas_dict = separar_por_zonas(geocoded_addresses, inquilino.indice_zonas(), inquilino.zonas_resultados)
+        if REBALANCEO_ACTIVO:
+            # Paradas cerca de la línea de una zona vecina menos cargada pasan a ella
+            with etapa('rebalanceo'):
+                zonas_dict, rebalanceo = rebalancear_zonas(zonas_dict, inquilino.lineas)
+            if rebalanceo:
+                print(f"  ⚖️ {len(rebalanceo)} paradas fronterizas cambiadas de zona para equilibrar la carga")
+    if geometria is not None:
+        # Las paradas cambiadas de zona se ordenan por la línea de su nueva zona
+        geometria.ajustar_a_zonas(zonas_dict)
+        geometria.guardar()
+        if geometria.reutilizadas:
+            print(f"  ♻️ Zona y posición de {geometria.reutilizadas} direcciones sacadas del caché "
+                  f"({geometria.calculadas} calculadas)")
     # zonas_dict = agregar_punto_inicio(zonas_dict)  # Comentado: el depósito no es punto de visita
     
     # Mostrar estadísticas
@@ -89,9 +234,35 @@ def procesar_rutas():
             print(f"     - {zona}: {count} direcciones")
     print(f"     TOTAL: {stats['total']} direcciones")
     
+    # Salidas del modelo geocodificadas dentro de una zona pasan al lookup
+    if 'modelo' in fuentes_limpieza and not zonas_completada:
+        cache = load_cache()
+        coords_por_direccion = {}
+        for direccion in set(direcciones_completas):
+            coords = get_from_cache(direccion, cache)
+            if coords:
+                coords_por_direccion[direccion] = coords
+        with etapa('aprender_correcciones'):
+            nuevas = aprender_correcciones(direcciones_raw, direcciones_completas, fuentes_limpieza, coords_por_direccion)
+        if nuevas:
+            print(f"  🧠 {nuevas} correcciones del modelo aprendidas para el lookup")
+    if not zonas_completada:
+        puntos_control.guardar('zonas', zonas_dict)
+    
     # 6. Optimizar rutas con método línea
     print("\n[6/7] Optimizando rutas con método LÍNEA...")
-    zonas_ordenadas = procesar_zonas_con_linea(zonas_dict)
+    mejora_local = {}
+    if puntos_control.completada('ordenacion'):
+        zonas_ordenadas = puntos_control.cargar('ordenacion')
+        print("  ⏭️ Rutas cargadas del punto de control")
+    else:
+        with etapa('ordenacion'):
+            # Memoria de rutas o línea, y búsqueda local (igual que el modo fichero)
+            zonas_ordenadas, _, mejora_local = ordenar_zonas(
+                zonas_dict, inquilino.lineas, inquilino.depot, inquilino.results_db_file,
+                geometria.posiciones if geometria is not None else None
+            )
+        puntos_control.guardar('ordenacion', zonas_ordenadas)
     print("  ✓ Rutas optimizadas correctamente")
     
     # Contar totales
@@ -100,9 +271,44 @@ def procesar_rutas():
     
     # 7. Escribir resultados en Google Sheets
     print("\n[7/7] Escribiendo resultados en Google Sheets...")
-    sheets_manager.limpiar_columnas_resultados()
-    sheets_manager.escribir_resultados_por_zona(zonas_ordenadas, excluir_inicio_fin=False)
-    sheets_manager.escribir_no_encontradas(not_found_addresses)
+    # Cada escritura se marca al terminar: al reanudar solo se repiten las que faltan
+    with etapa('escritura'):
+        if not puntos_control.completada('escritura.sheets'):
+            with etapa('sheets'):
+                sheets_manager.escribir_fase_resultados(zonas_ordenadas, not_found_addresses,
+                                                        columnas_destino=inquilino.columnas,
+                                                        excluir_inicio_fin=False,
+                                                        columnas_limpiar=inquilino.columnas_limpiar())
+            puntos_control.guardar('escritura.sheets')
+        
+        if not puntos_control.completada('escritura.indice'):
+            publicar_indice_codigos(zonas_ordenadas, inquilino.indice_codigos_file, excluir_inicio_fin=False)
+            puntos_control.guardar('escritura.indice')
+        
+        # Guardar estado por fila para futuras ejecuciones con --incremental
+        if not puntos_control.completada('escritura.estado'):
+            guardar_estado(
+                construir_registros(sheets_manager.huellas, direcciones_raw, codigos_barras,
+                                    direcciones_completas, zonas_ordenadas),
+                zonas_ordenadas,
+                inquilino.estado_file
+            )
+            puntos_control.guardar('escritura.estado')
+        
+        # Guardar coordenadas, zona, posición y fuente por código de barras
+        if not puntos_control.completada('escritura.almacen'):
+            guardados = registrar_ejecucion(zonas_ordenadas, codigos_barras, direcciones_raw,
+                                            direcciones_completas, fuentes_limpieza,
+                                            inquilino.lineas, inquilino.results_db_file,
+                                            geometria.posiciones if geometria is not None else None)
+            puntos_control.guardar('escritura.almacen')
+            print(f"  💾 {guardados} paquetes guardados en el almacén de resultados")
+        
+        # Ruta publicada en la memoria de rutas (las ediciones del tablero la sustituyen)
+        registrar_rutas({zona: [item[1] for item in items] for zona, items in zonas_ordenadas.items()},
+                        db_file=inquilino.results_db_file)
+    
+    puntos_control.finalizar()
     
     print("\n" + "="*60)
     print("  ✅ PROCESO COMPLETADO EXITOSAMENTE")
@@ -114,10 +320,54 @@ def procesar_rutas():
     print("  - Columna L-M: Zona Mirasol (direcciones + códigos)")
     print("  - Columna O-P: Fuera de polígonos (direcciones + códigos)")
     print("  - Columna Q: No encontradas")
+    
+    return {
+        'filas': len(direcciones_raw),
+        'puntos': total_ordenadas,
+        'no_encontradas': len(not_found_addresses),
+        'zonas': {zona: len(items) for zona, items in zonas_ordenadas.items()},
+        'longitud_m': {
+            zona: round(longitud_ruta([item[0] for item in items], inquilino.depot), 1)
+            for zona, items in zonas_ordenadas.items()
+        },
+        'fuentes': {fuente: fuentes_limpieza.count(fuente) for fuente in sorted(set(fuentes_limpieza))},
+        'mejora_local_m': {zona: round(m['antes_m'] - m['despues_m'], 1) for zona, m in mejora_local.items()},
+        'rebalanceo': rebalanceo
+    }
 
 
 def main():
     """Función principal del programa."""
+    parser = argparse.ArgumentParser(description="BikeLogic - procesamiento de rutas")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Reprocesar solo las filas añadidas, modificadas o eliminadas")
+    parser.add_argument('--entrada', help="Procesar un fichero CSV/Parquet en lugar de Google Sheets")
+    parser.add_argument('--salida', help="Fichero CSV/Parquet de salida (con --entrada)")
+    parser.add_argument('--tam-bloque', type=int, default=5000,
+                        help="Filas por bloque de lectura (con --entrada)")
+    parser.add_argument('--perfil', action='append', metavar='ETAPA',
+                        help="Perfilar una etapa (p. ej. geocodificacion, limpieza; '*' = todas). Repetible")
+    parser.add_argument('--perfil-modo', choices=['cprofile', 'tracemalloc'], default=None,
+                        help="Tipo de perfil de las etapas indicadas con --perfil (por defecto PERFIL_MODO de config)")
+    parser.add_argument('--reanudar', '--resume', action='store_true',
+                        help="Continuar la última ejecución que falló sin repetir las etapas completadas")
+    parser.add_argument('--grabar', nargs='?', const=True, metavar='FICHERO',
+                        help="Grabar las llamadas a Sheets y Google Maps en un cassette "
+                             "(por defecto CASSETTES_DIR/<fecha>_<hora>.jsonl.gz)")
+    parser.add_argument('--reproducir', metavar='FICHERO',
+                        help="Repetir offline una ejecución grabada con --grabar")
+    parser.add_argument('--latencia', choices=['original', 'cero'], default='original',
+                        help="Latencia de las respuestas reproducidas (con --reproducir)")
+    args = parser.parse_args()
+    if args.entrada and not args.salida:
+        parser.error("--entrada requiere --salida")
+    if args.grabar and args.reproducir:
+        parser.error("--grabar y --reproducir son incompatibles")
+    if args.reanudar and (args.incremental or args.entrada or args.grabar or args.reproducir):
+        parser.error("--reanudar solo funciona con la ejecución completa sobre Google Sheets")
+    if (args.grabar or args.reproducir) and (args.incremental or args.entrada):
+        parser.error("--grabar/--reproducir solo funcionan con la ejecución completa sobre Google Sheets")
+    
     print("\n")
     print("╔" + "═"*58 + "╗")
     print("║" + " "*58 + "║")
@@ -126,11 +376,41 @@ def main():
     print("║" + " "*58 + "║")
     print("╚" + "═"*58 + "╝")
     
+    iniciar_ejecucion('fichero' if args.entrada else 'incremental' if args.incremental else 'completa',
+                      perfil_etapas=args.perfil, perfil_modo=args.perfil_modo)
     try:
-        procesar_rutas()
+        if args.entrada:
+            from file_pipeline import procesar_rutas_desde_fichero
+            procesar_rutas_desde_fichero(args.entrada, args.salida, tam_bloque=args.tam_bloque)
+        elif args.reproducir:
+            grabado = cassette.activar(args.reproducir, 'reproducir', args.latencia)
+            procesar_rutas(inquilino=cassette.preparar_reproduccion(grabado))
+        elif args.grabar:
+            path = cassette.nombre_grabacion() if args.grabar is True else args.grabar
+            grabacion = cassette.activar(path, 'grabar')
+            cassette.grabar_estado_local(grabacion)
+            print(f"  📼 Grabando llamadas externas en {path}")
+            procesar_rutas()
+        else:
+            procesar_rutas(incremental=args.incremental, reanudar=args.reanudar)
     except Exception as e:
         print(f"\n❌ ERROR: {str(e)}")
         print("Por favor revisa la configuración y vuelve a intentar.")
+        if not args.entrada and not args.incremental:
+            print("Para continuar sin repetir las etapas ya completadas: python main.py --reanudar")
+    finally:
+        cerrar_pool()
+        resumen_cassette = cassette.desactivar()
+        if resumen_cassette:
+            print(f"  📼 Cassette ({resumen_cassette['modo']}): {resumen_cassette['sheets']} peticiones a Sheets, "
+                  f"{resumen_cassette['geocoding']} geocodificaciones")
+            if resumen_cassette['modo'] == 'reproducir':
+                print(f"     Escrituras iguales a las grabadas: {resumen_cassette['escrituras_iguales']}, "
+                      f"distintas: {resumen_cassette['escrituras_distintas']}, "
+                      f"sin respuesta grabada: {resumen_cassette['sin_respuesta']}")
+        imprimir_resumen()
+        extra = {'cassette': resumen_cassette} if resumen_cassette else None
+        print(f"  📈 Informe de la ejecución: {guardar_informe(extra=extra)}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,242 @@
+"""
+Servidor local del modelo IA de limpieza de direcciones
+
+Mantiene el tokenizer y el modelo T5 cargados en memoria entre ejecuciones
+de main.py. Atiende peticiones HTTP en localhost y agrupa (micro-batch) las
+peticiones que llegan casi a la vez para ejecutarlas en un solo generate().
+
+Uso:
+    cd src
+    python model_server.py
+
+Mientras esté activo, procesar_direcciones_con_modelo lo usa automáticamente;
+si no está activo, el modelo se carga en el propio proceso como siempre.
+"""
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+import config
+
+MODEL_SERVER_HOST = getattr(config, 'MODEL_SERVER_HOST', '127.0.0.1')
+MODEL_SERVER_PORT = getattr(config, 'MODEL_SERVER_PORT', 8765)
+MICROBATCH_WAIT_MS = getattr(config, 'MODEL_SERVER_MICROBATCH_WAIT_MS', 20)
+MICROBATCH_MAX_SIZE = getattr(config, 'MODEL_SERVER_MICROBATCH_MAX_SIZE', 64)
+
+
+def _url_servidor(host=MODEL_SERVER_HOST, port=MODEL_SERVER_PORT):
+    return f"http://{host}:{port}"
+
+
+def servidor_activo(host=MODEL_SERVER_HOST, port=MODEL_SERVER_PORT, timeout=0.5):
+    """
+    Comprueba si el servidor de modelo está en marcha.
+
+    Returns:
+        bool: True si responde al endpoint de salud
+    """
+    try:
+        response = requests.get(f"{_url_servidor(host, port)}/salud", timeout=timeout)
+        return response.status_code == 200
+    except requests.RequestException:
+        return False
+
+
+def normalizar_con_servidor(direcciones, host=MODEL_SERVER_HOST, port=MODEL_SERVER_PORT, timeout=120):
+    """
+    Envía un lote de direcciones al servidor de modelo.
+
+    Args:
+        direcciones (list): Direcciones sin procesar
+        host (str): Host del servidor
+        port (int): Puerto del servidor
+        timeout (float): Tiempo máximo de espera de la respuesta (segundos)
+
+    Returns:
+        list: Direcciones procesadas en el mismo orden, o None si el servidor
+              no está disponible (el llamador debe usar el modelo local)
+    """
+    try:
+        response = requests.post(
+            f"{_url_servidor(host, port)}/normalizar",
+            json={'direcciones': list(direcciones)},
+            timeout=(0.5, timeout)
+        )
+    except requests.RequestException:
+        return None
+
+    if response.status_code != 200:
+        print(f"  ⚠️ Servidor de modelo respondió HTTP {response.status_code}, usando modelo local")
+        return None
+
+    resultados = response.json().get('resultados')
+    if not isinstance(resultados, list) or len(resultados) != len(direcciones):
+        print(f"  ⚠️ Respuesta inválida del servidor de modelo, usando modelo local")
+        return None
+
+    return resultados
+
+
+class _PeticionPendiente:
+    """Petición en cola a la espera de que el hilo de inferencia la resuelva"""
+
+    def __init__(self, direcciones):
+        self.direcciones = direcciones
+        self.resultados = None
+        self.error = None
+        self.listo = threading.Event()
+
+
+class MicroBatcher:
+    """
+    Agrupa peticiones concurrentes en lotes para el modelo.
+
+    Un único hilo consume la cola: toma la primera petición y espera hasta
+    `espera_ms` milisegundos a que lleguen más, sin pasar de `max_lote`
+    direcciones. Después ejecuta el lote y reparte los resultados.
+    """
+
+    def __init__(self, inferir, espera_ms=MICROBATCH_WAIT_MS, max_lote=MICROBATCH_MAX_SIZE):
+        """
+        Args:
+            inferir (callable): Función list[str] -> list[str] que ejecuta el modelo
+            espera_ms (int): Ventana de agrupación en milisegundos
+            max_lote (int): Máximo de direcciones por llamada al modelo
+        """
+        self.inferir = inferir
+        self.espera = espera_ms / 1000
+        self.max_lote = max_lote
+        self.cola = queue.Queue()
+        self.stats = {'peticiones': 0, 'lotes': 0, 'direcciones': 0}
+        self._hilo = threading.Thread(target=self._bucle, daemon=True)
+        self._hilo.start()
+
+    def procesar(self, direcciones):
+        """Encola direcciones y bloquea hasta tener el resultado."""
+        peticion = _PeticionPendiente(direcciones)
+        self.cola.put(peticion)
+        peticion.listo.wait()
+        if peticion.error is not None:
+            raise peticion.error
+        return peticion.resultados
+
+    def _bucle(self):
+        while True:
+            pendientes = [self.cola.get()]
+            total = len(pendientes[0].direcciones)
+            limite = time.monotonic() + self.espera
+
+            # Recoger las peticiones que lleguen dentro de la ventana
+            while total < self.max_lote:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    peticion = self.cola.get(timeout=restante)
+                except queue.Empty:
+                    break
+                pendientes.append(peticion)
+                total += len(peticion.direcciones)
+
+            self._ejecutar(pendientes)
+
+    def _ejecutar(self, pendientes):
+        direcciones = [d for p in pendientes for d in p.direcciones]
+        try:
+            resultados = []
+            for inicio in range(0, len(direcciones), self.max_lote):
+                resultados.extend(self.inferir(direcciones[inicio:inicio + self.max_lote]))
+                self.stats['lotes'] += 1
+        except Exception as e:
+            for peticion in pendientes:
+                peticion.error = e
+                peticion.listo.set()
+            return
+
+        self.stats['peticiones'] += len(pendientes)
+        self.stats['direcciones'] += len(direcciones)
+
+        # Repartir resultados en el orden de cada petición
+        inicio = 0
+        for peticion in pendientes:
+            fin = inicio + len(peticion.direcciones)
+            peticion.resultados = resultados[inicio:fin]
+            inicio = fin
+            peticion.listo.set()
+
+
+def _crear_handler(batcher):
+    class ModelRequestHandler(BaseHTTPRequestHandler):
+        def _responder(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/salud':
+                self._responder(200, {'ok': True, 'stats': batcher.stats})
+            else:
+                self._responder(404, {'ok': False, 'message': 'Ruta no encontrada'})
+
+        def do_POST(self):
+            if self.path != '/normalizar':
+                self._responder(404, {'ok': False, 'message': 'Ruta no encontrada'})
+                return
+
+            try:
+                longitud = int(self.headers.get('Content-Length', 0))
+                data = json.loads(self.rfile.read(longitud) or b'{}')
+                direcciones = [str(d) for d in data.get('direcciones', [])]
+            except (ValueError, AttributeError) as e:
+                self._responder(400, {'ok': False, 'message': f'Petición inválida: {e}'})
+                return
+
+            try:
+                resultados = batcher.procesar(direcciones) if direcciones else []
+            except Exception as e:
+                self._responder(500, {'ok': False, 'message': str(e)})
+                return
+
+            self._responder(200, {'ok': True, 'resultados': resultados})
+
+        def log_message(self, format, *args):
+            # Silenciar el log por petición de http.server
+            pass
+
+    return ModelRequestHandler
+
+
+def iniciar_servidor(host=MODEL_SERVER_HOST, port=MODEL_SERVER_PORT):
+    """
+    Carga el modelo y atiende peticiones hasta que se interrumpa el proceso.
+
+    Args:
+        host (str): Interfaz donde escuchar (por defecto solo localhost)
+        port (int): Puerto TCP
+    """
+    from address_model_cleaner import _cargar_modelo, _inferir_batch
+
+    _cargar_modelo()
+    batcher = MicroBatcher(_inferir_batch)
+    server = ThreadingHTTPServer((host, port), _crear_handler(batcher))
+
+    print(f"  🟢 Servidor de modelo escuchando en {_url_servidor(host, port)}")
+    print(f"     Micro-batch: espera {MICROBATCH_WAIT_MS} ms, máximo {MICROBATCH_MAX_SIZE} direcciones")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n  ⏹ Servidor de modelo detenido")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    iniciar_servidor()
@@ -0,0 +1,276 @@
+"""
+Procesamiento de varias poblaciones (inquilinos) en un solo proceso
+
+Cada inquilino tiene su spreadsheet, su depósito, sus polígonos de zonas y sus
+líneas de ruta. Se procesan a la vez en hilos y comparten lo que es caro de
+cargar: el caché de geocodificación (un solo diccionario en memoria y un solo
+archivo), el lookup y el modelo IA (una sola instancia) y un limitador de
+peticiones a la API de Google Maps común a todos. Lo que es de cada inquilino
+va a ficheros propios: estado incremental, índice de códigos y almacén de
+resultados.
+
+Configuración en config.py (o la misma lista en un JSON con --inquilinos):
+
+    TENANTS = [
+        {
+            'nombre': 'santcugat',
+            'spreadsheet_id': '...',
+            'depot': (41.47855, 2.07228),
+            'zonas': {'Indust': [(lat, lon), ...], 'Centre': [...], 'Mirasol': [...]},
+            'lineas': {'Indust': [(lat, lon), ...], 'Centre': [...], 'Mirasol': [...]},
+        },
+        ...
+    ]
+
+Claves opcionales: 'key_file', 'backend' y 'hoja_local' (por defecto KEY_FILE,
+SHEETS_BACKEND y LOCAL_SHEET_CSV), 'columnas' ({zona: (celda direcciones,
+celda códigos)}, por defecto las de Sant Cugat; las zonas sin columna van a
+'sin_zona'), 'estado_file', 'indice_codigos_file', 'results_db_file' y 'checkpoints_dir'.
+
+Uso:
+    cd src
+    python multi_tenant.py [--inquilinos inquilinos.json] [--solo santcugat] [--paralelo 2] [--reanudar]
+"""
+import argparse
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from barcode_index import BARCODE_INDEX_FILE
+from checkpoints import CHECKPOINTS_DIR
+from incremental import ESTADO_FILE
+from instrumentation import etapa, iniciar_ejecucion, instrumentacion_actual, guardar_informe, imprimir_resumen
+from results_store import RESULTS_DB_FILE
+from sheets_manager import crear_manager_sheets, columna_completa, COLUMNAS_RESULTADOS
+from zone_manager import construir_indice_zonas, cargar_indice_zonas
+from config import KEY_FILE, SPREADSHEET_ID, DEPOT_COORDS, ZONE_POLYGONS, ZONE_ROUTE_LINES
+
+TENANTS = getattr(config, 'TENANTS', [])
+TENANTS_PARALELO = getattr(config, 'TENANTS_PARALELO', 4)
+TENANTS_GEOCODING_MAX_QPS = getattr(config, 'TENANTS_GEOCODING_MAX_QPS', 40)
+
+
+def _puntos(coordenadas):
+    """Coordenadas como tuplas (en JSON llegan como listas)."""
+    return [tuple(punto) for punto in coordenadas]
+
+
+class Inquilino:
+    """Una población: su hoja, su depósito, sus zonas y líneas y sus ficheros"""
+
+    def __init__(self, nombre, spreadsheet_id=SPREADSHEET_ID, depot=DEPOT_COORDS, zonas=None, lineas=None,
+                 key_file=KEY_FILE, backend=None, hoja_local=None, columnas=None,
+                 estado_file=None, indice_codigos_file=None, results_db_file=None, checkpoints_dir=None):
+        """
+        Args:
+            nombre (str): Identificador del inquilino (aparece en ficheros e informes)
+            spreadsheet_id (str): ID de su Google Sheets
+            depot (tuple): Coordenadas (lat, lon) de su depósito
+            zonas (dict): {zona: polígono}; si es None, ZONE_POLYGONS
+            lineas (dict): {zona: línea de ruta}; si es None, ZONE_ROUTE_LINES
+            key_file (str): Credenciales de Google
+            backend (str): 'google' o 'local'; si es None, SHEETS_BACKEND
+            hoja_local (str): CSV de la hoja (solo backend 'local')
+            columnas (dict): {zona: (celda direcciones, celda códigos)}; si es None,
+                             COLUMNAS_RESULTADOS
+            estado_file, indice_codigos_file, results_db_file (str): Ficheros propios;
+                             por defecto llevan el nombre del inquilino
+            checkpoints_dir (str): Puntos de control de su ejecución en curso;
+                             por defecto CHECKPOINTS_DIR/<nombre>
+        """
+        self.nombre = nombre
+        self.spreadsheet_id = spreadsheet_id
+        self.depot = tuple(depot)
+        self.zonas = ZONE_POLYGONS if zonas is None else {z: _puntos(p) for z, p in zonas.items()}
+        self.lineas = ZONE_ROUTE_LINES if lineas is None else {z: _puntos(p) for z, p in lineas.items()}
+        self.key_file = key_file
+        self.backend = backend
+        self.hoja_local = hoja_local
+        self.columnas = COLUMNAS_RESULTADOS if columnas is None else {z: tuple(c) for z, c in columnas.items()}
+        self.zonas_resultados = tuple(z for z in self.columnas if z != 'sin_zona')
+
+        base, extension = os.path.splitext(BARCODE_INDEX_FILE)
+        self.estado_file = estado_file or f"estado_{nombre}.json"
+        self.indice_codigos_file = indice_codigos_file or f"{base}_{nombre}{extension}"
+        self.results_db_file = results_db_file or f"resultados_{nombre}.db"
+        self.checkpoints_dir = checkpoints_dir or os.path.join(CHECKPOINTS_DIR, nombre)
+        self._indice = None
+
+    @classmethod
+    def desde_config(cls):
+        """Inquilino único de config.py con los ficheros de siempre."""
+        return cls('principal', estado_file=ESTADO_FILE, indice_codigos_file=BARCODE_INDEX_FILE,
+                   results_db_file=RESULTS_DB_FILE)
+
+    @classmethod
+    def desde_dict(cls, datos):
+        """Crea un inquilino desde una entrada de TENANTS (o del JSON de --inquilinos)."""
+        datos = dict(datos)
+        if 'nombre' not in datos:
+            raise ValueError(f"Inquilino sin 'nombre': {datos}")
+        return cls(**datos)
+
+    def indice_zonas(self):
+        """Polígonos preparados de sus zonas (se construyen una vez)."""
+        if self._indice is None:
+            if self.zonas is ZONE_POLYGONS:
+                self._indice = cargar_indice_zonas()
+            else:
+                self._indice = construir_indice_zonas(self.zonas)
+        return self._indice
+
+    def columnas_limpiar(self):
+        """Rangos a limpiar antes de escribir; None = los de COLUMNAS_RESULTADOS."""
+        if self.columnas is COLUMNAS_RESULTADOS:
+            return None
+        return [columna_completa(c) for cols in self.columnas.values() for c in cols]
+
+    def crear_manager_sheets(self):
+        return crear_manager_sheets(self.key_file, self.spreadsheet_id, self.backend, self.hoja_local)
+
+
+def cargar_inquilinos(path=None, solo=None):
+    """
+    Carga la lista de inquilinos de TENANTS o de un fichero JSON.
+
+    Args:
+        path (str): JSON con la lista de inquilinos; si es None, TENANTS de config
+        solo (list): Nombres a procesar; si es None, todos
+
+    Returns:
+        list: Lista de Inquilino
+    """
+    definiciones = TENANTS
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            definiciones = json.load(f)
+
+    inquilinos = [Inquilino.desde_dict(datos) for datos in definiciones]
+    nombres = [inquilino.nombre for inquilino in inquilinos]
+    repetidos = sorted({nombre for nombre in nombres if nombres.count(nombre) > 1})
+    if repetidos:
+        raise ValueError(f"Inquilinos repetidos: {', '.join(repetidos)}")
+
+    if solo:
+        desconocidos = sorted(set(solo) - set(nombres))
+        if desconocidos:
+            raise ValueError(f"Inquilinos desconocidos: {', '.join(desconocidos)}")
+        inquilinos = [inquilino for inquilino in inquilinos if inquilino.nombre in solo]
+
+    for inquilino in inquilinos:
+        sin_columna = [z for z in inquilino.zonas if z not in inquilino.columnas]
+        if sin_columna:
+            print(f"  ⚠️ {inquilino.nombre}: zonas sin columna de resultados (irán a 'sin_zona'): "
+                  f"{', '.join(sin_columna)}")
+    return inquilinos
+
+
+def _procesar_inquilino(inquilino, reanudar=False):
+    from main import procesar_rutas
+
+    resultado = {'nombre': inquilino.nombre, 'ok': False}
+    t0 = time.perf_counter()
+    try:
+        with etapa(f"inquilino.{inquilino.nombre}"):
+            resumen = procesar_rutas(inquilino=inquilino, reanudar=reanudar)
+        if resumen is not None:
+            resultado.update(resumen)
+            resultado['ok'] = True
+        else:
+            resultado['error'] = 'Sin direcciones geocodificadas'
+    except Exception as e:
+        traceback.print_exc()
+        resultado['error'] = str(e)
+    resultado['pared_s'] = round(time.perf_counter() - t0, 3)
+    return resultado
+
+
+def procesar_inquilinos(inquilinos, paralelo=TENANTS_PARALELO, max_qps=TENANTS_GEOCODING_MAX_QPS, reanudar=False):
+    """
+    Procesa varios inquilinos a la vez compartiendo caché, modelo y límite de la API.
+
+    Args:
+        inquilinos (list): Lista de Inquilino
+        paralelo (int): Inquilinos procesados a la vez
+        max_qps (float): Peticiones por segundo a la API de Google Maps entre todos
+                         (None = sin límite)
+        reanudar (bool): Reanudar la ejecución a medias de cada inquilino (ver checkpoints.py)
+
+    Returns:
+        list: Un resultado por inquilino ({'nombre', 'ok', 'pared_s', 'filas', 'zonas',
+              'longitud_m', 'etapas_s', ...} o 'error')
+    """
+    from geocoding import load_cache, configurar_limitador
+    from address_model_cleaner import _cargar_lookup
+
+    configurar_limitador(max_qps)
+
+    # Lo compartido se carga una vez antes de lanzar los hilos (el modelo, al primer uso)
+    with etapa('compartido'):
+        load_cache()
+        _cargar_lookup()
+
+    print(f"\n  🏙️ Procesando {len(inquilinos)} inquilinos ({min(paralelo, len(inquilinos))} a la vez)...")
+    with ThreadPoolExecutor(max_workers=max(1, min(paralelo, len(inquilinos)))) as executor:
+        resultados = list(executor.map(lambda inquilino: _procesar_inquilino(inquilino, reanudar), inquilinos))
+
+    # Tiempos por etapa de cada inquilino (sus etapas cuelgan de 'inquilino.<nombre>')
+    etapas = instrumentacion_actual().informe()['etapas']
+    for resultado in resultados:
+        prefijo = f"inquilino.{resultado['nombre']}/"
+        resultado['etapas_s'] = {
+            ruta[len(prefijo):]: datos['pared_s'] for ruta, datos in etapas.items()
+            if ruta.startswith(prefijo) and '/' not in ruta[len(prefijo):]
+        }
+    return resultados
+
+
+def imprimir_resultados(resultados):
+    """Imprime una línea por inquilino con filas, puntos, no encontradas y tiempo."""
+    print("\n" + "="*60)
+    print("  RESULTADOS POR INQUILINO")
+    print("="*60)
+    for resultado in resultados:
+        if not resultado['ok']:
+            print(f"  ❌ {resultado['nombre']}: {resultado.get('error')} ({resultado['pared_s']:.2f} s)")
+            continue
+        print(f"  ✅ {resultado['nombre']}: {resultado['filas']} filas, {resultado['puntos']} puntos, "
+              f"{resultado['no_encontradas']} no encontradas ({resultado['pared_s']:.2f} s)")
+        for zona, n in resultado['zonas'].items():
+            print(f"     - {zona}: {n} puntos, {resultado['longitud_m'][zona] / 1000:.1f} km")
+        lentas = sorted(resultado['etapas_s'].items(), key=lambda kv: kv[1], reverse=True)[:3]
+        print(f"     Etapas más lentas: {', '.join(f'{ruta} {s:.2f} s' for ruta, s in lentas)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BikeLogic - varios inquilinos en un solo proceso")
+    parser.add_argument('--inquilinos', help="JSON con la lista de inquilinos (por defecto TENANTS de config)")
+    parser.add_argument('--solo', action='append', metavar='NOMBRE',
+                        help="Procesar solo este inquilino. Repetible")
+    parser.add_argument('--paralelo', type=int, default=TENANTS_PARALELO,
+                        help="Inquilinos procesados a la vez")
+    parser.add_argument('--max-qps', type=float, default=TENANTS_GEOCODING_MAX_QPS,
+                        help="Peticiones por segundo a Google Maps entre todos los inquilinos (0 = sin límite)")
+    parser.add_argument('--reanudar', '--resume', action='store_true',
+                        help="Reanudar la ejecución a medias de cada inquilino sin repetir las etapas completadas")
+    args = parser.parse_args()
+
+    inquilinos = cargar_inquilinos(args.inquilinos, args.solo)
+    if not inquilinos:
+        parser.error("No hay inquilinos: define TENANTS en config.py o usa --inquilinos")
+
+    iniciar_ejecucion('multi_inquilino')
+    resultados = []
+    try:
+        resultados = procesar_inquilinos(inquilinos, args.paralelo, args.max_qps or None, args.reanudar)
+        imprimir_resultados(resultados)
+    finally:
+        imprimir_resumen()
+        print(f"  📈 Informe de la ejecución: {guardar_informe(extra={'inquilinos': resultados})}")
+
+
+if __name__ == "__main__":
+    main()
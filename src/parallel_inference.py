@@ -0,0 +1,243 @@
+"""
+Inferencia paralela del modelo IA con réplicas en un pool de procesos
+
+En máquinas solo-CPU un único model.generate() aprovecha mal los núcleos.
+Este módulo arranca K procesos, cada uno con su propia copia del modelo y
+torch.set_num_threads fijado, reparte los lotes entre ellos y devuelve los
+resultados en el orden original.
+
+Benchmark para encontrar el mejor reparto procesos × hilos:
+    cd src
+    python parallel_inference.py
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import config
+
+MODEL_WORKERS = getattr(config, 'MODEL_WORKERS', 1)
+MODEL_THREADS_PER_WORKER = getattr(config, 'MODEL_THREADS_PER_WORKER', None)
+
+
+def _hilos_por_defecto(workers):
+    """Reparte los núcleos disponibles entre los procesos."""
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def _inicializar_worker(hilos):
+    """Inicializador de cada proceso: fija hilos de torch y carga su réplica."""
+    import torch
+    from address_model_cleaner import _cargar_modelo
+
+    torch.set_num_threads(hilos)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Solo se puede fijar antes de cualquier trabajo paralelo
+        pass
+
+    _cargar_modelo()
+
+
+def _pid_worker(espera):
+    time.sleep(espera)
+    return os.getpid()
+
+
+def _inferir_en_worker(direcciones_batch):
+    from address_model_cleaner import _inferir_batch
+    return _inferir_batch(direcciones_batch)
+
+
+class ModelPool:
+    """
+    Pool de procesos con una réplica del modelo por proceso.
+
+    Uso:
+        with ModelPool(workers=4) as pool:
+            resultados = pool.procesar(direcciones, batch_size=16)
+    """
+
+    def __init__(self, workers=MODEL_WORKERS, hilos_por_worker=MODEL_THREADS_PER_WORKER):
+        """
+        Args:
+            workers (int): Número de procesos (réplicas del modelo)
+            hilos_por_worker (int): Hilos de torch por proceso.
+                                    Si es None, reparte os.cpu_count() entre los procesos
+        """
+        self.workers = max(1, workers)
+        self.hilos_por_worker = hilos_por_worker or _hilos_por_defecto(self.workers)
+        # 'spawn' evita heredar el estado de torch/OpenMP del proceso padre
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_inicializar_worker,
+            initargs=(self.hilos_por_worker,)
+        )
+
+    def procesar(self, direcciones, batch_size=16):
+        """
+        Procesa direcciones repartiendo lotes entre los procesos.
+
+        Args:
+            direcciones (list): Direcciones sin procesar
+            batch_size (int): Direcciones por lote
+
+        Returns:
+            list: Direcciones procesadas en el mismo orden que la entrada
+        """
+        lotes = [direcciones[i:i + batch_size] for i in range(0, len(direcciones), batch_size)]
+        resultados = []
+        # map() conserva el orden de los lotes aunque terminen desordenados
+        for resultado_lote in self._executor.map(_inferir_en_worker, lotes):
+            resultados.extend(resultado_lote)
+        return resultados
+
+    def calentar(self, max_rondas=20):
+        """Espera a que todos los procesos hayan cargado su réplica del modelo."""
+        vistos = set()
+        for _ in range(max_rondas):
+            # Tareas lentas para que cada proceso (ya inicializado) recoja una
+            vistos.update(self._executor.map(_pid_worker, [0.2] * self.workers))
+            if len(vistos) >= self.workers:
+                break
+
+    def cerrar(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cerrar()
+
+
+# Pool compartido entre llamadas: procesar_rutas limpia página a página y cada
+# página no debe pagar K cargas del modelo en frío
+_pool_compartido = None
+
+
+def obtener_pool(workers=MODEL_WORKERS, hilos_por_worker=MODEL_THREADS_PER_WORKER):
+    """
+    Devuelve el pool compartido, creándolo la primera vez.
+
+    Si se pide otro reparto procesos × hilos, cierra el anterior y crea uno nuevo.
+
+    Returns:
+        ModelPool: Pool con las réplicas ya cargadas (o cargándose)
+    """
+    global _pool_compartido
+    hilos = hilos_por_worker or _hilos_por_defecto(max(1, workers))
+    if _pool_compartido is not None and (_pool_compartido.workers, _pool_compartido.hilos_por_worker) != (max(1, workers), hilos):
+        cerrar_pool()
+    if _pool_compartido is None:
+        _pool_compartido = ModelPool(workers, hilos)
+    return _pool_compartido
+
+
+def cerrar_pool():
+    """Cierra el pool compartido (si existe) y libera sus réplicas del modelo."""
+    global _pool_compartido
+    if _pool_compartido is not None:
+        _pool_compartido.cerrar()
+        _pool_compartido = None
+
+
+def procesar_en_paralelo(direcciones, batch_size=16, workers=MODEL_WORKERS, hilos_por_worker=MODEL_THREADS_PER_WORKER):
+    """
+    Atajo: procesa las direcciones en el pool compartido.
+
+    El pool sigue abierto para las siguientes llamadas de la misma ejecución;
+    quien lo use debe llamar a cerrar_pool() al terminar (procesar_rutas lo hace).
+
+    Returns:
+        list: Direcciones procesadas en el mismo orden que la entrada
+    """
+    return obtener_pool(workers, hilos_por_worker).procesar(direcciones, batch_size=batch_size)
+
+
+def _configuraciones_candidatas(nucleos):
+    """Pares (workers, hilos) que usan todos los núcleos sin sobresuscribir."""
+    candidatas = []
+    workers = 1
+    while workers <= nucleos:
+        candidatas.append((workers, nucleos // workers))
+        workers *= 2
+    return candidatas
+
+
+def benchmark_configuraciones(direcciones, nucleos=None, batch_size=16, configuraciones=None):
+    """
+    Mide el rendimiento de cada reparto procesos × hilos sobre las mismas direcciones.
+
+    La carga del modelo se mide aparte (calentar) para no penalizar a las
+    configuraciones con más réplicas en el tiempo de inferencia.
+
+    Args:
+        direcciones (list): Direcciones de prueba
+        nucleos (int): Núcleos a repartir (por defecto os.cpu_count())
+        batch_size (int): Direcciones por lote
+        configuraciones (list): Lista de (workers, hilos) a probar.
+                                Si es None, usa potencias de 2 de workers
+
+    Returns:
+        list: Lista de dicts ordenada de mejor a peor rendimiento
+    """
+    nucleos = nucleos or os.cpu_count() or 1
+    if configuraciones is None:
+        configuraciones = _configuraciones_candidatas(nucleos)
+
+    resultados = []
+    for workers, hilos in configuraciones:
+        print(f"  ⏱ Probando {workers} procesos × {hilos} hilos...")
+        inicio = time.perf_counter()
+        with ModelPool(workers, hilos) as pool:
+            pool.calentar()
+            carga = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            pool.procesar(direcciones, batch_size=batch_size)
+            inferencia = time.perf_counter() - inicio
+
+        resultados.append({
+            'workers': workers,
+            'hilos': hilos,
+            'carga_s': carga,
+            'inferencia_s': inferencia,
+            'direcciones_s': len(direcciones) / inferencia if inferencia > 0 else float('inf')
+        })
+
+    resultados.sort(key=lambda r: r['inferencia_s'])
+
+    print(f"\n  📊 Resultados ({len(direcciones)} direcciones, lotes de {batch_size}):")
+    for r in resultados:
+        print(f"     {r['workers']:>2} × {r['hilos']:>2} hilos: "
+              f"carga {r['carga_s']:.1f}s, inferencia {r['inferencia_s']:.2f}s "
+              f"({r['direcciones_s']:.1f} dir/s)")
+
+    mejor = resultados[0]
+    print(f"\n  🏆 Mejor reparto: MODEL_WORKERS = {mejor['workers']}, "
+          f"MODEL_THREADS_PER_WORKER = {mejor['hilos']}")
+
+    return resultados
+
+
+def _direcciones_de_prueba(cantidad=256):
+    """Genera direcciones de prueba a partir del callejero de Sant Cugat."""
+    import csv
+
+    calles_path = Path(__file__).parent.parent / "data" / "carrers_SantCugat.csv"
+    with open(calles_path, encoding='utf-8-sig') as f:
+        calles = [f"{row['TIPUS_VIA']} {row['CARRER']}" for row in csv.DictReader(f)]
+
+    return [
+        f"{calles[i % len(calles)].lower()} {i % 97 + 1}, {i % 4 + 1}º sant cugat"
+        for i in range(cantidad)
+    ]
+
+
+if __name__ == "__main__":
+    benchmark_configuraciones(_direcciones_de_prueba())
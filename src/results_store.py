@@ -0,0 +1,182 @@
+"""
+Almacén local de resultados por código de barras
+
+Guarda, para cada paquete, la dirección original y limpia, la fuente de la
+limpieza, las coordenadas, la zona y la posición en la ruta (SQLite, sin
+dependencias). Las siguientes ejecuciones, el tablero de reordenación y los
+análisis pueden reutilizar estos valores sin volver a llamar al modelo, al
+geocodificador ni al solver.
+"""
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from threading import Lock
+
+import config
+from line_distance_solver import posiciones_en_ruta
+from config import ZONE_ROUTE_LINES
+
+RESULTS_DB_FILE = getattr(config, 'RESULTS_DB_FILE', 'resultados.db')
+
+_db_lock = Lock()
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS paquetes (
+    codigo TEXT PRIMARY KEY,
+    direccion_raw TEXT,
+    direccion TEXT,
+    fuente TEXT,
+    lat REAL,
+    lon REAL,
+    zona TEXT,
+    posicion INTEGER,
+    posicion_ruta REAL,
+    actualizado TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_paquetes_zona ON paquetes (zona, posicion);
+"""
+
+_COLUMNAS = ('codigo', 'direccion_raw', 'direccion', 'fuente', 'lat', 'lon',
+             'zona', 'posicion', 'posicion_ruta', 'actualizado')
+
+
+def _conectar(db_file=RESULTS_DB_FILE):
+    conexion = sqlite3.connect(db_file)
+    conexion.executescript(_ESQUEMA)
+    return conexion
+
+
+def guardar_resultados(filas, db_file=RESULTS_DB_FILE):
+    """
+    Inserta o actualiza resultados por código en una sola transacción.
+
+    Args:
+        filas (list): Lista de dicts con las claves de _COLUMNAS (sin 'actualizado')
+        db_file (str): Ruta de la base de datos
+
+    Returns:
+        int: Número de filas guardadas
+    """
+    if not filas:
+        return 0
+
+    ahora = datetime.now().isoformat(timespec='seconds')
+    valores = [tuple(fila.get(c) for c in _COLUMNAS[:-1]) + (ahora,) for fila in filas]
+
+    # Una fuente None (p. ej. desde el modo incremental) o 'almacen' (fila reutilizada
+    # de este mismo almacén) conserva la fuente real de la limpieza ya guardada
+    actualizar = ', '.join(
+        f"{c} = CASE WHEN excluded.{c} IS NULL OR excluded.{c} = 'almacen' "
+        f"THEN paquetes.{c} ELSE excluded.{c} END" if c == 'fuente' else f"{c} = excluded.{c}"
+        for c in _COLUMNAS[1:]
+    )
+    with _db_lock, closing(_conectar(db_file)) as conexion:
+        with conexion:
+            conexion.executemany(
+                f"INSERT INTO paquetes ({', '.join(_COLUMNAS)}) "
+                f"VALUES ({', '.join('?' * len(_COLUMNAS))}) "
+                f"ON CONFLICT(codigo) DO UPDATE SET {actualizar}",
+                valores
+            )
+    return len(valores)
+
+
+def obtener_por_codigos(codigos, db_file=RESULTS_DB_FILE):
+    """
+    Recupera los resultados guardados de una lista de códigos.
+
+    Returns:
+        dict: {codigo: {columna: valor}}
+    """
+    codigos = [c for c in dict.fromkeys(codigos) if c]
+    resultados = {}
+    if not codigos:
+        return resultados
+
+    with _db_lock, closing(_conectar(db_file)) as conexion:
+        # SQLite limita el número de parámetros por consulta: consultar por bloques
+        for inicio in range(0, len(codigos), 500):
+            bloque = codigos[inicio:inicio + 500]
+            cursor = conexion.execute(
+                f"SELECT {', '.join(_COLUMNAS)} FROM paquetes "
+                f"WHERE codigo IN ({', '.join('?' * len(bloque))})",
+                bloque
+            )
+            for fila in cursor:
+                resultados[fila[0]] = dict(zip(_COLUMNAS, fila))
+    return resultados
+
+
+def resultados_reutilizables(codigos_barras, direcciones_raw, db_file=RESULTS_DB_FILE):
+    """
+    Busca filas cuyo código ya está guardado con la misma dirección original.
+
+    Returns:
+        tuple: ({indice: direccion_limpia}, {direccion_limpia: (lat, lon)})
+               para las filas que no hace falta volver a limpiar ni geocodificar
+    """
+    guardados = obtener_por_codigos(codigos_barras, db_file)
+    limpias = {}
+    coordenadas = {}
+    for i, (codigo, raw) in enumerate(zip(codigos_barras, direcciones_raw)):
+        guardado = guardados.get(codigo)
+        if guardado and guardado['direccion_raw'] == raw and guardado['direccion']:
+            limpias[i] = guardado['direccion']
+            if guardado['lat'] is not None:
+                coordenadas[guardado['direccion']] = (guardado['lat'], guardado['lon'])
+    return limpias, coordenadas
+
+
+def registrar_ejecucion(zonas_ordenadas, codigos_barras, direcciones_raw, direcciones_limpias,
+                        fuentes=None, lineas_por_zona=None, db_file=RESULTS_DB_FILE, posiciones=None):
+    """
+    Guarda los resultados de una ejecución completa o incremental.
+
+    Args:
+        zonas_ordenadas (dict): {zona: [(coords, address, codigos_barras), ...]} ya ordenado
+        codigos_barras (list): Código de cada fila leída
+        direcciones_raw (list): Dirección original de cada fila
+        direcciones_limpias (list): Dirección limpia de cada fila
+        fuentes (list): Fuente de limpieza de cada fila ('cache', 'lookup', 'modelo'...)
+        lineas_por_zona (dict): Líneas de ruta; si es None usa ZONE_ROUTE_LINES
+        posiciones (dict): {address: posición en la línea de su zona} ya calculadas
+                           (GeometriaCacheada); solo se proyectan las que falten
+
+    Returns:
+        int: Número de paquetes guardados
+    """
+    if lineas_por_zona is None:
+        lineas_por_zona = ZONE_ROUTE_LINES
+    if fuentes is None:
+        fuentes = [None] * len(codigos_barras)
+
+    filas = {}
+    for codigo, raw, limpia, fuente in zip(codigos_barras, direcciones_raw, direcciones_limpias, fuentes):
+        if codigo:
+            filas[codigo] = {
+                'codigo': codigo, 'direccion_raw': raw, 'direccion': limpia, 'fuente': fuente,
+                'lat': None, 'lon': None, 'zona': None, 'posicion': None, 'posicion_ruta': None
+            }
+
+    for zona, items in zonas_ordenadas.items():
+        linea = lineas_por_zona.get(zona)
+        posiciones_ruta = [None] * len(items)
+        if items and linea and len(linea) >= 2:
+            posiciones_ruta = [(posiciones or {}).get(item[1]) for item in items]
+            # Las que no vienen calculadas, proyectadas todas a la vez
+            faltan = [i for i, p in enumerate(posiciones_ruta) if p is None]
+            if faltan:
+                calculadas, _ = posiciones_en_ruta([items[i][0] for i in faltan], linea)
+                for i, posicion in zip(faltan, calculadas):
+                    posiciones_ruta[i] = float(posicion)
+
+        for posicion, (item, posicion_ruta) in enumerate(zip(items, posiciones_ruta), 1):
+            coords = item[0]
+            for codigo in (item[2] if len(item) >= 3 else []):
+                if codigo in filas:
+                    filas[codigo].update({
+                        'lat': coords[0], 'lon': coords[1], 'zona': zona,
+                        'posicion': posicion, 'posicion_ruta': posicion_ruta
+                    })
+
+    return guardar_resultados(list(filas.values()), db_file)
@@ -0,0 +1,349 @@
+"""
+API local de optimización de rutas para el tablero de reordenación (docs/reorder.html)
+
+Mantiene en memoria el índice de zonas, las líneas de ruta, el caché de
+geocodificación y el almacén de resultados, y responde en milisegundos:
+
+    GET  /salud
+    POST /optimizar  {"zona": "centre", "items": [{"addr": "...", "code": "..."}, ...]}
+         → items ordenados por la línea de ruta de la zona
+    POST /insertar   {"zona": "centre", "items": [...], "nuevo": {"addr": "...", "code": "..."}}
+         → items con el nuevo insertado donde menos alarga la ruta (sin mover el resto)
+    POST /longitud   {"zona": "centre", "items": [...]}
+         → longitud en metros de la ruta en el orden recibido
+    POST /memoria    {"zonas": {"centre": [...], "fabriques": [...], ...}}
+         → guarda el orden editado en la memoria de rutas (route_memory.py)
+
+La zona admite los ids del tablero (fabriques, centre, mirasol, altres) o los
+nombres internos (Indust, Centre, Mirasol, sin_zona). Las coordenadas de cada
+item se toman del almacén de resultados (por código) o del caché de
+geocodificación (por dirección); sin coordenadas, el item queda al final en su
+orden original y se indica en "sin_coordenadas". Solo /insertar con
+"geocodificar": true llama a la API de Google Maps.
+
+Solo responde a navegadores desde los orígenes de ROUTE_API_ORIGENES (el del
+tablero); cualquier otra web recibe 403.
+
+Uso:
+    cd src
+    python route_api.py
+"""
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import config
+from geocoding import load_cache, get_from_cache
+from line_distance_solver import RutaInsercion, posiciones_en_ruta, longitud_ruta
+from results_store import obtener_por_codigos
+from route_memory import registrar_rutas
+from zone_manager import cargar_indice_zonas
+from config import ZONE_ROUTE_LINES, DEPOT_COORDS
+
+ROUTE_API_HOST = getattr(config, 'ROUTE_API_HOST', '127.0.0.1')
+ROUTE_API_PORT = getattr(config, 'ROUTE_API_PORT', 8767)
+# Orígenes web que pueden llamar a la API (el del tablero); el resto recibe 403
+ROUTE_API_ORIGENES = set(getattr(config, 'ROUTE_API_ORIGENES', ['https://TU-USUARIO.github.io']))
+ROUTE_API_MAX_BYTES = getattr(config, 'ROUTE_API_MAX_BYTES', 1_000_000)
+
+# Ids de columna del tablero → zonas internas
+ZONAS_TABLERO = {'fabriques': 'Indust', 'centre': 'Centre', 'mirasol': 'Mirasol', 'altres': 'sin_zona'}
+
+
+class PeticionInvalida(ValueError):
+    """Error en los datos de una petición (responde 400)"""
+
+
+def _zona_interna(zona):
+    if zona in ZONAS_TABLERO:
+        return ZONAS_TABLERO[zona]
+    if zona in ZONAS_TABLERO.values():
+        return zona
+    raise PeticionInvalida(f"Zona desconocida: {zona!r}")
+
+
+def _codigos(item):
+    return [c.strip() for c in str(item.get('code') or '').split(',') if c.strip()]
+
+
+def resolver_coordenadas(items):
+    """
+    Busca las coordenadas de cada item sin llamar a ninguna API.
+
+    Args:
+        items (list): Items del tablero ({'addr', 'code', ...})
+
+    Returns:
+        list: (lat, lon) o None por item, en el mismo orden
+    """
+    guardados = obtener_por_codigos([c for item in items for c in _codigos(item)])
+    cache = load_cache()
+
+    coords = []
+    for item in items:
+        encontrado = None
+        for codigo in _codigos(item):
+            guardado = guardados.get(codigo)
+            if guardado and guardado['lat'] is not None:
+                encontrado = (guardado['lat'], guardado['lon'])
+                break
+        if encontrado is None and item.get('addr'):
+            encontrado = get_from_cache(item['addr'], cache)
+        coords.append(encontrado)
+    return coords
+
+
+def _con_coordenadas(items, coords, posiciones=None):
+    resultado = []
+    for i, (item, c) in enumerate(zip(items, coords)):
+        nuevo = dict(item)
+        nuevo['lat'], nuevo['lon'] = (c if c is not None else (None, None))
+        if posiciones is not None:
+            nuevo['posicion_ruta'] = posiciones.get(i)
+        resultado.append(nuevo)
+    return resultado
+
+
+def optimizar_zona(zona, items):
+    """
+    Ordena los items de una zona por su posición en la línea de ruta
+    (mismo criterio que ordenar_por_linea).
+
+    Returns:
+        dict: {'zona', 'items', 'longitud_m', 'sin_coordenadas'}
+    """
+    zona = _zona_interna(zona)
+    coords = resolver_coordenadas(items)
+    con_coords = [i for i, c in enumerate(coords) if c is not None]
+    sin_coords = [i for i, c in enumerate(coords) if c is None]
+
+    linea = ZONE_ROUTE_LINES.get(zona)
+    posiciones = {}
+    if linea and len(linea) >= 2 and con_coords:
+        pos, _ = posiciones_en_ruta([coords[i] for i in con_coords], linea)
+        posiciones = {i: float(p) for i, p in zip(con_coords, pos)}
+        # Orden estable: los empates conservan el orden del tablero
+        con_coords.sort(key=lambda i: posiciones[i])
+
+    orden = con_coords + sin_coords
+    items_ordenados = [items[i] for i in orden]
+    coords_ordenadas = [coords[i] for i in orden]
+    return {
+        'zona': zona,
+        'items': _con_coordenadas(items_ordenados, coords_ordenadas,
+                                  {n: posiciones.get(i) for n, i in enumerate(orden)}),
+        'longitud_m': round(longitud_ruta([c for c in coords_ordenadas if c is not None], DEPOT_COORDS), 1),
+        'sin_coordenadas': len(sin_coords)
+    }
+
+
+def insertar_en_ruta(zona, items, nuevo, geocodificar=False):
+    """
+    Inserta un item en la posición que menos alarga la ruta, sin cambiar el
+    orden relativo de los demás.
+
+    Args:
+        zona (str): Zona (id del tablero o nombre interno)
+        items (list): Items en el orden actual
+        nuevo (dict): Item a insertar ({'addr', 'code'})
+        geocodificar (bool): Si True y no hay coordenadas en caché, llama a la API
+
+    Returns:
+        dict: {'zona', 'items', 'indice', 'incremento_m', 'longitud_m', 'sin_coordenadas'}
+    """
+    zona = _zona_interna(zona)
+    coords = resolver_coordenadas(items + [nuevo])
+    coords_nuevo = coords.pop()
+
+    if coords_nuevo is None and geocodificar and nuevo.get('addr'):
+        from geocoding import geocode_and_store
+        geocoded, _ = geocode_and_store([nuevo['addr']], codigos_barras=[nuevo.get('code', '')])
+        if geocoded:
+            coords_nuevo = tuple(geocoded[0][0])
+
+    con_coords = [i for i, c in enumerate(coords) if c is not None]
+    if coords_nuevo is None:
+        # Sin coordenadas no se puede optimizar: al final de la ruta
+        indice, incremento = len(items), None
+    else:
+        # Misma inserción que las paradas tardías (el depósito es la salida); con
+        # pocas paradas se evalúan todos los huecos, no solo los cercanos a la proyección
+        ruta = RutaInsercion([(coords[i], i, None) for i in con_coords], ZONE_ROUTE_LINES.get(zona) or [],
+                             DEPOT_COORDS, ventana=max(1, len(con_coords)))
+        hueco, metros = ruta.insertar((coords_nuevo, None, None))
+        incremento = round(metros, 1)
+
+        # Traducir a índice en la lista completa (los items sin coordenadas no cuentan)
+        indice = 0 if hueco == 0 else con_coords[hueco - 1] + 1
+
+    items_resultado = items[:indice] + [nuevo] + items[indice:]
+    coords_resultado = coords[:indice] + [coords_nuevo] + coords[indice:]
+    return {
+        'zona': zona,
+        'items': _con_coordenadas(items_resultado, coords_resultado),
+        'indice': indice,
+        'incremento_m': incremento,
+        'longitud_m': round(longitud_ruta([c for c in coords_resultado if c is not None], DEPOT_COORDS), 1),
+        'sin_coordenadas': sum(1 for c in coords_resultado if c is None)
+    }
+
+
+def calcular_longitud(zona, items):
+    """
+    Returns:
+        dict: {'zona', 'longitud_m', 'sin_coordenadas'} para el orden recibido
+    """
+    zona = _zona_interna(zona)
+    coords = resolver_coordenadas(items)
+    return {
+        'zona': zona,
+        'longitud_m': round(longitud_ruta([c for c in coords if c is not None], DEPOT_COORDS), 1),
+        'sin_coordenadas': sum(1 for c in coords if c is None)
+    }
+
+
+def guardar_memoria(zonas):
+    """
+    Guarda el orden final de las zonas editadas en el tablero: al día
+    siguiente, esas paradas saldrán en este orden.
+
+    Args:
+        zonas (dict): {zona: [items en orden]}
+
+    Returns:
+        dict: {'guardadas'}
+    """
+    if not isinstance(zonas, dict):
+        raise PeticionInvalida("Se esperaba 'zonas' como objeto {zona: items}")
+    direcciones = {
+        _zona_interna(zona): [item.get('addr') for item in items or []]
+        for zona, items in zonas.items()
+    }
+    return {'guardadas': registrar_rutas(direcciones, fuente='tablero')}
+
+
+_ENDPOINTS = {
+    '/optimizar': lambda datos: optimizar_zona(datos.get('zona'), datos.get('items') or []),
+    '/insertar': lambda datos: insertar_en_ruta(
+        datos.get('zona'), datos.get('items') or [], datos.get('nuevo') or {},
+        bool(datos.get('geocodificar'))
+    ),
+    '/longitud': lambda datos: calcular_longitud(datos.get('zona'), datos.get('items') or []),
+    '/memoria': lambda datos: guardar_memoria(datos.get('zonas')),
+}
+
+
+class RouteRequestHandler(BaseHTTPRequestHandler):
+    def _origen_rechazado(self):
+        """
+        Responde 403 si la petición viene de una web que no es el tablero.
+        Sin cabecera Origin (curl, scripts locales) no hay navegador que proteger.
+
+        Returns:
+            bool: True si ya se ha respondido con 403
+        """
+        origen = self.headers.get('Origin')
+        if origen is None or origen in ROUTE_API_ORIGENES:
+            return False
+        self._responder(403, {'ok': False, 'message': f'Origen no permitido: {origen}'})
+        return True
+
+    def _cabeceras_cors(self):
+        # El tablero se sirve desde otro origen (GitHub Pages / Netlify): solo a él
+        # se le devuelve permiso, nunca '*', para que otra web no use la API local
+        origen = self.headers.get('Origin')
+        if origen in ROUTE_API_ORIGENES:
+            self.send_header('Access-Control-Allow-Origin', origen)
+            self.send_header('Vary', 'Origin')
+
+    def _responder(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self._cabeceras_cors()
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_OPTIONS(self):
+        if self._origen_rechazado():
+            return
+        self.send_response(204)
+        self._cabeceras_cors()
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        # Chrome exige este permiso para llamar a localhost desde una web pública
+        self.send_header('Access-Control-Allow-Private-Network', 'true')
+        self.end_headers()
+
+    def do_GET(self):
+        if self._origen_rechazado():
+            return
+        if self.path == '/salud':
+            self._responder(200, {'ok': True, 'zonas': list(ZONAS_TABLERO)})
+        else:
+            self._responder(404, {'ok': False, 'message': 'Ruta no encontrada'})
+
+    def do_POST(self):
+        if self._origen_rechazado():
+            return
+        endpoint = _ENDPOINTS.get(self.path)
+        if endpoint is None:
+            self._responder(404, {'ok': False, 'message': 'Ruta no encontrada'})
+            return
+
+        try:
+            longitud = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            longitud = -1
+        if not 0 <= longitud <= ROUTE_API_MAX_BYTES:
+            self.close_connection = True
+            self._responder(413, {'ok': False, 'message': f'Cuerpo inválido o mayor de {ROUTE_API_MAX_BYTES} bytes'})
+            return
+
+        inicio = time.perf_counter()
+        try:
+            datos = json.loads(self.rfile.read(longitud) or b'{}')
+            if not isinstance(datos, dict):
+                raise PeticionInvalida("Se esperaba un objeto JSON")
+            resultado = endpoint(datos)
+        except (PeticionInvalida, ValueError, AttributeError, TypeError) as e:
+            self._responder(400, {'ok': False, 'message': f'Petición inválida: {e}'})
+            return
+        except Exception as e:
+            self._responder(500, {'ok': False, 'message': str(e)})
+            return
+
+        resultado['ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+        self._responder(200, {'ok': True, **resultado})
+
+    def log_message(self, format, *args):
+        # Silenciar el log por petición de http.server
+        pass
+
+
+def iniciar_api(host=ROUTE_API_HOST, port=ROUTE_API_PORT):
+    """
+    Carga índices y cachés y atiende peticiones hasta que se interrumpa el proceso.
+
+    Args:
+        host (str): Interfaz donde escuchar (por defecto solo localhost)
+        port (int): Puerto TCP
+    """
+    cargar_indice_zonas()
+    load_cache()
+    server = ThreadingHTTPServer((host, port), RouteRequestHandler)
+
+    print(f"  🟢 API de rutas escuchando en http://{host}:{port}")
+    print(f"     Endpoints: /optimizar, /insertar, /longitud, /memoria, /salud")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n  ⏹ API de rutas detenida")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    iniciar_api()
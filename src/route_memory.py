@@ -0,0 +1,222 @@
+"""
+Memoria de rutas: posición aprendida de cada parada habitual por zona
+
+Muchas paradas se repiten cada día (tiendas, oficinas). Cada ruta final (la que
+publica procesar_rutas y, sobre todo, la que deja el repartidor tras editarla
+en docs/reorder.html) se guarda aquí como posición normalizada (0 = primera
+parada, 1 = última) por zona y dirección. La posición aprendida combina los
+días anteriores con media exponencial (ROUTE_MEMORY_ALFA); dentro de un mismo
+día, la última ruta guardada sustituye a las anteriores, salvo que una ruta del
+pipeline no sustituye a una edición del tablero (las ediciones ganan).
+
+Al día siguiente, ordenar_con_memoria coloca las paradas conocidas en su orden
+aprendido e inserta solo las nuevas (RutaInsercion): el repartidor recibe un
+orden estable y el solver solo trabaja con lo que no conoce.
+
+Se guarda en la misma base de datos SQLite que el almacén de resultados.
+"""
+import sqlite3
+from contextlib import closing
+from datetime import date
+from threading import Lock
+
+import config
+from instrumentation import etapa
+from line_distance_solver import RutaInsercion, procesar_zonas_con_linea, mejorar_zonas, MEJORA_LOCAL_ACTIVA
+from results_store import RESULTS_DB_FILE
+from config import ZONE_ROUTE_LINES, DEPOT_COORDS
+
+ROUTE_MEMORY_ACTIVA = getattr(config, 'ROUTE_MEMORY_ACTIVA', True)
+ROUTE_MEMORY_ALFA = getattr(config, 'ROUTE_MEMORY_ALFA', 0.5)  # Peso del día más reciente
+ROUTE_MEMORY_MIN_CONOCIDAS = getattr(config, 'ROUTE_MEMORY_MIN_CONOCIDAS', 3)  # Por zona, para usarla
+# Búsqueda local también sobre el orden aprendido (False = respetarlo tal cual)
+MEJORA_LOCAL_CON_MEMORIA = getattr(config, 'MEJORA_LOCAL_CON_MEMORIA', True)
+
+_db_lock = Lock()
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS memoria_rutas (
+    zona TEXT,
+    direccion TEXT,
+    posicion_base REAL,
+    posicion_dia REAL,
+    dia TEXT,
+    dias INTEGER,
+    fuente TEXT,
+    PRIMARY KEY (zona, direccion)
+);
+"""
+
+
+def _clave(direccion):
+    return ' '.join(str(direccion).upper().split())
+
+
+def _conectar(db_file=RESULTS_DB_FILE):
+    conexion = sqlite3.connect(db_file)
+    conexion.executescript(_ESQUEMA)
+    return conexion
+
+
+def _aprendida(posicion_base, posicion_dia, alfa=ROUTE_MEMORY_ALFA):
+    if posicion_base is None:
+        return posicion_dia
+    return (1 - alfa) * posicion_base + alfa * posicion_dia
+
+
+def registrar_rutas(direcciones_por_zona, fuente='ruta', dia=None, db_file=RESULTS_DB_FILE):
+    """
+    Guarda el orden final de cada zona.
+
+    Args:
+        direcciones_por_zona (dict): {zona: [dirección, ...]} en orden de visita
+        fuente (str): 'ruta' (publicada por procesar_rutas) o 'tablero' (editada
+                      en docs/reorder.html)
+        dia (str): Día de la ruta (ISO); por defecto hoy
+        db_file (str): Base de datos (la del almacén de resultados)
+
+    Returns:
+        int: Paradas guardadas
+    """
+    dia = dia or date.today().isoformat()
+    guardadas = 0
+    with _db_lock, closing(_conectar(db_file)) as conexion:
+        with conexion:
+            for zona, direcciones in direcciones_por_zona.items():
+                claves = list(dict.fromkeys(_clave(d) for d in direcciones if d))
+                if not claves:
+                    continue
+                previas = {}
+                for inicio in range(0, len(claves), 500):
+                    bloque = claves[inicio:inicio + 500]
+                    cursor = conexion.execute(
+                        "SELECT direccion, posicion_base, posicion_dia, dia, dias, fuente FROM memoria_rutas "
+                        f"WHERE zona = ? AND direccion IN ({', '.join('?' * len(bloque))})",
+                        [zona] + bloque
+                    )
+                    previas.update({fila[0]: fila[1:] for fila in cursor})
+
+                valores = []
+                for i, clave in enumerate(claves):
+                    posicion = i / (len(claves) - 1) if len(claves) > 1 else 0.0
+                    base, posicion_dia, dia_previo, dias, fuente_previa = previas.get(
+                        clave, (None, None, None, 0, None)
+                    )
+                    if dia_previo == dia and fuente == 'ruta' and fuente_previa == 'tablero':
+                        continue  # Ya editada hoy en el tablero: se conserva la edición
+                    if dia_previo is not None and dia_previo != dia:
+                        # Día nuevo: el anterior pasa a formar parte de lo aprendido
+                        base, dias = _aprendida(base, posicion_dia), dias + 1
+                    valores.append((zona, clave, base, posicion, dia, dias, fuente))
+
+                conexion.executemany(
+                    "INSERT OR REPLACE INTO memoria_rutas "
+                    "(zona, direccion, posicion_base, posicion_dia, dia, dias, fuente) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    valores
+                )
+                guardadas += len(valores)
+    return guardadas
+
+
+def posiciones_aprendidas(zona, direcciones, db_file=RESULTS_DB_FILE):
+    """
+    Returns:
+        dict: {dirección: posición aprendida (0-1)} de las direcciones conocidas en la zona
+    """
+    claves = {_clave(d): d for d in direcciones if d}
+    posiciones = {}
+    if not claves:
+        return posiciones
+
+    lista = list(claves)
+    with _db_lock, closing(_conectar(db_file)) as conexion:
+        for inicio in range(0, len(lista), 500):
+            bloque = lista[inicio:inicio + 500]
+            cursor = conexion.execute(
+                "SELECT direccion, posicion_base, posicion_dia FROM memoria_rutas "
+                f"WHERE zona = ? AND direccion IN ({', '.join('?' * len(bloque))})",
+                [zona] + bloque
+            )
+            for clave, base, posicion_dia in cursor:
+                posiciones[claves[clave]] = _aprendida(base, posicion_dia)
+    return posiciones
+
+
+def ordenar_con_memoria(zonas_dict, lineas_por_zona=None, inicio=DEPOT_COORDS, db_file=RESULTS_DB_FILE,
+                        posiciones=None):
+    """
+    Ordena cada zona partiendo de la memoria de rutas: las paradas conocidas en
+    su orden aprendido y las nuevas insertadas donde menos alargan la ruta.
+    Las zonas con menos de ROUTE_MEMORY_MIN_CONOCIDAS paradas conocidas se
+    ordenan por la línea de ruta como siempre.
+
+    Args:
+        zonas_dict (dict): {zona: [(coords, address, codigos), ...]}
+        lineas_por_zona (dict): Líneas de ruta; si es None, ZONE_ROUTE_LINES
+        inicio (tuple): Punto de salida para el coste de inserción (el depósito)
+        db_file (str): Base de datos de la memoria
+        posiciones (dict): {address: posición en la línea} ya calculadas (procesar_zonas_con_linea)
+
+    Returns:
+        tuple: (zonas_ordenadas, {zona: {'conocidas', 'nuevas'}} de las zonas que usaron la memoria)
+    """
+    if lineas_por_zona is None:
+        lineas_por_zona = ZONE_ROUTE_LINES
+
+    con_memoria = {}
+    sin_memoria = {}
+    estadisticas = {}
+    for zona, items in zonas_dict.items():
+        aprendidas = posiciones_aprendidas(zona, [item[1] for item in items], db_file)
+        if len(aprendidas) < ROUTE_MEMORY_MIN_CONOCIDAS:
+            sin_memoria[zona] = items
+            continue
+
+        # Orden estable: las empatadas conservan el orden de entrada
+        conocidas = sorted((item for item in items if item[1] in aprendidas), key=lambda item: aprendidas[item[1]])
+        nuevas = [item for item in items if item[1] not in aprendidas]
+        ruta = RutaInsercion(conocidas, lineas_por_zona.get(zona, []), inicio)
+        ruta.insertar_varias(nuevas)
+        con_memoria[zona] = ruta.items
+        estadisticas[zona] = {'conocidas': len(conocidas), 'nuevas': len(nuevas)}
+
+    ordenadas = procesar_zonas_con_linea(sin_memoria, lineas_por_zona, posiciones) if sin_memoria else {}
+    ordenadas.update(con_memoria)
+    return {zona: ordenadas[zona] for zona in zonas_dict}, estadisticas
+
+
+def ordenar_zonas(zonas_dict, lineas_por_zona=None, inicio=DEPOT_COORDS, db_file=RESULTS_DB_FILE, posiciones=None):
+    """
+    Etapa de ordenación común a procesar_rutas y al modo fichero: memoria de
+    rutas (ROUTE_MEMORY_ACTIVA) o línea de ruta, y después búsqueda local
+    (MEJORA_LOCAL_ACTIVA). La búsqueda local parte del orden de cada zona, también
+    del aprendido, y solo aplica movimientos que acortan la ruta; con
+    MEJORA_LOCAL_CON_MEMORIA = False las zonas con memoria se dejan como salen.
+
+    Args:
+        zonas_dict (dict): {zona: [(coords, address, codigos), ...]}
+        lineas_por_zona (dict): Líneas de ruta; si es None, ZONE_ROUTE_LINES
+        inicio (tuple): Punto de salida (el depósito)
+        db_file (str): Base de datos de la memoria
+        posiciones (dict): {address: posición en la línea} ya calculadas (GeometriaCacheada)
+
+    Returns:
+        tuple: (zonas_ordenadas, {zona: {'conocidas', 'nuevas'}} de las zonas con memoria,
+                {zona: {'antes_m', 'despues_m', 'movimientos'}} de la búsqueda local)
+    """
+    if ROUTE_MEMORY_ACTIVA:
+        # Paradas habituales en el orden aprendido; solo se colocan las nuevas
+        zonas_ordenadas, con_memoria = ordenar_con_memoria(zonas_dict, lineas_por_zona, inicio, db_file, posiciones)
+        for zona, n in con_memoria.items():
+            print(f"  🧭 {zona}: {n['conocidas']} paradas en el orden aprendido, {n['nuevas']} nuevas insertadas")
+    else:
+        con_memoria = {}
+        zonas_ordenadas = procesar_zonas_con_linea(zonas_dict, lineas_por_zona, posiciones)
+
+    mejora_local = {}
+    if MEJORA_LOCAL_ACTIVA:
+        # 2-opt / Or-opt partiendo del orden por línea o del aprendido
+        zonas = [z for z in zonas_ordenadas if MEJORA_LOCAL_CON_MEMORIA or z not in con_memoria]
+        with etapa('mejora_local'):
+            zonas_ordenadas, mejora_local = mejorar_zonas(zonas_ordenadas, inicio, zonas)
+    return zonas_ordenadas, con_memoria, mejora_local
@@ -1,49 +1,178 @@
 """
 Módulo para gestión de Google Sheets
+
+BaseSheetsManager contiene la lógica de lectura y escritura de la hoja;
+SheetsManager la implementa sobre la API de Google Sheets y
+local_sheets.LocalSheetsManager sobre una hoja en memoria / CSV.
 """
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+import hashlib
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+import config
+from cassette import cassette_activo
+from instrumentation import etapa, contar
 from config import SCOPES, KEY_FILE, SPREADSHEET_ID
 
+# Reintentos ante errores transitorios (429 y 5xx) con backoff exponencial
+SHEETS_NUM_RETRIES = getattr(config, 'SHEETS_NUM_RETRIES', 5)
 
-class SheetsManager:
-    """Clase para gestionar operaciones con Google Sheets"""
+# Hoja con los datos de entrada y resultados, y filas leídas por petición
+HOJA_DATOS = 'Hoja 1'
+SHEETS_PAGE_SIZE = getattr(config, 'SHEETS_PAGE_SIZE', 500)
+
+# Documento discovery de la API cacheado en disco (evita descargarlo/parsearlo de nuevo)
+DISCOVERY_CACHE_FILE = getattr(config, 'SHEETS_DISCOVERY_CACHE_FILE', 'sheets_v4_discovery.json')
+DISCOVERY_URL = 'https://sheets.googleapis.com/$discovery/rest?version=v4'
+SHEETS_HTTP_TIMEOUT = getattr(config, 'SHEETS_HTTP_TIMEOUT', 60)
+
+# Clientes ya creados en este proceso: {(key_file, spreadsheet_id): (creds, service)}
+# Uno por spreadsheet: httplib2 no es seguro entre hilos y multi_tenant.py
+# procesa a la vez hojas con las mismas credenciales
+_clientes = {}
+_clientes_lock = Lock()
+
+# Backend de hojas: 'google' (API real) o 'local' (CSV / memoria, sin red)
+SHEETS_BACKEND = getattr(config, 'SHEETS_BACKEND', 'google')
+LOCAL_SHEET_CSV = getattr(config, 'LOCAL_SHEET_CSV', 'hoja_local.csv')
+LOCAL_SHEET_LATENCY_MS = getattr(config, 'LOCAL_SHEET_LATENCY_MS', 0)
+
+# Columnas de resultados por zona: (direcciones, códigos) y no encontradas
+COLUMNAS_RESULTADOS = {
+    'Indust': ('g2', 'h2'),
+    'Centre': ('j2', 'k2'),
+    'Mirasol': ('m2', 'n2'),
+    'sin_zona': ('p2', 'q2')
+}
+COLUMNA_NO_ENCONTRADAS = 'q2'
+
+
+def _cargar_documento_discovery():
+    """
+    Obtiene el documento discovery de Sheets v4: del caché en disco, del que
+    incluye googleapiclient o, en último caso, descargándolo. Lo guarda en disco.
     
-    def __init__(self, key_file=KEY_FILE, spreadsheet_id=SPREADSHEET_ID):
-        """
-        Inicializa el gestor de Google Sheets.
+    Returns:
+        str: Documento discovery (JSON)
+    """
+    if os.path.exists(DISCOVERY_CACHE_FILE):
+        with open(DISCOVERY_CACHE_FILE, 'r', encoding='utf-8') as f:
+            return f.read()
+    
+    documento = None
+    try:
+        from googleapiclient.discovery_cache import get_static_doc
+        documento = get_static_doc('sheets', 'v4')
+    except ImportError:
+        pass
+    
+    if documento is None:
+        import requests
+        response = requests.get(DISCOVERY_URL, timeout=SHEETS_HTTP_TIMEOUT)
+        response.raise_for_status()
+        documento = response.text
+    
+    try:
+        with open(DISCOVERY_CACHE_FILE, 'w', encoding='utf-8') as f:
+            f.write(documento)
+    except OSError as e:
+        print(f"  ⚠️ No se pudo guardar el documento discovery: {e}")
+    
+    return documento
+
+
+def _crear_cliente(key_file, spreadsheet_id=None):
+    """
+    Crea credenciales y servicio de Sheets con un cliente HTTP autorizado
+    reutilizable (keep-alive). Se crea una sola vez por key_file, spreadsheet y proceso.
+    
+    Returns:
+        tuple: (creds, service, tiempos) donde tiempos indica los segundos de
+               cada paso (0 si el cliente ya existía)
+    """
+    with _clientes_lock:
+        clave = (key_file, spreadsheet_id)
+        if clave in _clientes:
+            creds, service = _clientes[clave]
+            return creds, service, {'credenciales': 0.0, 'cliente': 0.0, 'reutilizado': True}
         
-        Args:
-            key_file (str): Ruta al archivo de credenciales JSON
-            spreadsheet_id (str): ID del spreadsheet de Google Sheets
-        """
-        self.spreadsheet_id = spreadsheet_id
-        self.creds = service_account.Credentials.from_service_account_file(
+        import httplib2
+        from google.oauth2 import service_account
+        from google_auth_httplib2 import AuthorizedHttp
+        from googleapiclient.discovery import build_from_document
+        
+        inicio = time.perf_counter()
+        creds = service_account.Credentials.from_service_account_file(
             key_file, 
             scopes=SCOPES
         )
-        self.service = build('sheets', 'v4', credentials=self.creds)
-        self.sheet = self.service.spreadsheets()
+        t_credenciales = time.perf_counter() - inicio
+        
+        inicio = time.perf_counter()
+        http = AuthorizedHttp(creds, http=httplib2.Http(timeout=SHEETS_HTTP_TIMEOUT))
+        service = build_from_document(_cargar_documento_discovery(), http=http)
+        t_cliente = time.perf_counter() - inicio
+        
+        _clientes[clave] = (creds, service)
+        return creds, service, {'credenciales': t_credenciales, 'cliente': t_cliente, 'reutilizado': False}
+
+
+def _crear_cliente_sin_red():
+    """
+    Servicio de Sheets sin credenciales para reproducir un cassette: construye
+    las peticiones igual que el real, pero nunca se ejecutan contra la API.
+    """
+    import httplib2
+    from googleapiclient.discovery import build_from_document
     
-    def leer_columna(self, rango):
+    service = build_from_document(_cargar_documento_discovery(), http=httplib2.Http())
+    return None, service, {'credenciales': 0.0, 'cliente': 0.0, 'reutilizado': False}
+
+
+def es_fila_excluida(columna_d):
+    """True si la columna D marca la fila como Q-PRINTING (case-insensitive)."""
+    return 'Q-PRINTING' in str(columna_d).upper()
+
+
+def huella_fila(codigo, columna_d, direccion):
+    """Huella de una fila de entrada (código + columna D + dirección)."""
+    return hashlib.sha1(f"{codigo}\x1f{columna_d}\x1f{direccion}".encode('utf-8')).hexdigest()
+
+
+def columna_completa(celda):
+    """Convierte una celda inicial ('g2') en el rango hasta el final de la hoja ('g2:g')."""
+    letras = celda.rstrip('0123456789')
+    return f'{celda}:{letras}'
+
+
+class BaseSheetsManager(ABC):
+    """
+    Operaciones de alto nivel sobre la hoja (lectura de direcciones, escritura
+    de resultados). Las subclases implementan las primitivas de acceso:
+    leer_rango_filas, escribir_columna, escribir_rangos, limpiar_rangos y
+    obtener_num_filas.
+    """
+    
+    def __init__(self):
+        self.ultima_fila = None  # Última fila con datos vista en la última lectura
+        self.huellas = []  # Huella de cada dirección devuelta en la última lectura
+    
+    @abstractmethod
+    def leer_rango_filas(self, rango):
         """
-        Lee valores de una columna del spreadsheet.
+        Lee valores de un rango de filas completo (múltiples columnas).
         
         Args:
-            rango (str): Rango en formato 'Hoja!A1:A100'
+            rango (str): Rango en formato 'Hoja!A1:E100'
             
         Returns:
-            list: Lista de valores (una sola columna)
+            list: Lista de listas con los valores de cada fila
         """
-        result = self.sheet.values().get(
-            spreadsheetId=self.spreadsheet_id,
-            range=rango
-        ).execute()
-        
-        values = result.get('values', [])
-        # Aplanar lista si es necesario
-        return [item[0] for item in values if item]
     
+    @abstractmethod
     def escribir_columna(self, rango, datos):
         """
         Escribe valores en una columna del spreadsheet.
@@ -55,48 +184,69 @@ class SheetsManager:
         Returns:
             dict: Resultado de la operación
         """
-        # Convertir lista simple a lista de listas para formato de Sheets
-        if datos and not isinstance(datos[0], list):
-            datos = [[item] for item in datos]
-        
-        result = self.sheet.values().update(
-            spreadsheetId=self.spreadsheet_id,
-            range=rango,
-            valueInputOption='USER_ENTERED',
-            body={'values': datos}
-        ).execute()
+    
+    @abstractmethod
+    def escribir_rangos(self, datos_por_rango):
+        """
+        Escribe varios rangos en una sola petición (values.batchUpdate).
         
-        return result
+        Args:
+            datos_por_rango (list): Lista de tuplas (rango, datos) donde datos es
+                                    una lista simple (una columna) o lista de listas
+            
+        Returns:
+            dict: Resultado de la operación o None si no hay nada que escribir
+        """
     
-    def leer_rango_filas(self, rango):
+    @abstractmethod
+    def limpiar_rangos(self, rangos):
         """
-        Lee valores de un rango de filas completo (múltiples columnas).
+        Limpia varios rangos en una sola petición (values.batchClear).
         
         Args:
-            rango (str): Rango en formato 'Hoja!A1:E100'
+            rangos (list): Lista de rangos en formato 'Hoja!A1:A100'
             
         Returns:
-            list: Lista de listas con los valores de cada fila
+            dict: Resultado de la operación o None si no hay rangos
         """
-        result = self.sheet.values().get(
-            spreadsheetId=self.spreadsheet_id,
-            range=rango
-        ).execute()
+    
+    @abstractmethod
+    def obtener_num_filas(self, hoja=HOJA_DATOS):
+        """
+        Obtiene el número de filas de la hoja (solo metadatos, sin leer valores).
         
-        return result.get('values', [])
+        Args:
+            hoja (str): Nombre de la hoja
+            
+        Returns:
+            int: Número de filas de la cuadrícula
+        """
     
-    def leer_direcciones_completas(self):
+    def leer_columna(self, rango):
         """
-        Lee direcciones completas de la columna E, códigos de barras de columna A,
-        y columna D para filtrar filas que contengan 'Q-PRINTING'.
+        Lee valores de una columna del spreadsheet.
         
+        Args:
+            rango (str): Rango en formato 'Hoja!A1:A100'
+            
         Returns:
-            tuple: (direcciones_completas, codigos_barras, filas_eliminadas)
-                   filas_eliminadas es una lista de tuplas (fila_num, codigo, texto_d)
+            list: Lista de valores (una sola columna)
         """
-        # Leer columnas A, D y E de una vez (A=códigos, D=filtro, E=direcciones)
-        filas = self.leer_rango_filas('Hoja 1!a2:e1000')
+        values = self.leer_rango_filas(rango)
+        # Aplanar lista si es necesario
+        return [item[0] for item in values if item]
+    
+    def _filtrar_filas(self, filas, fila_inicio):
+        """
+        Extrae direcciones y códigos de un bloque de filas, descartando Q-PRINTING.
         
+        Args:
+            filas (list): Filas leídas (columnas A-E)
+            fila_inicio (int): Número de fila de la hoja de la primera fila del bloque
+            
+        Returns:
+            tuple: (direcciones, codigos_barras, filas_eliminadas)
+        """
         direcciones = []
         codigos_barras = []
         filas_eliminadas = []
@@ -108,43 +258,109 @@ class SheetsManager:
             direccion = fila[4] if len(fila) > 4 else ''  # Columna E (índice 4)
             
             # Verificar si contiene Q-PRINTING (case-insensitive)
-            if 'Q-PRINTING' in str(columna_d).upper():
-                filas_eliminadas.append((i + 2, codigo, columna_d))  # +2 porque empezamos en fila 2
+            if es_fila_excluida(columna_d):
+                filas_eliminadas.append((fila_inicio + i, codigo, columna_d))
                 continue
             
             # Solo añadir si hay dirección
             if direccion:
                 direcciones.append(direccion)
                 codigos_barras.append(codigo)
+                self.huellas.append(huella_fila(codigo, columna_d, direccion))
         
+        contar('sheets.filas_leidas', len(filas))
+        contar('sheets.filas_excluidas', len(filas_eliminadas))
         return direcciones, codigos_barras, filas_eliminadas
     
-    def escribir_resultados_por_zona(self, zonas_ordenadas, columnas_destino=None, excluir_inicio_fin=True):
+    def huella_entrada(self, hoja=HOJA_DATOS):
         """
-        Escribe los resultados ordenados en columnas por zona.
-        Ahora escribe direcciones y códigos de barras en columnas separadas.
+        Huella de las columnas de entrada (A-E) para detectar cambios con una sola
+        lectura. Las columnas de resultados no cuentan: escribirlas no la cambia.
         
         Args:
-            zonas_ordenadas (dict): Diccionario con datos ordenados por zona
-                                    Cada item es (coords, address, codigos_barras)
-            columnas_destino (dict): Diccionario {zona: (col_dir, col_codigos)} 
-                                     ej: {'Indust': ('i2', 'j2')}
-                                     Si es None, usa las columnas por defecto
-            excluir_inicio_fin (bool): Si True, excluye el primer y último punto (depósito)
-                                       Si False, incluye todos los puntos
+            hoja (str): Nombre de la hoja
+            
+        Returns:
+            str: sha1 del contenido de A2:E
+        """
+        filas = self.leer_rango_filas(f'{hoja}!a2:e')
+        return hashlib.sha1(json.dumps(filas, ensure_ascii=False).encode('utf-8')).hexdigest()
+    
+    def _leer_pagina(self, fila_inicio, tam_pagina, hoja=HOJA_DATOS):
+        """Lee las columnas A-E de un bloque de filas."""
+        fila_fin = fila_inicio + tam_pagina - 1
+        return self.leer_rango_filas(f'{hoja}!a{fila_inicio}:e{fila_fin}')
+    
+    def iterar_direcciones_por_paginas(self, tam_pagina=SHEETS_PAGE_SIZE, hoja=HOJA_DATOS):
+        """
+        Lee la hoja completa (desde la fila 2) en páginas de tam_pagina filas.
+        La siguiente página se descarga en segundo plano mientras se procesa la actual,
+        así el procesamiento empieza antes de que llegue la última página.
+        
+        Args:
+            tam_pagina (int): Filas por petición
+            hoja (str): Nombre de la hoja
+            
+        Yields:
+            tuple: (direcciones, codigos_barras, filas_eliminadas) de cada página
+        """
+        num_filas = self.obtener_num_filas(hoja)
+        self.ultima_fila = 1
+        self.huellas = []
+        
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            fila_inicio = 2
+            futuro = executor.submit(self._leer_pagina, fila_inicio, tam_pagina, hoja) if num_filas >= 2 else None
+            
+            while futuro is not None:
+                filas = futuro.result()
+                
+                # Prefetch de la siguiente página
+                siguiente = fila_inicio + tam_pagina
+                futuro = executor.submit(self._leer_pagina, siguiente, tam_pagina, hoja) if siguiente <= num_filas else None
+                
+                # Página en blanco (p. ej. filas vaciadas a mano): los datos pueden seguir
+                # más abajo, hasta el final de la cuadrícula
+                if filas:
+                    self.ultima_fila = fila_inicio + len(filas) - 1
+                    yield self._filtrar_filas(filas, fila_inicio)
+                fila_inicio = siguiente
+    
+    def leer_direcciones_completas(self, tam_pagina=SHEETS_PAGE_SIZE):
+        """
+        Lee direcciones completas de la columna E, códigos de barras de columna A,
+        y columna D para filtrar filas que contengan 'Q-PRINTING'.
+        Lee todas las filas de la hoja, por páginas.
+        
+        Args:
+            tam_pagina (int): Filas por petición
         
         Returns:
-            dict: Resultado de las operaciones de escritura
+            tuple: (direcciones_completas, codigos_barras, filas_eliminadas)
+                   filas_eliminadas es una lista de tuplas (fila_num, codigo, texto_d)
+        """
+        direcciones = []
+        codigos_barras = []
+        filas_eliminadas = []
+        
+        for dirs_pagina, codigos_pagina, eliminadas_pagina in self.iterar_direcciones_por_paginas(tam_pagina):
+            direcciones.extend(dirs_pagina)
+            codigos_barras.extend(codigos_pagina)
+            filas_eliminadas.extend(eliminadas_pagina)
+        
+        return direcciones, codigos_barras, filas_eliminadas
+    
+    def _rangos_resultados_por_zona(self, zonas_ordenadas, columnas_destino=None, excluir_inicio_fin=True):
+        """
+        Prepara los rangos de direcciones y códigos de cada zona sin escribirlos.
+        
+        Returns:
+            list: Lista de tuplas (rango, datos) para escribir_rangos
         """
         if columnas_destino is None:
-            columnas_destino = {
-                'Indust': ('g2', 'h2'),
-                'Centre': ('j2', 'k2'),
-                'Mirasol': ('m2', 'n2'),
-                'sin_zona': ('p2', 'q2')
-            }
+            columnas_destino = COLUMNAS_RESULTADOS
         
-        resultados = {}
+        rangos = []
         
         for zona_name, items in zonas_ordenadas.items():
             if zona_name in columnas_destino and items:
@@ -175,17 +391,68 @@ class SheetsManager:
                         # Unir múltiples códigos de barras con coma
                         codigos.append(', '.join(str(c) for c in codigos_barras) if codigos_barras else '')
                     
-                    # Escribir direcciones
-                    result_dir = self.escribir_columna(col_dir, direcciones)
-                    # Escribir códigos de barras
-                    result_cod = self.escribir_columna(col_codigos, codigos)
-                    
-                    resultados[zona_name] = {'direcciones': result_dir, 'codigos': result_cod}
+                    rangos.append((col_dir, direcciones))
+                    rangos.append((col_codigos, codigos))
                     print(f"  ✓ Zona {zona_name}: {len(direcciones)} direcciones en {col_dir}, códigos en {col_codigos}")
         
-        return resultados
+        return rangos
+    
+    def escribir_resultados_por_zona(self, zonas_ordenadas, columnas_destino=None, excluir_inicio_fin=True):
+        """
+        Escribe los resultados ordenados en columnas por zona.
+        Escribe direcciones y códigos de barras en columnas separadas,
+        todas las zonas en una sola petición a la API.
+        
+        Args:
+            zonas_ordenadas (dict): Diccionario con datos ordenados por zona
+                                    Cada item es (coords, address, codigos_barras)
+            columnas_destino (dict): Diccionario {zona: (col_dir, col_codigos)} 
+                                     ej: {'Indust': ('i2', 'j2')}
+                                     Si es None, usa las columnas por defecto
+            excluir_inicio_fin (bool): Si True, excluye el primer y último punto (depósito)
+                                       Si False, incluye todos los puntos
+        
+        Returns:
+            dict: Resultado de la operación batchUpdate (None si no hay datos)
+        """
+        rangos = self._rangos_resultados_por_zona(zonas_ordenadas, columnas_destino, excluir_inicio_fin)
+        return self.escribir_rangos(rangos)
     
-    def escribir_no_encontradas(self, not_found_addresses, rango='q2'):
+    def escribir_fase_resultados(self, zonas_ordenadas, not_found_addresses, columnas_destino=None,
+                                 excluir_inicio_fin=True, columnas_limpiar=None,
+                                 rango_no_encontradas=COLUMNA_NO_ENCONTRADAS):
+        """
+        Fase completa de escritura: limpia las columnas de resultados y escribe
+        zonas y no encontradas. Siempre son dos peticiones (batchClear + batchUpdate),
+        independientemente del número de zonas.
+        
+        Args:
+            zonas_ordenadas (dict): Diccionario con datos ordenados por zona
+            not_found_addresses (list): Lista de direcciones no encontradas
+            columnas_destino (dict): Ver escribir_resultados_por_zona
+            excluir_inicio_fin (bool): Ver escribir_resultados_por_zona
+            columnas_limpiar (list): Ver limpiar_columnas_resultados
+            rango_no_encontradas (str): Rango inicial de las no encontradas.
+                                        Si es None, no se escriben las no encontradas
+            
+        Returns:
+            dict: Resultado de la operación batchUpdate (None si no hay datos)
+        """
+        self.limpiar_columnas_resultados(columnas_limpiar)
+        
+        rangos = self._rangos_resultados_por_zona(zonas_ordenadas, columnas_destino, excluir_inicio_fin)
+        if rango_no_encontradas is None:
+            pass
+        elif not_found_addresses:
+            rangos.append((f'{HOJA_DATOS}!{rango_no_encontradas}', not_found_addresses))
+            print(f"  ⚠ {len(not_found_addresses)} direcciones no encontradas escritas en {rango_no_encontradas}")
+        else:
+            print("  ✓ Todas las direcciones fueron geocodificadas correctamente")
+        
+        contar('sheets.filas_escritas', sum(len(datos) for _, datos in rangos))
+        return self.escribir_rangos(rangos)
+    
+    def escribir_no_encontradas(self, not_found_addresses, rango=COLUMNA_NO_ENCONTRADAS):
         """
         Escribe las direcciones que no se pudieron geocodificar.
         
@@ -200,7 +467,7 @@ class SheetsManager:
             print("  ✓ Todas las direcciones fueron geocodificadas correctamente")
             return None
         
-        result = self.escribir_columna(f'Hoja 1!{rango}', not_found_addresses)
+        result = self.escribir_columna(f'{HOJA_DATOS}!{rango}', not_found_addresses)
         print(f"  ⚠ {len(not_found_addresses)} direcciones no encontradas escritas en {rango}")
         
         return result
@@ -210,30 +477,193 @@ class SheetsManager:
         Limpia las columnas de resultados antes de escribir nuevos datos.
         
         Args:
-            columnas (list): Lista de rangos a limpiar ej: ['d2:d1000', 'e2:e1000']
+            columnas (list): Lista de rangos a limpiar ej: ['d2:d', 'e2:e']
+                             (sin fila final = hasta el final de la hoja)
         """
         if columnas is None:
             # Columnas: F-G (Indust), I-J (Centre), L-M (Mirasol), O-P (sin_zona), Q (No encontradas)
-            columnas = ['g2:g1000', 'h2:h1000', 'j2:j1000', 'k2:k1000', 'm2:m1000', 'n2:n1000', 'p2:p1000', 'q2:q1000']
+            columnas = [columna_completa(c) for cols in COLUMNAS_RESULTADOS.values() for c in cols]
         
-        for columna in columnas:
-            self.sheet.values().clear(
-                spreadsheetId=self.spreadsheet_id,
-                range=f'Hoja 1!{columna}'
-            ).execute()
+        self.limpiar_rangos([f'{HOJA_DATOS}!{columna}' for columna in columnas])
         
         print(f"  ✓ Columnas de resultados limpiadas: {', '.join(columnas)}")
 
 
-def crear_manager_sheets(key_file=KEY_FILE, spreadsheet_id=SPREADSHEET_ID):
+class SheetsManager(BaseSheetsManager):
+    """Clase para gestionar operaciones con Google Sheets"""
+    
+    def __init__(self, key_file=KEY_FILE, spreadsheet_id=SPREADSHEET_ID, num_retries=SHEETS_NUM_RETRIES):
+        """
+        Inicializa el gestor de Google Sheets.
+        
+        Args:
+            key_file (str): Ruta al archivo de credenciales JSON
+            spreadsheet_id (str): ID del spreadsheet de Google Sheets
+            num_retries (int): Reintentos ante errores transitorios de la API
+        """
+        super().__init__()
+        self.spreadsheet_id = spreadsheet_id
+        self.num_retries = num_retries
+        cassette = cassette_activo()
+        if cassette is not None and cassette.reproduciendo:
+            self.creds, self.service, self.tiempos_conexion = _crear_cliente_sin_red()
+        else:
+            self.creds, self.service, self.tiempos_conexion = _crear_cliente(key_file, spreadsheet_id)
+        self.sheet = self.service.spreadsheets()
+    
+    def calentar(self):
+        """
+        Obtiene el token de acceso por adelantado para que la primera petición
+        no pague la autenticación. Guarda el tiempo en tiempos_conexion['token'].
+        """
+        from google.auth.transport.requests import Request
+        
+        if self.creds is None:  # Reproducción de un cassette: sin autenticación
+            self.tiempos_conexion['token'] = 0.0
+            return self.tiempos_conexion
+        
+        inicio = time.perf_counter()
+        if not self.creds.valid:
+            self.creds.refresh(Request())
+        self.tiempos_conexion['token'] = time.perf_counter() - inicio
+        return self.tiempos_conexion
+    
+    def _ejecutar(self, nombre, peticion):
+        """
+        Ejecuta una petición a la API con reintentos, midiendo tiempo y llamadas.
+        Con un cassette activo la petición se graba o se reproduce (ver cassette.py).
+        """
+        with etapa(f'sheets_api.{nombre}'):
+            contar('sheets.llamadas')
+            cassette = cassette_activo()
+            if cassette is not None:
+                return cassette.sheets(nombre, peticion, lambda: peticion.execute(num_retries=self.num_retries))
+            return peticion.execute(num_retries=self.num_retries)
+    
+    def leer_rango_filas(self, rango):
+        """
+        Lee valores de un rango de filas completo (múltiples columnas).
+        
+        Args:
+            rango (str): Rango en formato 'Hoja!A1:E100'
+            
+        Returns:
+            list: Lista de listas con los valores de cada fila
+        """
+        result = self._ejecutar('leer_rango_filas', self.sheet.values().get(
+            spreadsheetId=self.spreadsheet_id,
+            range=rango
+        ))
+        
+        return result.get('values', [])
+    
+    def escribir_columna(self, rango, datos):
+        """
+        Escribe valores en una columna del spreadsheet.
+        
+        Args:
+            rango (str): Rango inicial en formato 'Hoja!A1' o 'A1'
+            datos (list): Lista de valores a escribir
+            
+        Returns:
+            dict: Resultado de la operación
+        """
+        # Convertir lista simple a lista de listas para formato de Sheets
+        if datos and not isinstance(datos[0], list):
+            datos = [[item] for item in datos]
+        
+        result = self._ejecutar('escribir_columna', self.sheet.values().update(
+            spreadsheetId=self.spreadsheet_id,
+            range=rango,
+            valueInputOption='USER_ENTERED',
+            body={'values': datos}
+        ))
+        
+        return result
+    
+    def escribir_rangos(self, datos_por_rango):
+        """
+        Escribe varios rangos en una sola petición (values.batchUpdate).
+        
+        Args:
+            datos_por_rango (list): Lista de tuplas (rango, datos) donde datos es
+                                    una lista simple (una columna) o lista de listas
+            
+        Returns:
+            dict: Resultado de la operación o None si no hay nada que escribir
+        """
+        data = []
+        for rango, datos in datos_por_rango:
+            if not datos:
+                continue
+            if not isinstance(datos[0], list):
+                datos = [[item] for item in datos]
+            data.append({'range': rango, 'values': datos})
+        
+        if not data:
+            return None
+        
+        return self._ejecutar('escribir_rangos', self.sheet.values().batchUpdate(
+            spreadsheetId=self.spreadsheet_id,
+            body={'valueInputOption': 'USER_ENTERED', 'data': data}
+        ))
+    
+    def limpiar_rangos(self, rangos):
+        """
+        Limpia varios rangos en una sola petición (values.batchClear).
+        
+        Args:
+            rangos (list): Lista de rangos en formato 'Hoja!A1:A100'
+            
+        Returns:
+            dict: Resultado de la operación o None si no hay rangos
+        """
+        if not rangos:
+            return None
+        
+        return self._ejecutar('limpiar_rangos', self.sheet.values().batchClear(
+            spreadsheetId=self.spreadsheet_id,
+            body={'ranges': list(rangos)}
+        ))
+    
+    def obtener_num_filas(self, hoja=HOJA_DATOS):
+        """
+        Obtiene el número de filas de la hoja (solo metadatos, sin leer valores).
+        
+        Args:
+            hoja (str): Nombre de la hoja
+            
+        Returns:
+            int: Número de filas de la cuadrícula
+        """
+        meta = self._ejecutar('obtener_num_filas', self.sheet.get(
+            spreadsheetId=self.spreadsheet_id,
+            ranges=[hoja],
+            fields='sheets.properties.gridProperties.rowCount'
+        ))
+        
+        return meta['sheets'][0]['properties']['gridProperties']['rowCount']
+
+
+def crear_manager_sheets(key_file=KEY_FILE, spreadsheet_id=SPREADSHEET_ID, backend=None, hoja_local=None):
     """
-    Función auxiliar para crear un SheetsManager.
+    Función auxiliar para crear el gestor de hojas según la configuración.
     
     Args:
         key_file (str): Ruta al archivo de credenciales
         spreadsheet_id (str): ID del spreadsheet
+        backend (str): 'google' o 'local'. Si es None, usa SHEETS_BACKEND de config
+        hoja_local (str): CSV del backend 'local'. Si es None, usa LOCAL_SHEET_CSV
         
     Returns:
-        SheetsManager: Instancia del gestor
+        BaseSheetsManager: SheetsManager o LocalSheetsManager
     """
-    return SheetsManager(key_file, spreadsheet_id)
+    backend = backend or SHEETS_BACKEND
+    
+    if backend == 'local':
+        from local_sheets import LocalSheetsManager
+        return LocalSheetsManager(hoja_local or LOCAL_SHEET_CSV, latencia_ms=LOCAL_SHEET_LATENCY_MS)
+    if backend == 'google':
+        return SheetsManager(key_file, spreadsheet_id)
+    
+    raise ValueError(f"Backend de hojas desconocido: {backend!r} (usa 'google' o 'local')")
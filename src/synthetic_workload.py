@@ -0,0 +1,235 @@
+"""
+Generador de cargas sintéticas para los benchmarks (ver benchmark.py)
+
+Construye un día de trabajo ficticio pero realista a partir de los datos del
+repositorio:
+- Calles reales de data/carrers_SantCugat.csv con número de portal
+- Variantes "sucias" como las que escriben los clientes (abreviaturas, sin
+  acentos, minúsculas, piso y puerta, espacios de más, letras cambiadas)
+- Códigos de barras únicos y direcciones repetidas (varios paquetes por parada)
+- Coordenadas dentro de los polígonos de data/Poligons i Rutes-*, más una
+  parte fuera de todas las zonas
+
+La misma semilla produce siempre la misma carga.
+"""
+import csv
+import random
+import re
+from pathlib import Path
+
+import numpy as np
+from shapely.geometry import Point, Polygon
+from shapely.prepared import prep
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+
+# Zona interna → sufijo de los CSV de data/ ('Poligons i Rutes- Poligon <sufijo>.csv')
+ZONAS_CSV = {'Indust': 'Fabriques', 'Centre': 'centre', 'Mirasol': 'Mirasol'}
+ZONAS_LINEAS_CSV = {'Indust': 'Fabriques', 'Centre': 'Centre', 'Mirasol': 'Mirasol'}
+
+CIUDAD = 'SANT CUGAT DEL VALLES'
+CODIGO_POSTAL = '08173'
+
+# Formas en que los clientes escriben el tipo de vía
+ABREVIATURAS = {
+    'CARRER': ['C/', 'C/ ', 'CL', 'CALLE', 'CARRER DE', 'c.'],
+    'AVINGUDA': ['AV.', 'AVDA', 'AVENIDA', 'AV'],
+    'PLAÇA': ['PL.', 'PLAZA', 'PLACA', 'PZA'],
+    'PASSEIG': ['PG.', 'PASEO', 'PSG'],
+    'PASSATGE': ['PTGE.', 'PASAJE'],
+    'RAMBLA': ['RBLA.', 'RBLA'],
+    'CAMI': ['CAMINO', 'CAMÍ'],
+    'CARRETERA': ['CTRA.', 'CTRA'],
+}
+SIN_ACENTOS = str.maketrans('ÀÁÈÉÍÒÓÚÜÇàáèéíòóúüç', 'AAEEIOOUUCaaeeiooouc')
+
+_WKT_PUNTO = re.compile(r'POINT \(([-\d.]+) ([-\d.]+)\)')
+
+
+def _leer_puntos_wkt(path):
+    """Lee un CSV con columna WKT 'POINT (lon lat)' y devuelve [(lat, lon), ...]."""
+    puntos = []
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        for fila in csv.DictReader(f):
+            coincidencia = _WKT_PUNTO.match(fila['WKT'])
+            if coincidencia:
+                lon, lat = float(coincidencia.group(1)), float(coincidencia.group(2))
+                puntos.append((lat, lon))
+    return puntos
+
+
+def cargar_poligonos():
+    """
+    Returns:
+        dict: {zona: [(lat, lon), ...]} desde data/Poligons i Rutes- Poligon *.csv
+    """
+    return {
+        zona: _leer_puntos_wkt(DATA_DIR / f"Poligons i Rutes- Poligon {sufijo}.csv")
+        for zona, sufijo in ZONAS_CSV.items()
+    }
+
+
+def cargar_lineas():
+    """
+    Returns:
+        dict: {zona: [(lat, lon), ...]} desde data/Poligons i Rutes- Linea *.csv
+    """
+    return {
+        zona: _leer_puntos_wkt(DATA_DIR / f"Poligons i Rutes- Linea {sufijo}.csv")
+        for zona, sufijo in ZONAS_LINEAS_CSV.items()
+    }
+
+
+def cargar_calles():
+    """
+    Returns:
+        list: Tuplas (tipo de vía, nombre) de data/carrers_SantCugat.csv
+    """
+    with open(DATA_DIR / "carrers_SantCugat.csv", 'r', encoding='utf-8-sig', newline='') as f:
+        return [(fila['TIPUS_VIA'].strip(), fila['CARRER'].strip()) for fila in csv.DictReader(f)]
+
+
+def ensuciar_direccion(tipo, calle, numero, rng):
+    """
+    Escribe una dirección como podría llegar en la columna E.
+
+    Args:
+        tipo (str): Tipo de vía ('CARRER', 'PLAÇA'...)
+        calle (str): Nombre de la calle
+        numero (int): Número de portal
+        rng (random.Random): Generador aleatorio
+
+    Returns:
+        str: Dirección con ruido
+    """
+    tipo_escrito = rng.choice(ABREVIATURAS.get(tipo, [tipo]) + [tipo])
+    partes = [tipo_escrito, calle, str(numero)]
+
+    if rng.random() < 0.3:
+        partes.append(rng.choice([f"{rng.randint(1, 6)}º {rng.randint(1, 4)}ª", 'BAJOS', 'ATICO', 'LOCAL']))
+    if rng.random() < 0.4:
+        partes.append(rng.choice([CIUDAD, 'SANT CUGAT', 'ST CUGAT', f"{CODIGO_POSTAL} {CIUDAD}"]))
+
+    texto = ' '.join(partes)
+    if rng.random() < 0.5:
+        texto = texto.translate(SIN_ACENTOS)
+    if rng.random() < 0.3:
+        texto = texto.lower()
+    if rng.random() < 0.2:
+        texto = texto.replace(' ', '  ', 1)
+    if rng.random() < 0.1 and len(texto) > 6:
+        # Dos letras cambiadas de sitio
+        i = rng.randrange(len(texto) - 1)
+        texto = texto[:i] + texto[i + 1] + texto[i] + texto[i + 2:]
+    return texto
+
+
+def _puntos_en_poligono(poligono, n, rng_np):
+    """Muestreo por rechazo de n puntos (lat, lon) dentro de un polígono."""
+    forma = Polygon(poligono)
+    preparado = prep(forma)
+    min_lat, min_lon, max_lat, max_lon = forma.bounds
+    puntos = []
+    while len(puntos) < n:
+        candidatos = rng_np.uniform((min_lat, min_lon), (max_lat, max_lon), size=(max(16, 2 * (n - len(puntos))), 2))
+        puntos.extend((float(lat), float(lon)) for lat, lon in candidatos if preparado.contains(Point(lat, lon)))
+    return puntos[:n]
+
+
+def _puntos_fuera(poligonos, n, rng_np):
+    """n puntos alrededor de las zonas pero fuera de todas ellas ('sin_zona')."""
+    formas = [prep(Polygon(p)) for p in poligonos.values()]
+    todos = np.array([punto for p in poligonos.values() for punto in p])
+    (min_lat, min_lon), (max_lat, max_lon) = todos.min(axis=0) - 0.01, todos.max(axis=0) + 0.01
+    puntos = []
+    while len(puntos) < n:
+        candidatos = rng_np.uniform((min_lat, min_lon), (max_lat, max_lon), size=(max(16, 2 * (n - len(puntos))), 2))
+        puntos.extend(
+            (float(lat), float(lon)) for lat, lon in candidatos
+            if not any(forma.contains(Point(lat, lon)) for forma in formas)
+        )
+    return puntos[:n]
+
+
+def generar_carga(n_paquetes, semilla=0, proporcion_paradas=0.6, proporcion_fuera=0.1):
+    """
+    Genera un día sintético de n_paquetes.
+
+    Args:
+        n_paquetes (int): Número de filas (paquetes)
+        semilla (int): Semilla de los generadores aleatorios
+        proporcion_paradas (float): Paradas únicas / paquetes (el resto son repeticiones)
+        proporcion_fuera (float): Parte de las paradas fuera de todas las zonas
+
+    Returns:
+        dict: {
+            'direcciones_raw': [str] por paquete (columna E),
+            'direcciones_limpias': [str] por paquete (lo que devolvería la limpieza),
+            'codigos': [str] por paquete (columna A),
+            'coordenadas': {dirección limpia: (lat, lon)},
+            'lookup': {clave normalizada: dirección limpia} (como Correccions.csv),
+            'poligonos': {zona: [(lat, lon)]},
+            'lineas': {zona: [(lat, lon)]}
+        }
+    """
+    from address_model_cleaner import _normalizar_key
+
+    rng = random.Random(semilla)
+    rng_np = np.random.default_rng(semilla)
+    calles = cargar_calles()
+    poligonos = cargar_poligonos()
+
+    # Paradas únicas: calle + portal, con coordenadas repartidas entre zonas y fuera
+    n_paradas = max(1, int(n_paquetes * proporcion_paradas))
+    n_fuera = int(n_paradas * proporcion_fuera)
+    por_zona = [(n_paradas - n_fuera) // len(poligonos)] * len(poligonos)
+    por_zona[0] += (n_paradas - n_fuera) - sum(por_zona)
+
+    coords_paradas = []
+    for (zona, poligono), n in zip(poligonos.items(), por_zona):
+        coords_paradas.extend(_puntos_en_poligono(poligono, n, rng_np))
+    coords_paradas.extend(_puntos_fuera(poligonos, n_fuera, rng_np))
+    rng.shuffle(coords_paradas)
+
+    paradas = []
+    vistas = set()
+    for coords in coords_paradas:
+        while True:
+            tipo, calle = rng.choice(calles)
+            numero = rng.randint(1, 150)
+            if (tipo, calle, numero) not in vistas:
+                vistas.add((tipo, calle, numero))
+                break
+        limpia = f"{tipo} {calle} {numero}, {CODIGO_POSTAL} {CIUDAD}"
+        paradas.append((tipo, calle, numero, limpia, coords))
+
+    direcciones_raw, direcciones_limpias, codigos = [], [], []
+    lookup = {}
+    codigos_vistos = set()
+    for i in range(n_paquetes):
+        # Cada parada aparece al menos una vez; las repeticiones se reparten al azar
+        tipo, calle, numero, limpia, _ = paradas[i] if i < len(paradas) else rng.choice(paradas)
+        raw = ensuciar_direccion(tipo, calle, numero, rng)
+        direcciones_raw.append(raw)
+        direcciones_limpias.append(limpia)
+        lookup[_normalizar_key(raw)] = limpia
+
+        codigo = f"{rng.randrange(10 ** 12, 10 ** 13)}"
+        while codigo in codigos_vistos:
+            codigo = f"{rng.randrange(10 ** 12, 10 ** 13)}"
+        codigos_vistos.add(codigo)
+        codigos.append(codigo)
+
+    # Orden de la hoja: paquetes mezclados
+    orden = list(range(n_paquetes))
+    rng.shuffle(orden)
+
+    return {
+        'direcciones_raw': [direcciones_raw[i] for i in orden],
+        'direcciones_limpias': [direcciones_limpias[i] for i in orden],
+        'codigos': [codigos[i] for i in orden],
+        'coordenadas': {parada[3]: parada[4] for parada in paradas},
+        'lookup': lookup,
+        'poligonos': poligonos,
+        'lineas': cargar_lineas()
+    }
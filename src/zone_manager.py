@@ -1,36 +1,112 @@
 """
 Módulo para gestión de zonas geográficas mediante polígonos
 """
-from shapely.geometry import Point, Polygon
-from config import ZONE_POLYGONS, DEPOT_COORDS, DEPOT_ADDRESS
+import hashlib
+import json
 
+import numpy as np
+import shapely
+from shapely import STRtree
+from shapely.geometry import LineString, Point, Polygon
+from shapely.prepared import prep
 
-def determinar_zona(coord):
+import config
+from geocoding import load_cache, save_cache, get_from_cache, get_derivados, add_derivados
+from instrumentation import contar
+from line_distance_solver import posiciones_en_ruta, RADIO_TIERRA_M
+from config import ZONE_POLYGONS, ZONE_ROUTE_LINES, DEPOT_COORDS, DEPOT_ADDRESS
+
+# Guardar la zona y la posición en la línea de cada dirección en el caché de
+# geocodificación (las direcciones repetidas no se vuelven a clasificar ni proyectar)
+CACHE_GEOMETRIA_ACTIVA = getattr(config, 'CACHE_GEOMETRIA_ACTIVA', True)
+
+# Rebalanceo de paradas fronterizas entre zonas (ver rebalancear_zonas)
+REBALANCEO_ACTIVO = getattr(config, 'REBALANCEO_ACTIVO', True)
+REBALANCEO_DISTANCIA_M = getattr(config, 'REBALANCEO_DISTANCIA_M', 150)  # A la línea de la zona vecina
+REBALANCEO_TOLERANCIA = getattr(config, 'REBALANCEO_TOLERANCIA', 0.2)  # Diferencia de carga relativa aceptada
+REBALANCEO_PESO_PAQUETES = getattr(config, 'REBALANCEO_PESO_PAQUETES', 0.5)  # Peso de los paquetes frente a las paradas
+REBALANCEO_MAX_MOVIMIENTOS = getattr(config, 'REBALANCEO_MAX_MOVIMIENTOS', 50)
+
+# Polígonos preparados (índice de zonas), construidos una sola vez por proceso
+_poligonos = None
+
+
+def construir_indice_zonas(zone_polygons):
+    """
+    Construye los polígonos preparados de un conjunto de zonas.
+    
+    Args:
+        zone_polygons (dict): {nombre_zona: [(lat, lon), ...]}
+        
+    Returns:
+        list: Lista de tuplas (nombre_zona, polígono preparado)
+    """
+    return [(zone_name, prep(Polygon(zone_coords))) for zone_name, zone_coords in zone_polygons.items()]
+
+
+def cargar_indice_zonas():
+    """
+    Construye (una vez) los polígonos preparados de las zonas de config.
+    
+    Returns:
+        list: Lista de tuplas (nombre_zona, polígono preparado)
+    """
+    global _poligonos
+    if _poligonos is None:
+        _poligonos = construir_indice_zonas(ZONE_POLYGONS)
+    return _poligonos
+
+
+def determinar_zona(coord, indice=None):
     """
     Determina a qué zona pertenece una coordenada.
     
     Args:
         coord (tuple): Tupla (latitud, longitud)
+        indice (list): Polígonos preparados (construir_indice_zonas); si es None,
+                       los de ZONE_POLYGONS
         
     Returns:
         str: Nombre de la zona o 'sin_zona' si no pertenece a ninguna
     """
     punto = Point(coord)
     
-    for zone_name, zone_coords in ZONE_POLYGONS.items():
-        poligono = Polygon(zone_coords)
+    for zone_name, poligono in (cargar_indice_zonas() if indice is None else indice):
         if poligono.contains(punto):
             return zone_name
     
     return 'sin_zona'
 
 
-def separar_por_zonas(geocoded_addresses):
+# Zonas con columna de resultados propia; el resto va a 'sin_zona'
+ZONAS_RESULTADOS = ('Indust', 'Centre', 'Mirasol')
+
+
+def clasificar_zona(coords, indice=None, zonas_resultados=ZONAS_RESULTADOS):
+    """
+    Determina la zona de resultados (columna del spreadsheet) de una coordenada.
+    
+    Args:
+        coords (tuple): Tupla (latitud, longitud)
+        indice (list): Polígonos preparados; si es None, los de ZONE_POLYGONS
+        zonas_resultados (tuple): Zonas con columna propia
+        
+    Returns:
+        str: 'Indust', 'Centre', 'Mirasol' o 'sin_zona'
+    """
+    zona = determinar_zona(coords, indice)
+    return zona if zona in zonas_resultados else 'sin_zona'
+
+
+def separar_por_zonas(geocoded_addresses, indice=None, zonas_resultados=ZONAS_RESULTADOS):
     """
     Separa las direcciones geocodificadas por zonas.
     
     Args:
         geocoded_addresses (list): Lista de tuplas [(coords, address, codigos_barras), ...]
+        indice (list): Polígonos preparados (construir_indice_zonas); si es None,
+                       los de ZONE_POLYGONS
+        zonas_resultados (tuple): Zonas con columna propia; el resto va a 'sin_zona'
         
     Returns:
         dict: Diccionario con las direcciones separadas por zona
@@ -40,12 +116,8 @@ def separar_por_zonas(geocoded_addresses):
                 'Altres': [...]
             }
     """
-    zonas = {
-        'Indust': [],
-        'Centre': [],
-        'Mirasol': [],
-        'sin_zona': []
-    }
+    zonas = {zona: [] for zona in zonas_resultados}
+    zonas['sin_zona'] = []
     
     for item in geocoded_addresses:
         # item puede ser (coords, address) o (coords, address, codigos_barras)
@@ -55,22 +127,263 @@ def separar_por_zonas(geocoded_addresses):
             coords, address = item[0], item[1]
             codigos_barras = []
         
-        zona = determinar_zona(coords)
-        
         # Mapear zonas a columnas
-        if zona == 'Indust':
-            zonas['Indust'].append((coords, address, codigos_barras))
-        elif zona == 'Centre':
-            zonas['Centre'].append((coords, address, codigos_barras))
-        elif zona == 'Mirasol':
-            zonas['Mirasol'].append((coords, address, codigos_barras))
-        else:
-            # sin_zona
-            zonas['sin_zona'].append((coords, address, codigos_barras))
+        zonas[clasificar_zona(coords, indice, zonas_resultados)].append((coords, address, codigos_barras))
     
     return zonas
 
 
+def version_geometria(zone_polygons, lineas_por_zona, zonas_resultados=ZONAS_RESULTADOS):
+    """
+    Huella de la geometría: cambia si cambia cualquier polígono, línea de ruta
+    o zona con columna propia.
+    
+    Returns:
+        str: Versión (12 caracteres hexadecimales)
+    """
+    definicion = {
+        'zonas': {zona: [list(p) for p in puntos] for zona, puntos in zone_polygons.items()},
+        'lineas': {zona: [list(p) for p in puntos] for zona, puntos in lineas_por_zona.items()},
+        'zonas_resultados': list(zonas_resultados),
+    }
+    texto = json.dumps(definicion, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()[:12]
+
+
+class GeometriaCacheada:
+    """
+    Zona y posición normalizada en la línea de ruta de cada dirección, guardadas
+    en el caché de geocodificación con la versión de la geometría. Una dirección
+    repetida con la misma geometría no se vuelve a clasificar ni a proyectar;
+    si cambian los polígonos o las líneas, la versión cambia y se recalcula.
+    """
+    
+    def __init__(self, zone_polygons=ZONE_POLYGONS, lineas_por_zona=ZONE_ROUTE_LINES,
+                 zonas_resultados=ZONAS_RESULTADOS, indice=None, cache=None):
+        """
+        Args:
+            zone_polygons (dict): {zona: polígono}
+            lineas_por_zona (dict): {zona: línea de ruta}
+            zonas_resultados (tuple): Zonas con columna propia; el resto va a 'sin_zona'
+            indice (list): Polígonos preparados de zone_polygons (None = construirlos)
+            cache (dict): Caché de geocodificaciones (None = load_cache() en cada
+                          consulta, por si otro proceso lo ha guardado)
+        """
+        self.lineas_por_zona = lineas_por_zona
+        self.zonas_resultados = zonas_resultados
+        self.indice = indice if indice is not None else (
+            cargar_indice_zonas() if zone_polygons is ZONE_POLYGONS else construir_indice_zonas(zone_polygons)
+        )
+        self._cache_fijo = cache
+        self.cache = cache
+        self.version = version_geometria(zone_polygons, lineas_por_zona, zonas_resultados)
+        self.posiciones = {}  # {dirección: posición en la línea de su zona (None si no tiene)}
+        self.zonas = {}  # {dirección: zona a la que corresponde su posición}
+        self.reutilizadas = 0
+        self.calculadas = 0
+    
+    def zonas_y_posiciones(self, geocoded_addresses):
+        """
+        Zona de resultados y posición en la línea de cada punto.
+        
+        Args:
+            geocoded_addresses (list): Lista de tuplas [(coords, address, ...), ...]
+            
+        Returns:
+            list: [(zona, posición), ...] en el mismo orden (posición None si la
+                  zona no tiene línea de ruta)
+        """
+        self.cache = load_cache() if self._cache_fijo is None else self._cache_fijo
+        resultado = [None] * len(geocoded_addresses)
+        pendientes = {}  # {zona: [índice, ...]} a proyectar
+        
+        for i, item in enumerate(geocoded_addresses):
+            coords, address = tuple(item[0]), item[1]
+            # Solo vale si las coordenadas son las del caché (no unas corregidas a mano)
+            derivados = get_derivados(address, self.cache, self.version) \
+                if get_from_cache(address, self.cache) == coords else None
+            if derivados is not None:
+                resultado[i] = tuple(derivados)
+                continue
+            zona = clasificar_zona(coords, self.indice, self.zonas_resultados)
+            resultado[i] = (zona, None)
+            pendientes.setdefault(zona, []).append(i)
+        
+        # Proyección vectorizada de las direcciones nuevas, una pasada por zona
+        for zona, indices in pendientes.items():
+            linea = self.lineas_por_zona.get(zona)
+            if linea and len(linea) >= 2:
+                posiciones, _ = posiciones_en_ruta([geocoded_addresses[i][0] for i in indices], linea)
+                for i, posicion in zip(indices, posiciones):
+                    resultado[i] = (zona, float(posicion))
+            for i in indices:
+                add_derivados(geocoded_addresses[i][1], self.version, list(resultado[i]), self.cache)
+        
+        nuevas = sum(len(indices) for indices in pendientes.values())
+        self.calculadas += nuevas
+        self.reutilizadas += len(geocoded_addresses) - nuevas
+        contar('zonas.geometria_reutilizada', len(geocoded_addresses) - nuevas)
+        contar('zonas.geometria_calculada', nuevas)
+        for item, (zona, posicion) in zip(geocoded_addresses, resultado):
+            self.posiciones[item[1]] = posicion
+            self.zonas[item[1]] = zona
+        return resultado
+    
+    def ajustar_a_zonas(self, zonas_dict):
+        """
+        Proyecta en la línea de su nueva zona las direcciones que están en una
+        zona distinta de la suya (movidas por rebalancear_zonas). No se guardan
+        en el caché: el cambio de zona es de un día, no de la geometría.
+        
+        Args:
+            zonas_dict (dict): {zona: [(coords, address, codigos), ...]} definitivo
+        """
+        for zona, items in zonas_dict.items():
+            movidas = [item for item in items if self.zonas.get(item[1], zona) != zona]
+            if not movidas:
+                continue
+            linea = self.lineas_por_zona.get(zona)
+            if linea and len(linea) >= 2:
+                posiciones, _ = posiciones_en_ruta([item[0] for item in movidas], linea)
+            else:
+                posiciones = [None] * len(movidas)
+            for item, posicion in zip(movidas, posiciones):
+                self.posiciones[item[1]] = None if posicion is None else float(posicion)
+                self.zonas[item[1]] = zona
+    
+    def separar_por_zonas(self, geocoded_addresses):
+        """
+        Igual que separar_por_zonas, con la zona del caché cuando está calculada
+        (y deja en self.posiciones la posición de cada dirección para ordenar).
+        
+        Returns:
+            dict: {zona: [(coords, address, codigos_barras), ...]}
+        """
+        zonas = {zona: [] for zona in self.zonas_resultados}
+        zonas['sin_zona'] = []
+        for item, (zona, _) in zip(geocoded_addresses, self.zonas_y_posiciones(geocoded_addresses)):
+            codigos_barras = item[2] if len(item) >= 3 else []
+            zonas[zona].append((item[0], item[1], codigos_barras))
+        return zonas
+    
+    def guardar(self):
+        """Guarda en el archivo del caché lo calculado en esta ejecución."""
+        if self.calculadas and self.cache is not None:
+            save_cache(self.cache)
+
+
+def _a_metros(coords, lat_referencia):
+    """Proyección equirectangular local (x, y) en metros de coordenadas (lat, lon)."""
+    c = np.asarray(coords, dtype=float).reshape(-1, 2)
+    metros_grado = RADIO_TIERRA_M * np.pi / 180
+    return np.column_stack((c[:, 1] * metros_grado * np.cos(np.radians(lat_referencia)), c[:, 0] * metros_grado))
+
+
+def rebalancear_zonas(zonas_dict, lineas_por_zona=None, distancia_m=REBALANCEO_DISTANCIA_M,
+                      tolerancia=REBALANCEO_TOLERANCIA, peso_paquetes=REBALANCEO_PESO_PAQUETES,
+                      max_movimientos=REBALANCEO_MAX_MOVIMIENTOS):
+    """
+    Pasa paradas fronterizas de las zonas más cargadas a sus vecinas.
+    
+    Candidatas: paradas a menos de `distancia_m` de la línea de ruta de otra
+    zona (índice espacial STRtree sobre las paradas). La carga de una zona es
+    su número de paradas y de paquetes relativos a la media, y se mueve siempre
+    la parada que reduce el desequilibrio con el menor coste de ruta (el rodeo
+    de ida y vuelta a la nueva línea menos el de la suya), hasta que la
+    diferencia entre la zona más cargada y la menos es como mucho `tolerancia`.
+    Solo participan las zonas con línea de ruta ('sin_zona' nunca).
+    
+    Args:
+        zonas_dict (dict): {zona: [(coords, address, codigos), ...]} (separar_por_zonas)
+        lineas_por_zona (dict): Líneas de ruta; si es None, ZONE_ROUTE_LINES
+        distancia_m (float): Distancia máxima a la línea de la zona de destino
+        tolerancia (float): Diferencia de carga relativa aceptada (0.2 = 20 % de la media)
+        peso_paquetes (float): Peso de los paquetes en la carga (0 = solo paradas)
+        max_movimientos (int): Paradas movidas como máximo
+        
+    Returns:
+        tuple: (zonas_dict rebalanceado, [{'direccion', 'codigos', 'de', 'a', 'coste_m'}, ...])
+    """
+    if lineas_por_zona is None:
+        lineas_por_zona = ZONE_ROUTE_LINES
+    
+    zonas = [z for z, items in zonas_dict.items()
+             if z != 'sin_zona' and len(lineas_por_zona.get(z) or []) >= 2]
+    paradas = [(zona, item) for zona in zonas for item in zonas_dict[zona]]
+    if len(zonas) < 2 or not paradas:
+        return zonas_dict, []
+    
+    # Carga relativa a la media: paradas y paquetes (códigos) de cada zona
+    n_paradas = {z: len(zonas_dict[z]) for z in zonas}
+    n_paquetes = {z: sum(max(1, len(item[2])) for item in zonas_dict[z]) for z in zonas}
+    media_paradas = sum(n_paradas.values()) / len(zonas)
+    media_paquetes = sum(n_paquetes.values()) / len(zonas)
+    
+    def carga(z, d_paradas=0, d_paquetes=0):
+        return ((1 - peso_paquetes) * (n_paradas[z] + d_paradas) / media_paradas
+                + peso_paquetes * (n_paquetes[z] + d_paquetes) / media_paquetes)
+    
+    def desequilibrio():
+        cargas = [carga(z) for z in zonas]
+        return max(cargas) - min(cargas)
+    
+    # Todo en metros: paradas indexadas y distancia de cada una a cada línea cercana
+    lat_referencia = float(np.mean([item[0][0] for _, item in paradas]))
+    puntos = shapely.points(_a_metros([item[0] for _, item in paradas], lat_referencia))
+    lineas = {z: LineString(_a_metros(lineas_por_zona[z], lat_referencia)) for z in zonas}
+    propia = shapely.distance(puntos, [lineas[zona] for zona, _ in paradas])
+    arbol = STRtree(puntos)
+    candidatas = {}  # {índice de parada: {zona destino: coste en metros}}
+    for z in zonas:
+        cerca = [int(i) for i in arbol.query(lineas[z], predicate='dwithin', distance=distancia_m)
+                 if paradas[i][0] != z]
+        if cerca:
+            distancias = shapely.distance(puntos[cerca], lineas[z])
+            for i, distancia in zip(cerca, distancias):
+                candidatas.setdefault(i, {})[z] = 2 * (float(distancia) - float(propia[i]))
+    
+    zona_de = [zona for zona, _ in paradas]
+    movimientos = []
+    while candidatas and len(movimientos) < max_movimientos and desequilibrio() > tolerancia:
+        # Movimiento más barato de los que reducen la dispersión de las cargas
+        dispersion = sum(carga(z) ** 2 for z in zonas)
+        mejor = None
+        for i, destinos in candidatas.items():
+            origen = zona_de[i]
+            paquetes = max(1, len(paradas[i][1][2]))
+            for destino, coste in destinos.items():
+                nueva = (dispersion - carga(origen) ** 2 - carga(destino) ** 2
+                         + carga(origen, -1, -paquetes) ** 2 + carga(destino, 1, paquetes) ** 2)
+                if nueva < dispersion - 1e-12 and (mejor is None or coste < mejor[0]):
+                    mejor = (coste, i, destino, paquetes)
+        if mejor is None:
+            break
+        
+        coste, i, destino, paquetes = mejor
+        origen = zona_de[i]
+        n_paradas[origen] -= 1
+        n_paradas[destino] += 1
+        n_paquetes[origen] -= paquetes
+        n_paquetes[destino] += paquetes
+        zona_de[i] = destino
+        del candidatas[i]  # Cada parada se mueve una vez como mucho
+        item = paradas[i][1]
+        movimientos.append({'direccion': item[1], 'codigos': list(item[2]), 'de': origen, 'a': destino,
+                            'coste_m': round(coste, 1)})
+    
+    if not movimientos:
+        return zonas_dict, []
+    
+    rebalanceado = {zona: ([] if zona in zonas else list(items)) for zona, items in zonas_dict.items()}
+    for (_, item), zona in zip(paradas, zona_de):
+        rebalanceado[zona].append(item)
+    for movimiento in movimientos:
+        print(f"  ↔️ {movimiento['direccion'][:50]}: {movimiento['de']} → {movimiento['a']} "
+              f"({movimiento['coste_m']:+.0f} m)")
+    contar('zonas.rebalanceadas', len(movimientos))
+    return rebalanceado, movimientos
+
+
 def agregar_punto_inicio(zonas_dict, depot_coords=DEPOT_COORDS, depot_address=DEPOT_ADDRESS):
     """
     Agrega el punto de inicio (depósito) al principio de cada zona.
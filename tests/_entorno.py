@@ -0,0 +1,21 @@
+"""
+Entorno de los tests: src/ en el path y, si no hay config.py propio, la
+configuración de ejemplo (config.example.py) como módulo config.
+"""
+import importlib.util
+import os
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(RAIZ, 'src')
+
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+try:
+    import config  # noqa: F401
+except ImportError:
+    spec = importlib.util.spec_from_file_location('config', os.path.join(RAIZ, 'config.example.py'))
+    config = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(config)
+    sys.modules['config'] = config
@@ -0,0 +1,42 @@
+"""Instantánea del estado local en los cassettes"""
+import correction_store
+import geocoding
+import results_store
+import route_memory
+import cassette
+
+
+def test_la_reproduccion_empieza_con_el_estado_grabado(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(cassette, 'REPRODUCCIONES_DIR', str(tmp_path / 'reproducciones'))
+    monkeypatch.setattr(geocoding, 'CACHE_FILE', str(tmp_path / 'geocoding_cache.json'))
+    geocoding._cache_memoria.update(mtime=None, datos=None)
+    auto_file = tmp_path / 'Correccions_auto.csv'
+    log_file = tmp_path / 'Correccions_auto.log'
+    auto_file.write_text('key,raw,processed,confirmaciones\nMAJOR 1,major 1,Carrer Major 1,2\n', encoding='utf-8')
+    monkeypatch.setattr(correction_store, 'CORRECCIONES_AUTO_FILE', auto_file)
+    monkeypatch.setattr(correction_store, 'CORRECCIONES_LOG_FILE', log_file)
+
+    db_file = str(tmp_path / 'resultados.db')
+    zonas = {'Centre': [((41.0, 2.02), 'Carrer Major 1', ['c1'])]}
+    results_store.registrar_ejecucion(zonas, ['c1'], ['major 1'], ['Carrer Major 1'], ['modelo'],
+                                      {'Centre': [(41.0, 2.0), (41.0, 2.1)]}, db_file=db_file)
+    route_memory.registrar_rutas({'Centre': ['Carrer Major 1']}, db_file=db_file)
+
+    path = str(tmp_path / 'dia.jsonl.gz')
+    grabacion = cassette.Cassette(path, 'grabar')
+    cassette.grabar_estado_local(grabacion, db_file)
+    grabacion.cerrar()
+
+    # Después de grabar cambian las correcciones y el almacén reales
+    auto_file.write_text('key,raw,processed,confirmaciones\n', encoding='utf-8')
+    log_file.write_text('{"key": "NOU 2"}\n', encoding='utf-8')
+    results_store.guardar_resultados([{'codigo': 'c2', 'direccion': 'Carrer Nou 2'}], db_file)
+
+    inquilino = cassette.preparar_reproduccion(cassette.Cassette(path, 'reproducir'))
+
+    assert 'Carrer Major 1' in correction_store.CORRECCIONES_AUTO_FILE.read_text(encoding='utf-8')
+    assert not correction_store.CORRECCIONES_LOG_FILE.exists()
+    guardados = results_store.obtener_por_codigos(['c1', 'c2'], inquilino.results_db_file)
+    assert set(guardados) == {'c1'} and guardados['c1']['fuente'] == 'modelo'
+    assert route_memory.posiciones_aprendidas('Centre', ['Carrer Major 1'], inquilino.results_db_file)
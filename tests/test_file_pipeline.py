@@ -0,0 +1,98 @@
+"""Modo fichero: mismas rutas que procesar_rutas para las mismas filas"""
+import csv
+
+import pytest
+
+import file_pipeline
+import route_memory
+from route_memory import ordenar_zonas
+from zone_manager import separar_por_zonas, rebalancear_zonas
+
+# Paradas dentro de la zona Centre (config.example.py) y una fuera de los polígonos
+COORDS = {
+    'Carrer A 1': (41.4700, 2.0850),
+    'Carrer B 2': (41.4690, 2.0800),
+    'Carrer C 3': (41.4720, 2.0880),
+    'Carrer D 4': (41.4660, 2.0830),
+    'Carrer E 5': (41.4710, 2.0820),
+    'Lluny 9': (41.5500, 2.2000),
+}
+BLOQUES = [
+    (['p1', 'p2', 'p3', 'x'], ['', '', '', 'Q-PRINTING'], ['Carrer A 1', 'Carrer B 2', 'Lluny 9', 'Carrer C 3']),
+    (['p4', 'p5', 'p6', 'p7'], ['', '', '', ''], ['Carrer C 3', 'Carrer A 1', 'No existeix', 'Carrer D 4']),
+    (['p8'], [''], ['Carrer E 5']),
+]
+
+
+def _geocodificar(direcciones, api_key, max_workers=10, codigos_barras=None, coordenadas_conocidas=None):
+    puntos, no_encontradas = {}, []
+    for direccion, codigo in zip(direcciones, codigos_barras):
+        if direccion not in COORDS:
+            no_encontradas.append([direccion])
+            continue
+        punto = puntos.setdefault(COORDS[direccion], (COORDS[direccion], direccion, []))
+        punto[2].append(codigo)
+    return list(puntos.values()), no_encontradas
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_pipeline, 'leer_bloques', lambda *args: iter(BLOQUES))
+    monkeypatch.setattr(file_pipeline, 'procesar_direcciones_con_modelo', lambda direcciones, **kwargs: direcciones)
+    monkeypatch.setattr(file_pipeline, 'geocode_and_store_fast', _geocodificar)
+    monkeypatch.setattr(file_pipeline, 'CACHE_GEOMETRIA_ACTIVA', False)
+    db_file = str(tmp_path / 'resultados.db')
+    salida = tmp_path / 'rutas.csv'
+
+    def procesar():
+        stats = file_pipeline.procesar_rutas_desde_fichero('entrada.csv', str(salida), db_file=db_file)
+        with open(salida, encoding='utf-8', newline='') as f:
+            return stats, list(csv.DictReader(f))
+    return procesar, db_file
+
+
+def _como_procesar_rutas(db_file):
+    """Las etapas de procesar_rutas con todas las filas (sin filtrar) de una vez."""
+    direcciones, codigos = [], []
+    for codigos_bloque, filtros, direcciones_bloque in BLOQUES:
+        for codigo, filtro, direccion in zip(codigos_bloque, filtros, direcciones_bloque):
+            if not filtro:
+                direcciones.append(direccion)
+                codigos.append(codigo)
+    geocoded, _ = _geocodificar(direcciones, None, codigos_barras=codigos)
+    zonas_dict, _ = rebalancear_zonas(separar_por_zonas(geocoded))
+    zonas_ordenadas, _, _ = ordenar_zonas(zonas_dict, db_file=db_file)
+    return {zona: [(item[1], item[2]) for item in items] for zona, items in zonas_ordenadas.items() if items}
+
+
+def _por_zona(filas):
+    rutas = {}
+    for fila in filas:
+        rutas.setdefault(fila['zona'], []).append((fila['direccion'], fila['codigos'].split(', ')))
+        assert int(fila['orden']) == len(rutas[fila['zona']])
+    return rutas
+
+
+def test_mismas_rutas_que_procesar_rutas(pipeline):
+    procesar, db_file = pipeline
+    stats, filas = procesar()
+
+    rutas = _por_zona(filas)
+    assert rutas.pop('no_encontradas') == [('No existeix', [''])]
+    assert rutas == _como_procesar_rutas(db_file)
+    # El mismo punto repartido entre bloques sale una vez con todos sus códigos
+    assert sorted(rutas['Centre']) == [('Carrer A 1', ['p1', 'p5']), ('Carrer B 2', ['p2']),
+                                       ('Carrer C 3', ['p4']), ('Carrer D 4', ['p7']), ('Carrer E 5', ['p8'])]
+    assert stats['filas'] == 9 and stats['excluidas'] == 1
+    assert stats['zonas'] == {'Centre': 5, 'sin_zona': 1}
+
+
+def test_usa_la_memoria_de_rutas(pipeline, monkeypatch):
+    procesar, db_file = pipeline
+    monkeypatch.setattr(route_memory, 'MEJORA_LOCAL_ACTIVA', False)
+    aprendido = ['Carrer E 5', 'Carrer D 4', 'Carrer C 3', 'Carrer B 2', 'Carrer A 1']
+    route_memory.registrar_rutas({'Centre': aprendido}, db_file=db_file)
+
+    _, filas = procesar()
+
+    assert [fila['direccion'] for fila in filas if fila['zona'] == 'Centre'] == aprendido
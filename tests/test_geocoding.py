@@ -0,0 +1,78 @@
+"""Caché de geocodificación compartido entre procesos"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import geocoding
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+
+# Otro proceso: carga el caché, añade 'b' y lo guarda
+_OTRO_PROCESO = """
+import sys
+sys.path.insert(0, {tests!r})
+import _entorno
+import geocoding
+geocoding.CACHE_FILE = {cache_file!r}
+cache = geocoding.load_cache()
+geocoding.add_to_cache('b', (41.2, 2.2), cache)
+geocoding.save_cache(cache)
+"""
+
+
+@pytest.fixture
+def cache_file(tmp_path, monkeypatch):
+    path = tmp_path / 'geocoding_cache.json'
+    monkeypatch.setattr(geocoding, 'CACHE_FILE', str(path))
+    geocoding._cache_memoria.update(mtime=None, datos=None)
+    geocoding._cache_disco.update(mtime=None, datos={})
+    geocoding._diario.update(ino=None, offset=0, datos={})
+    yield path
+    geocoding._cache_memoria.update(mtime=None, datos=None)
+    geocoding._cache_disco.update(mtime=None, datos={})
+    geocoding._diario.update(ino=None, offset=0, datos={})
+
+
+def test_no_se_pierden_las_entradas_guardadas_por_otro_proceso(cache_file, monkeypatch):
+    cache_file.write_text(json.dumps({'a': [41.1, 2.1]}), encoding='utf-8')
+
+    def consultar(address, key):
+        # Mientras este proceso consulta 'x', otro guarda 'b'; luego falla 'y'
+        if address == 'x':
+            subprocess.run([sys.executable, '-c', _OTRO_PROCESO.format(tests=TESTS, cache_file=str(cache_file))],
+                           check=True)
+        return (41.3, 2.3) if address == 'x' else (41.4, 2.4)
+
+    monkeypatch.setattr(geocoding, '_consultar_google_maps', consultar)
+    geocoding.geocode_and_store(['x', 'y'], delay=0)
+
+    guardado = json.loads(cache_file.read_text(encoding='utf-8'))
+    assert set(guardado) == {'a', 'b', 'x', 'y'}
+
+
+@pytest.mark.parametrize('compartido', [True, False])
+def test_reanudar_no_repite_lo_consultado_antes_del_fallo(cache_file, monkeypatch, compartido):
+    monkeypatch.setattr(geocoding, 'GEOCODING_COMPARTIDO', compartido)
+    consultadas = []
+
+    def consultar(address, key):
+        consultadas.append(address)
+        if address == 'c' and consultadas.count('c') == 1:
+            raise RuntimeError('API caída')
+        return (41.0, 2.0 + len(consultadas) / 100)
+
+    monkeypatch.setattr(geocoding, '_consultar_google_maps', consultar)
+    with pytest.raises(RuntimeError):
+        geocoding.geocode_and_store(['a', 'b', 'c'], delay=0)
+    # Durante la geocodificación el caché no se reescribe: los resultados van al diario
+    assert not cache_file.exists()
+
+    # Otra ejecución (otro proceso): solo se consulta la que faltaba
+    geocoding._cache_memoria.update(mtime=None, datos=None)
+    geocoding._diario.update(ino=None, offset=0, datos={})
+    geocoding.geocode_and_store(['a', 'b', 'c'], delay=0)
+    assert consultadas == ['a', 'b', 'c', 'c']
+    assert set(json.loads(cache_file.read_text(encoding='utf-8'))) == {'a', 'b', 'c'}
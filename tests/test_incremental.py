@@ -0,0 +1,130 @@
+"""Modo incremental: solo las filas cambiadas y solo las zonas afectadas"""
+import json
+
+import pytest
+
+import incremental
+
+LINEAS = {'Centre': [(41.0, 2.0), (41.0, 2.1)], 'Indust': [(41.1, 2.0), (41.1, 2.1)]}
+COORDS = {
+    'Carrer A 1': (41.0, 2.02),
+    'Carrer B 2': (41.0, 2.06),
+    'Carrer C 3': (41.1, 2.05),
+    'Carrer D 4': (41.0, 2.04),
+    'Carrer E 5': (41.1, 2.03),
+}
+
+
+def _zona(coords):
+    return 'Centre' if coords[0] < 41.05 else 'Indust'
+
+
+class _HojaFalsa:
+    """Lo que usa el modo incremental de SheetsManager"""
+
+    def __init__(self, filas):
+        self.filas = filas
+        self.escrituras = []
+
+    @property
+    def huellas(self):
+        return [f"{codigo}|{raw}" for codigo, raw in self.filas]
+
+    def leer_direcciones_completas(self):
+        return [raw for _, raw in self.filas], [codigo for codigo, _ in self.filas], None
+
+    def escribir_fase_resultados(self, zonas, no_encontradas, **kwargs):
+        self.escrituras.append({'zonas': zonas, 'no_encontradas': no_encontradas, **kwargs})
+
+
+@pytest.fixture
+def entorno(tmp_path, monkeypatch):
+    # El estado se lee y escribe en ESTADO_FILE, relativo al directorio de trabajo
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(incremental, 'procesar_direcciones_con_modelo', lambda direcciones, **kwargs: direcciones)
+    monkeypatch.setattr(incremental, 'geocode_and_store_fast', lambda *args, **kwargs: ([], []))
+    monkeypatch.setattr(incremental, 'load_cache', lambda: COORDS)
+    monkeypatch.setattr(incremental, 'get_from_cache', lambda direccion, cache: cache.get(direccion))
+    monkeypatch.setattr(incremental, 'clasificar_zona', _zona)
+    monkeypatch.setattr(incremental, 'ZONE_ROUTE_LINES', LINEAS)
+    monkeypatch.setattr(incremental, 'DEPOT_COORDS', (41.0, 2.0))
+    monkeypatch.setattr(incremental, 'publicar_indice_codigos', lambda *args, **kwargs: None)
+    registradas = []
+    monkeypatch.setattr(incremental, 'registrar_ejecucion', lambda *args, **kwargs: registradas.append(args))
+    return registradas
+
+
+def _ejecucion_completa(filas, zonas_ordenadas):
+    """Estado que deja procesar_rutas tras una ejecución completa."""
+    hoja = _HojaFalsa(filas)
+    raw = [r for _, r in filas]
+    registros = incremental.construir_registros(hoja.huellas, raw, [c for c, _ in filas], raw, zonas_ordenadas)
+    incremental.guardar_estado(registros, zonas_ordenadas, incremental.ESTADO_FILE)
+
+
+def _direcciones(items):
+    return [item[1] for item in items]
+
+
+def test_construir_registros_prefiere_la_zona_de_la_ejecucion(entorno):
+    # 'Carrer A 1' se movió a Indust (rebalanceo): la zona sale de zonas_ordenadas
+    zonas = {'Indust': [(COORDS['Carrer A 1'], 'Carrer A 1', ['a'])]}
+    registros = incremental.construir_registros(
+        ['h1', 'h2', 'h3'], ['a 1', 'c 3', '???'], ['a', 'c', 'x'], ['Carrer A 1', 'Carrer C 3', 'No existeix'], zonas
+    )
+    assert [registros[h]['zona'] for h in ('h1', 'h2', 'h3')] == ['Indust', 'Indust', None]
+    assert registros['h1']['coords'] == COORDS['Carrer A 1']
+    assert registros['h3']['coords'] is None
+
+
+def test_sin_estado_pide_una_ejecucion_completa(entorno):
+    hoja = _HojaFalsa([('a', 'Carrer A 1')])
+    assert incremental.procesar_rutas_incremental(hoja) is False
+    assert hoja.escrituras == []
+
+
+def test_sin_cambios_no_escribe(entorno):
+    filas = [('a', 'Carrer A 1'), ('c', 'Carrer C 3')]
+    _ejecucion_completa(filas, {'Centre': [(COORDS['Carrer A 1'], 'Carrer A 1', ['a'])],
+                                'Indust': [(COORDS['Carrer C 3'], 'Carrer C 3', ['c'])]})
+    hoja = _HojaFalsa(filas)
+
+    assert incremental.procesar_rutas_incremental(hoja) is True
+    assert hoja.escrituras == [] and entorno == []
+
+
+def test_solo_se_reescriben_las_zonas_afectadas(entorno):
+    # Ruta publicada en Centre con B antes que A (editada a mano): se conserva
+    publicada = {
+        'Centre': [(COORDS['Carrer B 2'], 'Carrer B 2', ['b']), (COORDS['Carrer A 1'], 'Carrer A 1', ['a'])],
+        'Indust': [(COORDS['Carrer C 3'], 'Carrer C 3', ['c']), (COORDS['Carrer E 5'], 'Carrer E 5', ['e'])],
+        'Mirasol': [],
+    }
+    _ejecucion_completa([('a', 'Carrer A 1'), ('b', 'Carrer B 2'), ('c', 'Carrer C 3'), ('e', 'Carrer E 5')],
+                        publicada)
+
+    # Nueva en Centre (D), eliminada en Indust (E), y una no encontrada
+    hoja = _HojaFalsa([('a', 'Carrer A 1'), ('b', 'Carrer B 2'), ('c', 'Carrer C 3'),
+                       ('d', 'Carrer D 4'), ('x', 'No existeix')])
+    assert incremental.procesar_rutas_incremental(hoja) is True
+
+    escritura, = hoja.escrituras
+    assert set(escritura['columnas_destino']) == {'Centre', 'Indust', 'sin_zona'}
+    assert 'Mirasol' not in escritura['zonas']
+    assert escritura['rango_no_encontradas'] == incremental.COLUMNA_NO_ENCONTRADAS
+    assert escritura['no_encontradas'] == [['No existeix']]
+
+    centre = _direcciones(escritura['zonas']['Centre'])
+    assert [d for d in centre if d != 'Carrer D 4'] == ['Carrer B 2', 'Carrer A 1']
+    assert sorted(centre) == ['Carrer A 1', 'Carrer B 2', 'Carrer D 4']
+    assert _direcciones(escritura['zonas']['Indust']) == ['Carrer C 3']
+
+    # El estado guardado es la base de la siguiente ejecución incremental
+    with open(incremental.ESTADO_FILE, encoding='utf-8') as f:
+        estado = json.load(f)
+    assert set(estado['filas']) == set(hoja.huellas)
+    assert [item[1] for item in estado['zonas']['Centre']] == centre
+    assert estado['zonas']['Mirasol'] == []
+    zonas_registradas, codigos = entorno[0][0], entorno[0][1]
+    assert codigos == ['a', 'b', 'c', 'd', 'x']
+    assert _direcciones(zonas_registradas['Centre']) == centre
@@ -0,0 +1,8 @@
+"""Modo de perfil de la instrumentación"""
+import instrumentation
+
+
+def test_sin_modo_se_usa_el_de_config(monkeypatch):
+    monkeypatch.setattr(instrumentation, 'PERFIL_MODO', 'tracemalloc')
+    assert instrumentation.iniciar_ejecucion('prueba').perfil_modo == 'tracemalloc'
+    assert instrumentation.iniciar_ejecucion('prueba', perfil_modo='cprofile').perfil_modo == 'cprofile'
@@ -0,0 +1,117 @@
+"""Ordenación por la línea de ruta, inserción de paradas y búsqueda local"""
+import random
+import time
+
+import pytest
+
+import line_distance_solver
+from line_distance_solver import longitud_ruta, mejorar_ruta
+
+DEPOSITO = (39.46, -0.39)
+
+
+def _paradas(n, semilla):
+    rng = random.Random(semilla)
+    puntos = sorted(((39.47 + rng.random() * 0.03, -0.38 + rng.random() * 0.04) for _ in range(n)),
+                    key=lambda punto: punto[1])
+    return [(punto, f'parada {i}', []) for i, punto in enumerate(puntos)]
+
+
+@pytest.mark.parametrize('inicio', [DEPOSITO, None])
+@pytest.mark.parametrize('semilla', range(5))
+def test_sin_inversion_que_mejore_en_rutas_pequenas(inicio, semilla):
+    items = _paradas(9, semilla)
+    mejorados, informe = mejorar_ruta(items, inicio, max_iteraciones=10 ** 6, max_segundos=10)
+
+    assert sorted(mejorados) == sorted(items)
+    assert informe['despues_m'] <= informe['antes_m']
+    longitud = longitud_ruta([item[0] for item in mejorados], inicio)
+    for i in range(len(mejorados)):
+        for j in range(i + 1, len(mejorados)):
+            invertida = mejorados[:i] + mejorados[i:j + 1][::-1] + mejorados[j + 1:]
+            assert longitud_ruta([item[0] for item in invertida], inicio) >= longitud * 0.999
+
+
+def test_zonas_grandes_respetan_el_presupuesto():
+    items = _paradas(3000, 1)
+    inicio = time.perf_counter()
+    _, informe = mejorar_ruta(items, DEPOSITO, max_segundos=0.3)
+
+    assert time.perf_counter() - inicio < 1.5
+    assert informe['despues_m'] <= informe['antes_m']
+
+
+def test_zonas_por_encima_del_maximo_no_se_tocan(monkeypatch):
+    monkeypatch.setattr(line_distance_solver, 'MEJORA_LOCAL_MAX_PARADAS', 10)
+    items = _paradas(11, 0)
+    mejorados, informe = mejorar_ruta(items, DEPOSITO)
+
+    assert mejorados == items
+    assert informe['movimientos'] == 0
+
+
+def test_ordenar_por_linea_proyecta_y_deja_al_final_las_coordenadas_invalidas():
+    linea = [(41.0, 2.0), (41.0, 2.1), (41.1, 2.1)]
+    items = [((41.05, 2.1), 'c', ['3']), ((41.0, 2.02), 'a', ['1']), (None, 'rota', []),
+             ((41.0, 2.08), 'b', ['2']), ((float('nan'), 2.0), 'nan', [])]
+
+    ordenadas = line_distance_solver.ordenar_por_linea(items, linea)
+
+    assert [item[1] for item in ordenadas] == ['a', 'b', 'c', 'rota', 'nan']
+    esperadas = [line_distance_solver.calcular_posicion_en_ruta_multi_segmento(item[0], linea)[0]
+                 for item in ordenadas[:3]]
+    assert esperadas == sorted(esperadas)
+
+
+LINEA_RECTA = [(39.47, -0.40), (39.47, -0.34)]
+
+
+def _sobre_la_linea(lons, prefijo='p'):
+    return [((39.47 + (i % 3) * 0.0005, lon), f'{prefijo} {i}', []) for i, lon in enumerate(lons)]
+
+
+def test_insercion_sin_mover_las_paradas_existentes():
+    # Orden editado a mano (no creciente en la línea): se conserva tal cual
+    existentes = _sobre_la_linea([-0.39, -0.37, -0.38, -0.35])
+    ruta = line_distance_solver.RutaInsercion(existentes, LINEA_RECTA, DEPOSITO)
+    nuevo = ((39.4705, -0.36), 'nueva', [])
+
+    antes = longitud_ruta([item[0] for item in ruta.items], DEPOSITO)
+    indice, metros = ruta.insertar(nuevo)
+
+    assert ruta.items[indice] == nuevo
+    assert [item for item in ruta.items if item is not nuevo] == existentes
+    assert metros == pytest.approx(longitud_ruta([item[0] for item in ruta.items], DEPOSITO) - antes)
+    # Ningún otro hueco es más barato
+    for hueco in range(len(existentes) + 1):
+        alternativa = existentes[:hueco] + [nuevo] + existentes[hueco:]
+        assert longitud_ruta([item[0] for item in alternativa], DEPOSITO) - antes >= metros - 1e-6
+
+
+def test_la_ventana_busca_cerca_de_la_proyeccion():
+    rng = random.Random(3)
+    existentes = _sobre_la_linea(sorted(-0.40 + rng.random() * 0.06 for _ in range(200)))
+    nuevos = _sobre_la_linea([-0.40 + rng.random() * 0.06 for _ in range(20)], 'nueva')
+
+    completa = line_distance_solver.RutaInsercion(existentes, LINEA_RECTA, DEPOSITO, ventana=len(existentes) + 20)
+    con_ventana = line_distance_solver.RutaInsercion(existentes, LINEA_RECTA, DEPOSITO, ventana=4)
+    for item in nuevos:
+        _, exacto = completa.insertar(item)
+        _, aproximado = con_ventana.insertar(item)
+        # Sobre una ruta ordenada por la línea el mejor hueco está junto a la proyección
+        assert aproximado == pytest.approx(exacto, abs=1.0)
+
+    assert sorted(con_ventana.items) == sorted(existentes + nuevos)
+    assert con_ventana._claves == sorted(con_ventana._claves)
+
+
+def test_insertar_varias_suma_lo_que_alarga_la_ruta():
+    existentes = _sobre_la_linea([-0.39, -0.37, -0.35])
+    nuevos = _sobre_la_linea([-0.36, -0.395, -0.34], 'nueva')
+
+    ruta, metros = line_distance_solver.insertar_en_ruta_ordenada(existentes, nuevos, LINEA_RECTA, DEPOSITO)
+
+    assert [item for item in ruta if item in existentes] == existentes
+    assert sorted(ruta) == sorted(existentes + nuevos)
+    assert metros == pytest.approx(longitud_ruta([item[0] for item in ruta], DEPOSITO)
+                                   - longitud_ruta([item[0] for item in existentes], DEPOSITO))
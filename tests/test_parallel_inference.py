@@ -0,0 +1,45 @@
+"""Pool compartido de réplicas del modelo"""
+import parallel_inference
+
+
+class _PoolFalso:
+    creados = []
+
+    def __init__(self, workers, hilos_por_worker):
+        self.workers = workers
+        self.hilos_por_worker = hilos_por_worker
+        self.cerrado = False
+        _PoolFalso.creados.append(self)
+
+    def procesar(self, direcciones, batch_size=16):
+        return [d.upper() for d in direcciones]
+
+    def cerrar(self):
+        self.cerrado = True
+
+
+def test_las_paginas_reutilizan_el_mismo_pool(monkeypatch):
+    _PoolFalso.creados = []
+    monkeypatch.setattr(parallel_inference, 'ModelPool', _PoolFalso)
+    monkeypatch.setattr(parallel_inference, '_pool_compartido', None)
+
+    assert parallel_inference.procesar_en_paralelo(['a', 'b'], workers=2, hilos_por_worker=1) == ['A', 'B']
+    assert parallel_inference.procesar_en_paralelo(['c'], workers=2, hilos_por_worker=1) == ['C']
+    assert len(_PoolFalso.creados) == 1
+
+    parallel_inference.cerrar_pool()
+    assert _PoolFalso.creados[0].cerrado
+    parallel_inference.procesar_en_paralelo(['d'], workers=2, hilos_por_worker=1)
+    assert len(_PoolFalso.creados) == 2
+    parallel_inference.cerrar_pool()
+
+
+def test_otro_reparto_cierra_el_pool_anterior(monkeypatch):
+    _PoolFalso.creados = []
+    monkeypatch.setattr(parallel_inference, 'ModelPool', _PoolFalso)
+    monkeypatch.setattr(parallel_inference, '_pool_compartido', None)
+
+    parallel_inference.procesar_en_paralelo(['a'], workers=2, hilos_por_worker=1)
+    parallel_inference.procesar_en_paralelo(['a'], workers=4, hilos_por_worker=1)
+    assert [p.cerrado for p in _PoolFalso.creados] == [True, False]
+    parallel_inference.cerrar_pool()
@@ -0,0 +1,72 @@
+"""Almacén de resultados por código de barras"""
+import pytest
+
+import results_store
+
+LINEAS = {'Centre': [(41.0, 2.0), (41.0, 2.1)]}
+
+
+def _registrar(db_file, fuentes, limpias=('Carrer Major 1', 'Carrer Nou 2')):
+    zonas = {'Centre': [((41.0, 2.02), limpias[0], ['c1']), ((41.0, 2.07), limpias[1], ['c2'])]}
+    return results_store.registrar_ejecucion(
+        zonas, ['c1', 'c2'], ['major 1', 'nou 2'], list(limpias), fuentes, LINEAS, db_file=db_file
+    )
+
+
+def test_guarda_zona_posicion_y_coordenadas(tmp_path):
+    db_file = str(tmp_path / 'resultados.db')
+    assert _registrar(db_file, ['modelo', 'lookup']) == 2
+
+    guardados = results_store.obtener_por_codigos(['c1', 'c2', 'otro'], db_file)
+    assert set(guardados) == {'c1', 'c2'}
+    assert guardados['c1']['zona'] == 'Centre'
+    assert [guardados[c]['posicion'] for c in ('c1', 'c2')] == [1, 2]
+    assert guardados['c1']['posicion_ruta'] < guardados['c2']['posicion_ruta']
+    assert (guardados['c2']['lat'], guardados['c2']['lon']) == (41.0, 2.07)
+
+
+def test_la_fuente_de_la_limpieza_sobrevive_a_las_reejecuciones(tmp_path):
+    db_file = str(tmp_path / 'resultados.db')
+    _registrar(db_file, ['modelo', 'lookup'])
+    # Segunda ejecución: las filas salen del almacén (o del modo incremental, sin fuente)
+    _registrar(db_file, ['almacen', None])
+    _registrar(db_file, ['almacen', 'almacen'])
+
+    guardados = results_store.obtener_por_codigos(['c1', 'c2'], db_file)
+    assert [guardados[c]['fuente'] for c in ('c1', 'c2')] == ['modelo', 'lookup']
+
+
+def test_la_misma_direccion_original_se_reutiliza(tmp_path):
+    db_file = str(tmp_path / 'resultados.db')
+    _registrar(db_file, ['modelo', 'modelo'])
+
+    limpias, coordenadas = results_store.resultados_reutilizables(['c1', 'c2', 'c3'], ['major 1', 'cambiada', 'x'],
+                                                                  db_file)
+    assert limpias == {0: 'Carrer Major 1'}
+    assert coordenadas == {'Carrer Major 1': (41.0, 2.02)}
+
+
+def test_una_fuente_nueva_sustituye_a_la_guardada(tmp_path):
+    db_file = str(tmp_path / 'resultados.db')
+    _registrar(db_file, ['modelo', 'modelo'])
+    _registrar(db_file, ['lookup', 'almacen'])
+
+    guardados = results_store.obtener_por_codigos(['c1', 'c2'], db_file)
+    assert [guardados[c]['fuente'] for c in ('c1', 'c2')] == ['lookup', 'modelo']
+
+
+def test_usa_las_posiciones_ya_calculadas(tmp_path, monkeypatch):
+    db_file = str(tmp_path / 'resultados.db')
+    proyectadas = []
+    original = results_store.posiciones_en_ruta
+    monkeypatch.setattr(results_store, 'posiciones_en_ruta',
+                        lambda puntos, linea: proyectadas.extend(puntos) or original(puntos, linea))
+
+    zonas = {'Centre': [((41.0, 2.02), 'Carrer Major 1', ['c1']), ((41.0, 2.07), 'Carrer Nou 2', ['c2'])]}
+    results_store.registrar_ejecucion(zonas, ['c1', 'c2'], ['major 1', 'nou 2'], ['Carrer Major 1', 'Carrer Nou 2'],
+                                      None, LINEAS, db_file=db_file, posiciones={'Carrer Major 1': 0.25})
+
+    guardados = results_store.obtener_por_codigos(['c1', 'c2'], db_file)
+    assert guardados['c1']['posicion_ruta'] == 0.25
+    assert guardados['c2']['posicion_ruta'] == pytest.approx(0.7)
+    assert proyectadas == [(41.0, 2.07)]
@@ -0,0 +1,76 @@
+"""Acceso a la API local de rutas desde el navegador"""
+import http.client
+import json
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import route_api
+
+TABLERO = 'https://tablero.example'
+
+
+@pytest.fixture
+def servidor(monkeypatch):
+    monkeypatch.setattr(route_api, 'ROUTE_API_ORIGENES', {TABLERO})
+    monkeypatch.setattr(route_api, 'ROUTE_API_MAX_BYTES', 100)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), route_api.RouteRequestHandler)
+    hilo = threading.Thread(target=server.serve_forever, daemon=True)
+    hilo.start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+def _peticion(puerto, metodo, ruta, cabeceras=None, cuerpo=None):
+    conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=5)
+    conexion.request(metodo, ruta, body=cuerpo, headers=cabeceras or {})
+    respuesta = conexion.getresponse()
+    respuesta.read()
+    conexion.close()
+    return respuesta
+
+
+def test_solo_el_tablero_recibe_permiso_cors(servidor):
+    respuesta = _peticion(servidor, 'OPTIONS', '/memoria', {'Origin': TABLERO})
+    assert respuesta.status == 204
+    assert respuesta.getheader('Access-Control-Allow-Origin') == TABLERO
+
+    respuesta = _peticion(servidor, 'GET', '/salud', {'Origin': TABLERO})
+    assert respuesta.status == 200
+    assert respuesta.getheader('Access-Control-Allow-Origin') == TABLERO
+
+
+def test_otra_web_recibe_403(servidor):
+    for metodo in ('OPTIONS', 'GET', 'POST'):
+        respuesta = _peticion(servidor, metodo, '/memoria', {'Origin': 'https://malicioso.example'},
+                              b'{}' if metodo == 'POST' else None)
+        assert respuesta.status == 403
+        assert respuesta.getheader('Access-Control-Allow-Origin') is None
+
+
+def test_sin_origin_no_se_envia_cors(servidor):
+    respuesta = _peticion(servidor, 'GET', '/salud')
+    assert respuesta.status == 200
+    assert respuesta.getheader('Access-Control-Allow-Origin') is None
+
+
+def test_cuerpo_demasiado_grande(servidor):
+    cuerpo = json.dumps({'zona': 'centre', 'items': [{'addr': 'x' * 200}]}).encode()
+    respuesta = _peticion(servidor, 'POST', '/longitud', {'Origin': TABLERO}, cuerpo)
+    assert respuesta.status == 413
+
+
+def test_insertar_elige_el_hueco_mas_barato_entre_los_items_con_coordenadas(monkeypatch):
+    coords = {'a': (41.0, 2.01), 'b': (41.0, 2.03), 'sin': None, 'c': (41.0, 2.05), 'nuevo': (41.0, 2.04)}
+    monkeypatch.setattr(route_api, 'resolver_coordenadas', lambda items: [coords[i['addr']] for i in items])
+    monkeypatch.setattr(route_api, 'DEPOT_COORDS', (41.0, 2.0))
+    items = [{'addr': a} for a in ('a', 'b', 'sin', 'c')]
+
+    resultado = route_api.insertar_en_ruta('altres', items, {'addr': 'nuevo'})
+
+    # Entre b y c (el item sin coordenadas no cuenta como parada): justo tras b
+    assert [i['addr'] for i in resultado['items']] == ['a', 'b', 'nuevo', 'sin', 'c']
+    assert resultado['indice'] == 2
+    assert resultado['incremento_m'] == pytest.approx(0.0, abs=1.0)
@@ -0,0 +1,49 @@
+"""Orden con memoria de rutas"""
+import line_distance_solver
+import route_memory
+
+LINEA = [(41.0, 2.0), (41.0, 2.1)]
+LINEAS = {'Centre': LINEA, 'Indust': LINEA}
+
+
+def test_las_zonas_sin_memoria_usan_las_posiciones_cacheadas(tmp_path, monkeypatch):
+    db_file = str(tmp_path / 'resultados.db')
+    conocidas = [((41.0, 2.01 + i / 100), f'conocida {i}', []) for i in range(3)]
+    route_memory.registrar_rutas({'Indust': [item[1] for item in conocidas]}, db_file=db_file)
+
+    proyecciones = []
+    original = line_distance_solver.posiciones_en_ruta
+    monkeypatch.setattr(line_distance_solver, 'posiciones_en_ruta',
+                        lambda *args: proyecciones.append(args) or original(*args))
+
+    # Posiciones cacheadas contrarias a la geometría: si se usan, mandan ellas
+    nuevas = [((41.0, 2.02), 'a', []), ((41.0, 2.08), 'b', [])]
+    posiciones = {'a': 0.9, 'b': 0.1}
+    ordenadas, estadisticas = route_memory.ordenar_con_memoria(
+        {'Centre': nuevas, 'Indust': conocidas}, LINEAS, db_file=db_file, posiciones=posiciones
+    )
+
+    assert list(estadisticas) == ['Indust']
+    assert [item[1] for item in ordenadas['Centre']] == ['b', 'a']
+    # Solo se proyectan las paradas de la zona con memoria (RutaInsercion), no las de Centre
+    assert not any(item[0] in puntos for item in nuevas for puntos, _ in proyecciones)
+
+
+def test_la_busqueda_local_parte_del_orden_aprendido(tmp_path, monkeypatch):
+    db_file = str(tmp_path / 'resultados.db')
+    # Orden aprendido con un zigzag: la búsqueda local lo puede acortar
+    paradas = [((41.0, 2.01 + i / 100), f'parada {i}', []) for i in range(6)]
+    aprendido = [paradas[i] for i in (0, 3, 1, 4, 2, 5)]
+    route_memory.registrar_rutas({'Centre': [item[1] for item in aprendido]}, db_file=db_file)
+    monkeypatch.setattr(route_memory, 'MEJORA_LOCAL_ACTIVA', True)
+
+    monkeypatch.setattr(route_memory, 'MEJORA_LOCAL_CON_MEMORIA', False)
+    ordenadas, con_memoria, mejora = route_memory.ordenar_zonas({'Centre': paradas}, LINEAS, (41.0, 2.0), db_file)
+    assert list(con_memoria) == ['Centre'] and mejora == {}
+    assert ordenadas['Centre'] == aprendido
+
+    monkeypatch.setattr(route_memory, 'MEJORA_LOCAL_CON_MEMORIA', True)
+    ordenadas, con_memoria, mejora = route_memory.ordenar_zonas({'Centre': paradas}, LINEAS, (41.0, 2.0), db_file)
+    assert list(con_memoria) == ['Centre']
+    assert mejora['Centre']['despues_m'] < mejora['Centre']['antes_m']
+    assert ordenadas['Centre'] == paradas
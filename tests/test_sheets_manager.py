@@ -0,0 +1,35 @@
+"""Gestor de hojas: primitivas y lectura por páginas"""
+import pytest
+
+from local_sheets import LocalSheetsManager
+from sheets_manager import BaseSheetsManager
+
+
+def test_una_pagina_en_blanco_no_corta_la_lectura():
+    filas = ([['c1', '', '', '', 'Carrer Major 1']] + [[''] * 5] * 4
+             + [['c2', '', '', '', 'Carrer Nou 2']])
+    manager = LocalSheetsManager.desde_filas(filas, num_filas=10)
+
+    paginas = list(manager.iterar_direcciones_por_paginas(tam_pagina=2))
+
+    direcciones = [direccion for pagina in paginas for direccion in pagina[0]]
+    assert direcciones == ['Carrer Major 1', 'Carrer Nou 2']
+    assert manager.ultima_fila == 7
+
+
+def test_un_gestor_sin_todas_las_primitivas_no_se_puede_crear():
+    class SinLimpiar(BaseSheetsManager):
+        def leer_rango_filas(self, rango):
+            return []
+
+        def escribir_columna(self, rango, datos):
+            return {}
+
+        def escribir_rangos(self, datos_por_rango):
+            return {}
+
+        def obtener_num_filas(self, hoja=None):
+            return 0
+
+    with pytest.raises(TypeError, match='limpiar_rangos'):
+        SinLimpiar()
@@ -0,0 +1,64 @@
+"""Rebalanceo de paradas fronterizas entre zonas"""
+from zone_manager import rebalancear_zonas
+
+# Dos líneas paralelas a unos 100 m y una tercera para 'sin_zona', que aun así no participa
+LINEAS = {
+    'Indust': [(41.0000, 2.000), (41.0000, 2.010)],
+    'Centre': [(41.0009, 2.000), (41.0009, 2.010)],
+    'sin_zona': [(41.0004, 2.000), (41.0004, 2.010)],
+}
+
+
+def _paradas(zona, n, lat, codigos_por_parada=1):
+    return [((lat, 2.0 + i * 0.0005), f'{zona} {i}', [f'{zona}-{i}-{c}' for c in range(codigos_por_parada)])
+            for i in range(n)]
+
+
+def _zonas():
+    # Indust muy cargada con todas sus paradas entre las dos líneas (a menos de 150 m de Centre)
+    return {
+        'Indust': _paradas('Indust', 20, 41.0004),
+        'Centre': _paradas('Centre', 4, 41.0009),
+        'sin_zona': _paradas('sin_zona', 30, 41.0005),
+    }
+
+
+def test_equilibra_el_numero_de_paradas():
+    zonas = _zonas()
+    rebalanceado, movimientos = rebalancear_zonas(zonas, LINEAS, distancia_m=150, tolerancia=0.2,
+                                                  peso_paquetes=0, max_movimientos=100)
+
+    n_indust, n_centre = len(rebalanceado['Indust']), len(rebalanceado['Centre'])
+    assert n_indust + n_centre == 24
+    # Carga relativa a la media (12): diferencia como mucho del 20 %
+    assert (n_indust - n_centre) / 12 <= 0.2
+    assert len(movimientos) == 20 - n_indust
+    assert all(m['de'] == 'Indust' and m['a'] == 'Centre' for m in movimientos)
+    movidas = {m['direccion'] for m in movimientos}
+    assert movidas == {item[1] for item in rebalanceado['Centre']} - {item[1] for item in zonas['Centre']}
+
+
+def test_respeta_el_maximo_de_movimientos():
+    rebalanceado, movimientos = rebalancear_zonas(_zonas(), LINEAS, distancia_m=150, tolerancia=0.2,
+                                                  peso_paquetes=0, max_movimientos=3)
+
+    assert len(movimientos) == 3
+    assert (len(rebalanceado['Indust']), len(rebalanceado['Centre'])) == (17, 7)
+
+
+def test_sin_zona_no_participa():
+    zonas = _zonas()
+    rebalanceado, movimientos = rebalancear_zonas(zonas, LINEAS, distancia_m=150, tolerancia=0.2,
+                                                  peso_paquetes=0, max_movimientos=100)
+
+    assert rebalanceado['sin_zona'] == zonas['sin_zona']
+    assert not any('sin_zona' in (m['de'], m['a']) for m in movimientos)
+
+
+def test_lejos_de_la_otra_linea_no_se_mueve_nada():
+    zonas = _zonas()
+    rebalanceado, movimientos = rebalancear_zonas(zonas, LINEAS, distancia_m=10, tolerancia=0.2,
+                                                  peso_paquetes=0, max_movimientos=100)
+
+    assert movimientos == []
+    assert rebalanceado == zonas